@@ -1,78 +1,286 @@
-from flask import Flask, request, jsonify
+import os
+import sys
+import math
+from flask import Flask, Response, request, jsonify, g, has_request_context
 from flask_cors import CORS
-import mysql.connector
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import date
+from datetime import date, datetime, timedelta
+import threading
+import time
+import click
+from db_pool import ConnectionPool, PoolTimeout
+from glucose_categories import categorize_glucose, categorize_many, recategorize
+import outbox
+import glucose_rollups
+import downsample
+import conversations
+import notification_state
+from panel_report import PanelReports
+import export
+import reminder_scheduler
+import availability
+import retention
+import search
+import geo_index
+from notification_hub import NotificationHub
+from pagination import Page, BadCursor, CURSOR_HEADERS
+from response_cache import ResponseCache
+from identity_cache import IdentityCache
+from auth import TokenSigner, PasswordHasher, AuthError, HasherBusy
+from metrics import Metrics
+from compression import Compressor
+import fieldsets
+from fieldsets import BadFields
 
 
 
 
 app = Flask(__name__)
-CORS(app)
+# Signs session tokens; set SECRET_KEY so tokens survive restarts and work across processes.
+# The random fallback is per process, so it is refused under gunicorn or WEB_CONCURRENCY > 1.
+if not os.environ.get("SECRET_KEY") and (
+    int(os.environ.get("WEB_CONCURRENCY", 1)) > 1 or "gunicorn" in os.path.basename(sys.argv[0])
+):
+    raise RuntimeError("SECRET_KEY must be set when serving with more than one process")
+app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY") or os.urandom(32).hex()
+EXPOSE_HEADERS = CURSOR_HEADERS + ["X-Source-Count", "ETag", "Last-Modified"]
+CORS(app, expose_headers=EXPOSE_HEADERS)
+# Per-route latency / SQL counts for /metrics; statements slower than SLOW_QUERY_MS are logged
+metrics = Metrics(slow_query_ms=float(os.environ.get("SLOW_QUERY_MS", 200)))
+metrics.init_app(app)
+# gzip JSON bodies of COMPRESS_MIN_SIZE bytes or more (0 turns it off)
+compressor = Compressor(
+    min_size=int(os.environ.get("COMPRESS_MIN_SIZE", 1024)),
+    level=int(os.environ.get("COMPRESS_LEVEL", 6)),
+)
+compressor.init_app(app)
+
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",      # Change if not root
+    "password": "",      # Change if your MySQL password is not empty
+    "database": "diabetes"  # Change if your DB is named differently
+}
+# DB_POOL_SIZE=0 turns pooling off (one fresh connection per get_db() call)
+pool = ConnectionPool(
+    DB_CONFIG,
+    size=int(os.environ.get("DB_POOL_SIZE", 10)),
+    max_overflow=int(os.environ.get("DB_POOL_OVERFLOW", 5)),
+    timeout=float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+    ping_interval=float(os.environ.get("DB_POOL_PING_INTERVAL", 30)),
+    instrument=metrics,
+)
+notification_hub = NotificationHub()
+# id -> name, role, email, diabetes_type, assigned doctor
+identities = IdentityCache(
+    size=int(os.environ.get("IDENTITY_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("IDENTITY_CACHE_TTL", 300)),
+)
+# OUTBOX_WORKERS=0 means notifications are rendered by a separate `flask outbox-worker`
+outbox_worker = outbox.OutboxWorker(
+    pool,
+    identities,
+    workers=int(os.environ.get("OUTBOX_WORKERS", 2)),
+    batch_size=int(os.environ.get("OUTBOX_BATCH_SIZE", 200)),
+    max_attempts=int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 5)),
+    on_written=notification_hub.publish,
+)
+# Fires due reminders as notifications; REMINDER_SCHEDULER=0 leaves it to `flask reminder-scheduler`
+reminder_dispatcher = reminder_scheduler.ReminderScheduler(
+    pool,
+    batch_size=int(os.environ.get("REMINDER_BATCH_SIZE", 500)),
+    sweep_interval=float(os.environ.get("REMINDER_SWEEP_INTERVAL", 300)),
+    catch_up=float(os.environ.get("REMINDER_CATCH_UP", 6 * 3600)),
+    on_written=notification_hub.publish,
+)
+# Moves old glucose readings / read notifications into the partitioned archive
+# tables every RETENTION_INTERVAL seconds; RETENTION=0 leaves it to `flask retention`
+retention_policy = retention.Retention(
+    pool,
+    glucose_hot_months=int(os.environ.get("GLUCOSE_HOT_MONTHS", 12)),
+    glucose_archive_months=int(os.environ.get("GLUCOSE_ARCHIVE_MONTHS", 0)),
+    notification_hot_days=int(os.environ.get("NOTIFICATION_HOT_DAYS", 90)),
+    notification_archive_days=int(os.environ.get("NOTIFICATION_ARCHIVE_DAYS", 365)),
+    batch_size=int(os.environ.get("RETENTION_BATCH_SIZE", 5000)),
+    interval=float(os.environ.get("RETENTION_INTERVAL", 3600)),
+)
+# Weekly panel reports; REPORT_WORKERS=0 computes in the request thread
+panel_reports = PanelReports(
+    pool,
+    workers=int(os.environ.get("REPORT_WORKERS", 2)),
+    parallel_min_rows=int(os.environ.get("REPORT_PARALLEL_MIN_ROWS", 200000)),
+    ttl=float(os.environ.get("REPORT_CACHE_TTL", 900)),
+    boundaries=retention_policy.boundaries,
+)
+# In-memory lat/lng grid over doctors for /doctors/nearby; reloaded every GEO_RELOAD_INTERVAL seconds
+doctor_locations = geo_index.DoctorGeoIndex(
+    cell_deg=float(os.environ.get("GEO_CELL_DEG", 0.1)),
+    reload_interval=float(os.environ.get("GEO_RELOAD_INTERVAL", 300)),
+)
+# Shared reference lists (specialties, doctors, articles, faqs, challenges);
+# CACHE_TTL=0 disables storing, ETag/304 still apply
+response_cache = ResponseCache(ttl=float(os.environ.get("CACHE_TTL", 300)))
+tokens = TokenSigner(
+    app.config["SECRET_KEY"],
+    access_ttl=int(os.environ.get("TOKEN_TTL", 3600)),
+    refresh_ttl=int(os.environ.get("REFRESH_TOKEN_TTL", 7 * 86400)),
+)
+hasher = PasswordHasher(
+    workers=int(os.environ.get("PASSWORD_HASH_WORKERS", 2)),
+    queue=int(os.environ.get("PASSWORD_HASH_QUEUE", 16)),
+)
+_background_started = False
+TOKEN_ENDPOINTS = {"login", "register", "refresh_token"}
+_background_lock = threading.Lock()
+
 def get_patient_name(user_id):
     db = get_db()
-    c = db.cursor(dictionary=True)
-    c.execute("SELECT name FROM users WHERE id=%s", (user_id,))
-    row = c.fetchone()
-    c.close()
+    user = identities.get(db, user_id)
     db.close()
-    return row['name'] if row else "Unknown"
+    return user["name"] if user else "Unknown"
 def get_db():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",      # Change if not root
-        password="",      # Change if your MySQL password is not empty
-        database="diabetes"  # Change if your DB is named differently
-    )
+    # Inside a request every call shares one pooled connection; db.close() is a
+    # no-op there and the connection goes back to the pool in release_db().
+    if not pool.enabled or not has_request_context():
+        return pool.acquire()
+    if "db" not in g:
+        g.db = pool.acquire(pinned=True)
+    return g.db
+
+@app.before_request
+def start_background_workers():
+    global _background_started
+    if _background_started:
+        return
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+        outbox_worker.start()
+        if os.environ.get("REMINDER_SCHEDULER", "1") != "0":
+            reminder_dispatcher.start()
+        if os.environ.get("RETENTION", "1") != "0":
+            retention_policy.start()
+
+@app.before_request
+def load_session_user():
+    # "Authorization: Bearer <token>" -> g.user = {"id", "role"}; checked in memory only.
+    # Not on the endpoints that hand out tokens, so an expired one cannot lock a client out.
+    if request.endpoint in TOKEN_ENDPOINTS:
+        return
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        g.user = tokens.verify(header[7:].strip())
+
+@app.teardown_appcontext
+def release_db(exc):
+    db = g.pop("db", None)
+    if db is not None:
+        db.release()
+    # Handler has committed by now, let the outbox worker pick the events up
+    if g.pop("outbox_pending", False):
+        outbox_worker.wake()
+
+def queue_notification(cursor, event_type, **payload):
+    # Appends to the outbox inside the caller's transaction; rendered by OutboxWorker
+    outbox.enqueue(cursor, event_type, **payload)
+    g.outbox_pending = True
+
+@app.errorhandler(PoolTimeout)
+def pool_timeout(e):
+    return jsonify({"error": str(e)}), 503
+
+@app.errorhandler(BadCursor)
+def bad_cursor(e):
+    return jsonify({"error": str(e)}), 400
+
+@app.errorhandler(BadFields)
+def bad_fields(e):
+    return jsonify({"error": str(e)}), 400
+
+@app.errorhandler(AuthError)
+def auth_error(e):
+    return jsonify({"error": str(e)}), 401
+
+@app.errorhandler(HasherBusy)
+def hasher_busy(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
+
+# --- DB pool stats ---
+@app.route("/pool/stats", methods=["GET"])
+def get_pool_stats():
+    return jsonify(pool.stats())
+
+# --- Prometheus metrics ---
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(pool.stats()), mimetype="text/plain; version=0.0.4")
+
+# --- Response cache stats ---
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify({
+        "responses": response_cache.stats(), "identities": identities.stats(), "reports": panel_reports.stats(),
+        "doctor_locations": doctor_locations.stats(),
+    })
+
+# --- Response compression stats (bytes before/after gzip) ---
+@app.route("/compression/stats", methods=["GET"])
+def get_compression_stats():
+    return jsonify(compressor.stats())
+
+# --- Notification outbox stats (depth, lag, throughput) ---
+@app.route("/outbox/stats", methods=["GET"])
+def get_outbox_stats():
+    return jsonify(outbox_worker.stats())
+
+# flask --app app outbox-worker
+@app.cli.command("outbox-worker")
+def outbox_worker_command():
+    outbox_worker.workers = max(outbox_worker.workers, 1)
+    outbox_worker.start()
+    click.echo(f"Outbox worker running with {outbox_worker.workers} threads")
+    try:
+        while True:
+            time.sleep(60)
+            click.echo(outbox_worker.stats())
+    except KeyboardInterrupt:
+        outbox_worker.stop()
+
+# --- Reminder scheduler stats (scheduled, fired, lag) ---
+@app.route("/reminders/stats", methods=["GET"])
+def get_reminder_stats():
+    return jsonify(reminder_dispatcher.stats())
+
+# --- Retention / archival ---
+@app.route("/retention/stats", methods=["GET"])
+def get_retention_stats():
+    return jsonify(retention_policy.stats())
+
+# flask --app app retention  (one pass; a new boundary only moves rows on a later pass)
+@app.cli.command("retention")
+def retention_command():
+    click.echo(retention_policy.run())
+
+# flask --app app reminder-scheduler
+@app.cli.command("reminder-scheduler")
+def reminder_scheduler_command():
+    reminder_dispatcher.start()
+    click.echo("Reminder scheduler running")
+    try:
+        while True:
+            time.sleep(60)
+            click.echo(reminder_dispatcher.stats())
+    except KeyboardInterrupt:
+        reminder_dispatcher.stop()
 
 def get_user_by_email(email):
     db = get_db()
     cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
+    cursor.execute("SELECT id, name, role, email, password_hash FROM users WHERE email = %s", (email,))
     user = cursor.fetchone()
     cursor.close()
     db.close()
     return user
-# --- NEW: Blood Glucose Categorization Utility ---
-def categorize_glucose(glucose, context, diabetes_type):
-    glucose = float(glucose)
-    # ADA rules
-    if diabetes_type == "Type 1" or diabetes_type == "Type 2":
-        if context == "Fasting":
-            if glucose < 80: return "Hypoglycemia"
-            elif 80 <= glucose <= 130: return "Normal"
-            else: return "Hyperglycemia"
-        else:  # Post-meal or Other
-            if glucose < 80: return "Hypoglycemia"
-            elif glucose <= 180: return "Normal"
-            else: return "Hyperglycemia"
-    elif diabetes_type == "Gestational":
-        if context == "Fasting":
-            if glucose < 70: return "Hypoglycemia"
-            elif glucose < 95: return "Normal"
-            else: return "Hyperglycemia"
-        elif context == "Post-meal":
-            if glucose < 70: return "Hypoglycemia"
-            elif glucose < 140: return "Normal"
-            else: return "Hyperglycemia"
-        else:  # "Other" (2h post-meal)
-            if glucose < 70: return "Hypoglycemia"
-            elif glucose < 120: return "Normal"
-            else: return "Hyperglycemia"
-    elif diabetes_type == "Prediabetes":
-        if context == "Fasting":
-            if glucose < 100: return "Hypoglycemia"
-            elif glucose <= 125: return "Normal"
-            else: return "Hyperglycemia"
-        else:  # Post-meal or Other
-            if glucose < 100: return "Hypoglycemia"
-            elif glucose <= 199: return "Normal"
-            else: return "Hyperglycemia"
-    else:
-        if glucose < 70: return "Hypoglycemia"
-        elif glucose <= 140: return "Normal"
-        else: return "Hyperglycemia"
-
 # --- Registration ---
 @app.route("/register", methods=["POST"])
 def register():
@@ -88,7 +296,7 @@ def register():
         return jsonify({"error": "Passwords do not match"}), 400
     if get_user_by_email(email):
         return jsonify({"error": "Email already registered"}), 400
-    password_hash = generate_password_hash(password)
+    password_hash = hasher.hash(password)
     db = get_db()
     cursor = db.cursor()
     try:
@@ -133,6 +341,10 @@ def register():
                 )
             )
         db.commit()
+        identities.invalidate(user_id)
+        if role == "doctor":
+            response_cache.invalidate("doctors")
+            doctor_locations.upsert(user_id, data.get("geo_lat"), data.get("geo_lng"), data.get("specialty_id"))
     except Exception as e:
         db.rollback()
         cursor.close()
@@ -148,16 +360,32 @@ def login():
     data = request.json
     email = data.get("email")
     password = data.get("password")
+    if not email or not password:
+        return jsonify({"error": "Invalid credentials"}), 401
     user = get_user_by_email(email)
-    if not user or not check_password_hash(user["password_hash"], password):
+    if not user or not hasher.check(user["password_hash"], password):
         return jsonify({"error": "Invalid credentials"}), 401
     return jsonify({
         "id": user["id"],
         "name": user["name"],
         "role": user["role"],
-        "email": user["email"]
+        "email": user["email"],
+        **tokens.issue(user["id"], user["role"])
     })
 
+# --- Session token refresh ---
+@app.route("/token/refresh", methods=["POST"])
+def refresh_token():
+    data = request.json or {}
+    if not data.get("refresh_token"):
+        return jsonify({"error": "refresh_token required"}), 400
+    return jsonify(tokens.refresh(data["refresh_token"]))
+
+# --- Password hashing pool stats ---
+@app.route("/auth/stats", methods=["GET"])
+def get_auth_stats():
+    return jsonify(hasher.stats())
+
 # --- Patient Profile ---
 @app.route("/patient_profile/<int:user_id>", methods=["GET"])
 def get_patient_profile(user_id):
@@ -180,6 +408,9 @@ def update_patient_profile(user_id):
     data = request.json
     db = get_db()
     c = db.cursor()
+    c.execute("SELECT diabetes_type FROM patients WHERE user_id=%s", (user_id,))
+    row = c.fetchone()
+    old_type = row[0] if row else None
     c.execute("""
         UPDATE patients SET phone=%s, dob=%s, gender=%s, city=%s, country=%s, diabetes_type=%s,
             health_background=%s, emergency_contact_name=%s, emergency_contact_phone=%s, weight_kg=%s, hydration_liters=%s
@@ -191,10 +422,48 @@ def update_patient_profile(user_id):
         data.get("weight_kg"), data.get("hydration_liters"), user_id
     ))
     db.commit()
+    identities.invalidate(user_id)
     c.close()
     db.close()
+    # Stored categories depend on diabetes_type, recompute them off the request path
+    if row and data.get("diabetes_type") != old_type:
+        threading.Thread(target=recategorize_in_background, args=(user_id,), daemon=True).start()
     return jsonify({"message": "Profile updated"})
 
+def recategorize_in_background(user_id):
+    db = pool.acquire()
+    try:
+        result = recategorize(db, user_id)
+        # hypo/hyper counts in the rollups follow the stored categories
+        glucose_rollups.rebuild(db, user_id)
+        print(f"Re-categorized glucose logs for patient {user_id}: {result}")
+    except Exception as e:
+        print(f"ERROR: re-categorizing glucose logs for patient {user_id} failed: {e}")
+    finally:
+        db.close()
+
+# flask --app app recategorize [--user-id N]
+@app.cli.command("recategorize")
+@click.option("--user-id", type=int, default=None, help="Only this patient (default: whole table)")
+@click.option("--chunk-size", type=int, default=5000)
+def recategorize_command(user_id, chunk_size):
+    db = pool.acquire()
+    try:
+        click.echo(recategorize(db, user_id, chunk_size))
+        click.echo(glucose_rollups.rebuild(db, user_id))
+    finally:
+        db.close()
+
+# flask --app app rebuild-rollups [--user-id N]
+@app.cli.command("rebuild-rollups")
+@click.option("--user-id", type=int, default=None, help="Only this patient (default: everyone)")
+def rebuild_rollups_command(user_id):
+    db = pool.acquire()
+    try:
+        click.echo(glucose_rollups.rebuild(db, user_id))
+    finally:
+        db.close()
+
 # --- Doctor Profile ---
 @app.route("/doctor_profile/<int:user_id>", methods=["GET"])
 def get_doctor_profile(user_id):
@@ -226,6 +495,8 @@ def update_doctor_profile(user_id):
         data.get("country"), data.get("license_number"), user_id
     ))
     db.commit()
+    response_cache.invalidate("doctors")
+    doctor_locations.upsert(user_id, data.get("geo_lat"), data.get("geo_lng"), data.get("specialty_id"))
     c.close()
     db.close()
     return jsonify({"message": "Profile updated"})
@@ -235,16 +506,58 @@ def update_doctor_profile(user_id):
 
 @app.route("/doctors", methods=["GET"])
 def get_doctors():
+    def load():
+        db = get_db()
+        c = db.cursor(dictionary=True)
+        c.execute("""
+            SELECT u.id, u.name, u.email, s.name as specialty, d.specialty_id, d.clinic, d.city, d.country
+            FROM users u
+            JOIN doctors d ON u.id = d.user_id
+            LEFT JOIN specialties s ON d.specialty_id = s.id
+        """)
+        doctors = c.fetchall()
+        c.close()
+        db.close()
+        return doctors
+    return response_cache.respond("doctors", load, app.json.dumps)
+
+# --- Nearest doctors ---
+# ?lat=&lng= required; ?k= nearest (default 10, at most MAX_NEARBY), optional
+# ?radius_km= and ?specialty_id=. Closest first, with distance_km.
+MAX_NEARBY = 100
+MAX_NEARBY_RADIUS_KM = 20000
+
+@app.route("/doctors/nearby", methods=["GET"])
+def get_nearby_doctors():
+    point = geo_index.coordinates(request.args.get("lat"), request.args.get("lng"))
+    if point is None:
+        return jsonify({"error": "lat and lng are required (degrees)"}), 400
+    try:
+        k = int(request.args.get("k", 10))
+        radius_km = float(request.args["radius_km"]) if request.args.get("radius_km") else None
+        specialty_id = int(request.args["specialty_id"]) if request.args.get("specialty_id") else None
+    except ValueError:
+        return jsonify({"error": "k and specialty_id must be integers, radius_km a number"}), 400
+    if not 1 <= k <= MAX_NEARBY or (radius_km is not None and not 0 < radius_km <= MAX_NEARBY_RADIUS_KM):
+        return jsonify({"error": f"k must be 1-{MAX_NEARBY}, radius_km 0-{MAX_NEARBY_RADIUS_KM}"}), 400
     db = get_db()
-    c = db.cursor(dictionary=True)
-    c.execute("""
-        SELECT u.id, u.name, u.email, s.name as specialty, d.specialty_id, d.clinic, d.city, d.country
-        FROM users u
-        JOIN doctors d ON u.id = d.user_id
-        LEFT JOIN specialties s ON d.specialty_id = s.id
-    """)
-    doctors = c.fetchall()
-    c.close()
+    doctor_locations.ensure(db)
+    hits = doctor_locations.nearest(point[0], point[1], k, radius_km, specialty_id)
+    doctors = []
+    if hits:
+        c = db.cursor(dictionary=True)
+        c.execute(
+            "SELECT u.id, u.name, u.email, s.name as specialty, d.specialty_id, d.clinic, d.city, d.country, "
+            "d.geo_lat, d.geo_lng FROM users u JOIN doctors d ON u.id = d.user_id "
+            "LEFT JOIN specialties s ON d.specialty_id = s.id WHERE u.id IN (" + ", ".join(["%s"] * len(hits)) + ")",
+            [doctor_id for _, doctor_id in hits]
+        )
+        rows = {r["id"]: r for r in c.fetchall()}
+        c.close()
+        for dist, doctor_id in hits:
+            if doctor_id in rows:
+                rows[doctor_id]["distance_km"] = round(dist, 2)
+                doctors.append(rows[doctor_id])
     db.close()
     return jsonify(doctors)
 
@@ -263,6 +576,7 @@ def assign_doctor():
     # Assign new doctor
     c.execute("INSERT INTO doctor_patient (doctor_id, patient_id) VALUES (%s, %s)", (doctor_id, patient_id))
     db.commit()
+    identities.invalidate(patient_id)
     c.close()
     db.close()
     return jsonify({"message": "Doctor assigned"})
@@ -300,16 +614,113 @@ def get_patients(doctor_id):
     c.close()
     db.close()
     return jsonify(patients)
-#specialities
-@app.route("/specialties", methods=["GET"])
-def get_specialties():
+# --- Doctor dashboard: every assigned patient with their key figures ---
+# One set-based query per figure (latest reading, today's count, active
+# medications, unread alerts) plus the rollup lookup for 7-day time in range,
+# whatever the number of patients.
+ASSIGNED = "SELECT patient_id FROM doctor_patient WHERE doctor_id=%s"
+
+@app.route("/doctor_dashboard/<int:doctor_id>", methods=["GET"])
+def get_doctor_dashboard(doctor_id):
     db = get_db()
     c = db.cursor(dictionary=True)
-    c.execute("SELECT id, name FROM specialties ORDER BY name")
-    specialties = c.fetchall()
+    c.execute("""
+        SELECT u.id, u.name, u.email, p.city, p.country, p.diabetes_type
+        FROM doctor_patient dp
+        JOIN users u ON dp.patient_id = u.id
+        JOIN patients p ON u.id = p.user_id
+        WHERE dp.doctor_id = %s
+        ORDER BY u.name
+    """, (doctor_id,))
+    patients = c.fetchall()
+    if not patients:
+        c.close()
+        db.close()
+        return jsonify([])
+
+    c.execute("""
+        SELECT g.user_id, g.id, g.timestamp, g.glucose_level, g.context, g.category
+        FROM glucose_logs g
+        JOIN (
+            SELECT user_id, MAX(timestamp) AS ts FROM glucose_logs
+            WHERE user_id IN (""" + ASSIGNED + """) GROUP BY user_id
+        ) last ON g.user_id = last.user_id AND g.timestamp = last.ts
+    """, (doctor_id,))
+    latest = {}
+    for r in c.fetchall():
+        # Same-timestamp ties: keep the last inserted
+        if r["user_id"] not in latest or r["id"] > latest[r["user_id"]]["id"]:
+            latest[r["user_id"]] = r
+
+    c.execute(
+        "SELECT user_id, COUNT(*) AS n FROM glucose_logs WHERE user_id IN (" + ASSIGNED + ") "
+        "AND timestamp >= CURDATE() GROUP BY user_id",
+        (doctor_id,)
+    )
+    today = {r["user_id"]: r["n"] for r in c.fetchall()}
+
+    c.execute(
+        "SELECT patient_id, COUNT(*) AS n FROM medications WHERE patient_id IN (" + ASSIGNED + ") "
+        "AND is_active=1 GROUP BY patient_id",
+        (doctor_id,)
+    )
+    meds = {r["patient_id"]: r["n"] for r in c.fetchall()}
+
+    c.execute(
+        "SELECT DISTINCT patient_id FROM notifications WHERE user_id=%s AND `read`=0 "
+        "AND type='glucose' AND title LIKE %s AND patient_id IS NOT NULL "
+        "AND id > (SELECT COALESCE(MAX(last_read_id), 0) FROM notification_state WHERE user_id=%s)",
+        (doctor_id, "ALERT:%", doctor_id)
+    )
+    alerts = {r["patient_id"] for r in c.fetchall()}
     c.close()
+
+    cur = db.cursor()
+    tir = glucose_rollups.window_stats_many(cur, [p["id"] for p in patients], [7])
+    cur.close()
     db.close()
-    return jsonify(specialties)
+
+    for p in patients:
+        last = latest.get(p["id"])
+        p["latest_glucose"] = {k: last[k] for k in ("timestamp", "glucose_level", "context", "category")} if last else None
+        p["today_count"] = today.get(p["id"], 0)
+        p["time_in_range_7d"] = tir[p["id"]]["7d"].get("time_in_range_percent")
+        p["active_medications"] = meds.get(p["id"], 0)
+        p["unread_alert"] = p["id"] in alerts
+    return jsonify(patients)
+
+# --- Panel report: all of a doctor's patients ranked by glycemic risk ---
+# ?days=7 (period length), ?end=YYYY-MM-DD (exclusive, default tomorrow so
+# today is included), ?target=4 readings per day for logging adherence
+MAX_REPORT_DAYS = 90
+
+@app.route("/reports/panel/<int:doctor_id>", methods=["GET"])
+def get_panel_report(doctor_id):
+    try:
+        days = int(request.args.get("days", 7))
+        target = int(request.args.get("target", 4))
+        end = date.fromisoformat(request.args["end"]) if request.args.get("end") else date.today() + timedelta(days=1)
+    except ValueError:
+        return jsonify({"error": "days and target must be integers, end an ISO date"}), 400
+    if not 1 <= days <= MAX_REPORT_DAYS or target < 1:
+        return jsonify({"error": f"days must be 1-{MAX_REPORT_DAYS} and target at least 1"}), 400
+    report, cached = panel_reports.get(doctor_id, days, end, target)
+    resp = jsonify(report)
+    resp.headers["X-Cache"] = "hit" if cached else "miss"
+    return resp
+
+#specialities
+@app.route("/specialties", methods=["GET"])
+def get_specialties():
+    def load():
+        db = get_db()
+        c = db.cursor(dictionary=True)
+        c.execute("SELECT id, name FROM specialties ORDER BY name")
+        specialties = c.fetchall()
+        c.close()
+        db.close()
+        return specialties
+    return response_cache.respond("specialties", load, app.json.dumps)
 
 # --- Glucose Logs ---
 # --- REPLACE THIS WHOLE FUNCTION ---
@@ -323,12 +734,11 @@ def add_glucose():
         return jsonify({"error": "user_id and glucose_level required"}), 400
     db = get_db()
 
-    # Get diabetes_type
-    cur = db.cursor(dictionary=True)
-    cur.execute("SELECT diabetes_type FROM patients WHERE user_id=%s", (user_id,))
-    p = cur.fetchone()
-    diabetes_type = p["diabetes_type"] if p else "Type 2"
+    # diabetes_type and assigned doctor, usually from the identity cache
+    patient = identities.get(db, user_id) or {}
+    diabetes_type = patient.get("diabetes_type") or "Type 2"
     category = categorize_glucose(glucose_level, context, diabetes_type)
+    doctor_id = patient.get("doctor_id")
 
     # Save glucose log
     cur2 = db.cursor()
@@ -336,56 +746,125 @@ def add_glucose():
         "INSERT INTO glucose_logs (user_id, glucose_level, context, category) VALUES (%s, %s, %s, %s)",
         (user_id, glucose_level, context, category)
     )
+    glucose_rollups.add_logged(cur2, cur2.lastrowid)
+    if doctor_id:
+        # Doctor gets "new entry" + hypo/hyper alert, rendered by the outbox worker
+        queue_notification(cur2, "glucose", patient_id=user_id, doctor_id=doctor_id,
+                           glucose_level=glucose_level, context=context, category=category)
     db.commit()
 
-    # Find doctor for this patient
-    cur3 = db.cursor(dictionary=True)
-    cur3.execute("SELECT doctor_id FROM doctor_patient WHERE patient_id=%s", (user_id,))
-    doctor_row = cur3.fetchone()
-    doctor_id = doctor_row['doctor_id'] if doctor_row else None
+    cur2.close()
+    db.close()
+    return jsonify({"message": "Glucose log added", "category": category, "doctor_id": doctor_id})
 
-    # Get patient name for notification
-    cur3.execute("SELECT name FROM users WHERE id=%s", (user_id,))
-    row = cur3.fetchone()
-    patient_name = row['name'] if row else "Unknown"
+# --- Batch glucose upload (CGM / meter sync) ---
+MAX_GLUCOSE_BATCH = 2000
+GLUCOSE_CONTEXTS = ("Fasting", "Post-meal", "Other")
 
-    if doctor_id:
-        # Always notify doctor: new glucose entry
-        notif_title = f"{patient_name} has logged a new blood glucose value"
-        notif_body = f"{patient_name} has logged {glucose_level} mg/dL ({context}) for today, check it out!"
-        cur3.execute(
-            "INSERT INTO notifications (user_id, type, title, body) VALUES (%s, %s, %s, %s)",
-            (doctor_id, 'glucose', notif_title, notif_body)
+@app.route("/glucose/batch", methods=["POST"])
+def add_glucose_batch():
+    data = request.json
+    user_id = data.get("user_id")
+    readings = data.get("readings")
+    if not user_id or not isinstance(readings, list) or not readings:
+        return jsonify({"error": "user_id and readings required"}), 400
+    if len(readings) > MAX_GLUCOSE_BATCH:
+        return jsonify({"error": f"At most {MAX_GLUCOSE_BATCH} readings per batch"}), 400
+
+    rows = []
+    for i, r in enumerate(readings):
+        try:
+            level = float(r["glucose_level"])
+            if not math.isfinite(level):
+                raise ValueError("non-finite level")
+            context = r.get("context", "Other")
+            if context not in GLUCOSE_CONTEXTS:
+                raise ValueError("bad context")
+            ts = datetime.fromisoformat(r["timestamp"]) if r.get("timestamp") else datetime.now()
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return jsonify({"error": f"Invalid reading at index {i}"}), 400
+        rows.append((level, context, ts))
+
+    db = get_db()
+    cur = db.cursor(dictionary=True)
+    # Patient info and doctor, looked up once for the whole batch
+    info = identities.get(db, user_id) or {}
+    diabetes_type = info.get("diabetes_type") or "Type 2"
+    doctor_id = info.get("doctor_id")
+
+    categories = categorize_many([r[0] for r in rows], [r[1] for r in rows], diabetes_type)
+
+    values = []
+    for (level, context, ts), category in zip(rows, categories):
+        values.extend((user_id, ts, level, context, category))
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+    try:
+        cur.execute(
+            "INSERT INTO glucose_logs (user_id, timestamp, glucose_level, context, category) VALUES " + placeholders,
+            values
         )
-        # Special alert for hypo/hyperglycemia
-        if category in ["Hypoglycemia", "Hyperglycemia"]:
-            alert_title = f"ALERT: {patient_name} has had a {category.lower()}!"
-            alert_body = f"{patient_name} logged {category.lower()} ({glucose_level} mg/dL, {context}). Immediate attention may be needed."
-            cur3.execute(
-                "INSERT INTO notifications (user_id, type, title, body) VALUES (%s, %s, %s, %s)",
-                (doctor_id, 'glucose', alert_title, alert_body)
-            )
+        glucose_rollups.add_readings(cur, user_id, [(ts, level, category) for (level, _, ts), category in zip(rows, categories)])
+        counts = {c: categories.count(c) for c in ("Hypoglycemia", "Normal", "Hyperglycemia")}
+        if doctor_id:
+            # One summary notification for the whole upload
+            levels = [level for level, _, _ in rows]
+            queue_notification(cur, "glucose_batch", patient_id=user_id, doctor_id=doctor_id,
+                               count=len(rows), min=min(levels), max=max(levels),
+                               hypo=counts["Hypoglycemia"], normal=counts["Normal"], hyper=counts["Hyperglycemia"])
         db.commit()
-
-    cur3.close()
+    except Exception as e:
+        db.rollback()
+        cur.close()
+        db.close()
+        return jsonify({"error": str(e)}), 500
     cur.close()
-    cur2.close()
     db.close()
-    return jsonify({"message": "Glucose log added", "category": category, "doctor_id": doctor_id})
+    return jsonify({"message": "Glucose logs added", "count": len(rows), "categories": counts, "doctor_id": doctor_id})
 
 # --- REPLACE THIS WHOLE FUNCTION ---
+# Query builders for the paged reads are shared with the async routes in asgi.py
+# Pages come from the hot table; the archive is only read once a page reaches
+# past the retention boundary (retention.archive_needed)
+def glucose_page_query(page, user_id, table="glucose_logs"):
+    where, params = page.where("timestamp", "id")
+    return (
+        "SELECT id, timestamp, glucose_level, context, category FROM " + table + " WHERE user_id=%s"
+        + where + page.order_by("timestamp", "id"),
+        [user_id] + params
+    )
+
 @app.route("/glucose/<int:user_id>", methods=["GET"])
 def get_glucose(user_id):
+    page = Page(30)
     db = get_db()
     cursor = db.cursor(dictionary=True)
-    cursor.execute(
-        "SELECT id, timestamp, glucose_level, context, category FROM glucose_logs WHERE user_id=%s ORDER BY timestamp DESC LIMIT 30",
-        (user_id,)
-    )
-    logs = cursor.fetchall()
+    cursor.execute(*glucose_page_query(page, user_id))
+    rows = cursor.fetchall()
+    if retention.archive_needed(page, rows, "timestamp", retention_policy.boundaries().get("glucose_logs")):
+        cursor.execute(*glucose_page_query(page, user_id, retention.ARCHIVES["glucose_logs"]))
+        rows = retention.merge(page, rows, cursor.fetchall(), "timestamp")
+    logs = page.finish(rows)
     cursor.close()
     db.close()
-    return jsonify(logs)
+    return page.response(logs)
+# --- Glucose stats over 7/14/30/90 days, answered from the rollup tables ---
+STATS_WINDOWS = (7, 14, 30, 90)
+
+@app.route("/glucose/stats/<int:user_id>", methods=["GET"])
+def get_glucose_stats(user_id):
+    try:
+        windows = [int(d) for d in request.args.get("days", "").split(",") if d] or list(STATS_WINDOWS)
+    except ValueError:
+        return jsonify({"error": "days must be a comma separated list of integers"}), 400
+    if any(d < 1 or d > 366 for d in windows):
+        return jsonify({"error": "days must be between 1 and 366"}), 400
+    db = get_db()
+    c = db.cursor()
+    stats = glucose_rollups.window_stats(c, user_id, windows)
+    c.close()
+    db.close()
+    return jsonify(stats)
+
 # --- NEW: Get today's glucose log count for a patient ---
 @app.route("/glucose/daily_count/<int:user_id>", methods=["GET"])
 def get_daily_glucose_count(user_id):
@@ -404,10 +883,11 @@ def get_daily_glucose_count(user_id):
 # --- GET: Active medications for a patient ---
 @app.route("/medications/<int:patient_id>", methods=["GET"])
 def get_medications(patient_id):
+    fields = fieldsets.MEDICATIONS.pick()
     db = get_db()
     cur = db.cursor(dictionary=True)
     cur.execute(
-        "SELECT * FROM medications WHERE patient_id=%s AND is_active=1 ORDER BY prescribed_at DESC, id DESC",
+        "SELECT " + fields.sql + " FROM medications WHERE patient_id=%s AND is_active=1 ORDER BY prescribed_at DESC, id DESC",
         (patient_id,)
     )
     meds = cur.fetchall()
@@ -443,17 +923,8 @@ def add_medication():
     )
     # Notify patient if prescribed by doctor
     if doctor_id and int(added_by_patient) == 0:
-        doc_cursor = db.cursor(dictionary=True)
-        doc_cursor.execute("SELECT name FROM users WHERE id=%s", (doctor_id,))
-        doctor_name = (doc_cursor.fetchone() or {}).get('name', 'Your doctor')
-        notif_title = f"New prescription from {doctor_name}"
-        notif_body = f"{doctor_name} prescribed {med_name} ({med_type}), dosage: {dosage}"
-        doc_cursor.execute(
-            "INSERT INTO notifications (user_id, type, title, body) VALUES (%s, %s, %s, %s)",
-            (patient_id, 'medication', notif_title, notif_body)
-        )
-        db.commit()
-        doc_cursor.close()
+        queue_notification(cur, "medication_added", patient_id=patient_id, doctor_id=doctor_id,
+                           med_name=med_name, med_type=med_type, dosage=dosage)
     db.commit()
     cur.close()
     db.close()
@@ -486,17 +957,9 @@ def update_medication(med_id):
             (med_id, doctor_id, "update", old_dosage, new_dosage)
         )
         # Notify patient about dosage change
-        doc_cursor = db.cursor(dictionary=True)
-        doc_cursor.execute("SELECT name FROM users WHERE id=%s", (doctor_id,))
-        doctor_name = (doc_cursor.fetchone() or {}).get('name', 'Your doctor')
-        notif_title = f"Medication dosage updated by {doctor_name}"
-        notif_body = f"{doctor_name} updated {med_name} ({med_type}) dosage: {old_dosage} → {new_dosage}"
-        doc_cursor.execute(
-            "INSERT INTO notifications (user_id, type, title, body) VALUES (%s, %s, %s, %s)",
-            (patient_id, 'medication', notif_title, notif_body)
-        )
-        db.commit()
-        doc_cursor.close()
+        if patient_id:
+            queue_notification(cur2, "medication_updated", patient_id=patient_id, doctor_id=doctor_id,
+                               med_name=med_name, med_type=med_type, old_dosage=old_dosage, new_dosage=new_dosage)
     db.commit()
     cur.close()
     cur2.close()
@@ -526,17 +989,9 @@ def delete_medication(med_id):
             (med_id, doctor_id, "delete", old_dosage, None)
         )
         # Notify patient about removal
-        doc_cursor = db.cursor(dictionary=True)
-        doc_cursor.execute("SELECT name FROM users WHERE id=%s", (doctor_id,))
-        doctor_name = (doc_cursor.fetchone() or {}).get('name', 'Your doctor')
-        notif_title = f"Medication removed by {doctor_name}"
-        notif_body = f"{doctor_name} removed {med_name} ({med_type}), dosage: {old_dosage}"
-        doc_cursor.execute(
-            "INSERT INTO notifications (user_id, type, title, body) VALUES (%s, %s, %s, %s)",
-            (patient_id, 'medication', notif_title, notif_body)
-        )
-        db.commit()
-        doc_cursor.close()
+        if patient_id:
+            queue_notification(cur2, "medication_removed", patient_id=patient_id, doctor_id=doctor_id,
+                               med_name=med_name, med_type=med_type, dosage=old_dosage)
     db.commit()
     cur.close()
     cur2.close()
@@ -569,16 +1024,19 @@ def add_meal():
 
 @app.route("/meals/<int:user_id>", methods=["GET"])
 def get_meals(user_id):
+    page = Page(20)
+    where, params = page.where("timestamp", "id")
     db = get_db()
     cursor = db.cursor(dictionary=True)
     cursor.execute(
-        "SELECT id, timestamp, description, calories, carbs, protein, fat FROM meals WHERE user_id=%s ORDER BY timestamp DESC LIMIT 20",
-        (user_id,)
+        "SELECT id, timestamp, description, calories, carbs, protein, fat FROM meals WHERE user_id=%s"
+        + where + page.order_by("timestamp", "id"),
+        [user_id] + params
     )
-    meals = cursor.fetchall()
+    meals = page.finish(cursor.fetchall())
     cursor.close()
     db.close()
-    return jsonify(meals)
+    return page.response(meals)
 @app.route("/meals/<int:meal_id>", methods=["DELETE"])
 def delete_meal(meal_id):
     db = get_db()
@@ -600,15 +1058,24 @@ def add_reminder():
     frequency = data.get("frequency", "once")
     if not user_id or not title or not type_ or not time:
         return jsonify({"error": "All fields required"}), 400
+    if frequency not in reminder_scheduler.FREQUENCIES:
+        return jsonify({"error": f"frequency must be one of: {', '.join(reminder_scheduler.FREQUENCIES)}"}), 400
+    try:
+        next_fire_at = reminder_scheduler.first_fire(time, frequency, datetime.now())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     db = get_db()
     cursor = db.cursor()
     cursor.execute(
-        "INSERT INTO reminders (user_id, title, type, time, frequency) VALUES (%s, %s, %s, %s, %s)",
-        (user_id, title, type_, time, frequency)
+        "INSERT INTO reminders (user_id, title, type, time, frequency, anchor_day, next_fire_at) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        (user_id, title, type_, time, frequency, reminder_scheduler.anchor_day(frequency, next_fire_at), next_fire_at)
     )
+    reminder_id = cursor.lastrowid
     db.commit()
     cursor.close()
     db.close()
+    reminder_dispatcher.schedule(reminder_id, next_fire_at)
     return jsonify({"message": "Reminder added"})
 # --- Update Reminder ---
 @app.route("/reminders/<int:reminder_id>", methods=["PUT"])
@@ -620,15 +1087,23 @@ def update_reminder(reminder_id):
     frequency = data.get("frequency", "once")
     if not title or not type_ or not time:
         return jsonify({"error": "All fields required"}), 400
+    if frequency not in reminder_scheduler.FREQUENCIES:
+        return jsonify({"error": f"frequency must be one of: {', '.join(reminder_scheduler.FREQUENCIES)}"}), 400
+    try:
+        # A new time or frequency restarts the schedule from now
+        next_fire_at = reminder_scheduler.first_fire(time, frequency, datetime.now())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     db = get_db()
     cursor = db.cursor()
     cursor.execute(
-        "UPDATE reminders SET title=%s, type=%s, time=%s, frequency=%s WHERE id=%s",
-        (title, type_, time, frequency, reminder_id)
+        "UPDATE reminders SET title=%s, type=%s, time=%s, frequency=%s, anchor_day=%s, next_fire_at=%s WHERE id=%s",
+        (title, type_, time, frequency, reminder_scheduler.anchor_day(frequency, next_fire_at), next_fire_at, reminder_id)
     )
     db.commit()
     cursor.close()
     db.close()
+    reminder_dispatcher.schedule(reminder_id, next_fire_at)
     return jsonify({"message": "Reminder updated"})
 # --- Delete Reminder ---
 @app.route("/reminders/<int:reminder_id>", methods=["DELETE"])
@@ -639,6 +1114,7 @@ def delete_reminder(reminder_id):
     db.commit()
     cursor.close()
     db.close()
+    reminder_dispatcher.cancel(reminder_id)
     return jsonify({"message": "Reminder deleted"})
 # --- Get Reminders for User ---
 @app.route("/reminders/<int:user_id>", methods=["GET"])
@@ -669,54 +1145,82 @@ def send_message():
     message = data.get("message")
     if not sender_id or not receiver_id or not message:
         return jsonify({"error": "All fields required"}), 400
+    sender_id, receiver_id = int(sender_id), int(receiver_id)
+    now = datetime.now().replace(microsecond=0)
     db = get_db()
     cursor = db.cursor()
     cursor.execute(
-        "INSERT INTO messages (sender_id, receiver_id, message) VALUES (%s, %s, %s)",
-        (sender_id, receiver_id, message)
+        "INSERT INTO messages (conversation_id, sender_id, receiver_id, message, timestamp) VALUES (%s, %s, %s, %s, %s)",
+        (conversations.conversation_id(sender_id, receiver_id), sender_id, receiver_id, message, now)
     )
+    conversations.record_message(cursor, sender_id, receiver_id, cursor.lastrowid, message, now)
     # Notification for receiver (doctor or patient)
-    # Get patient name if sender is patient and receiver is doctor
-    sender_name = get_patient_name(sender_id)
-    receiver_role = None
-    c2 = db.cursor(dictionary=True)
-    c2.execute("SELECT role FROM users WHERE id=%s", (receiver_id,))
-    row = c2.fetchone()
-    if row:
-        receiver_role = row['role']
-    notif_title = "New Message"
-    notif_body = message
-    if receiver_role == "doctor":
-        notif_title = f"New message from {sender_name}"
-        notif_body = f"{sender_name}: {message}"
-    cursor.execute(
-        "INSERT INTO notifications (user_id, type, title, body) VALUES (%s, %s, %s, %s)",
-        (receiver_id, 'message', notif_title, notif_body)
-    )
+    queue_notification(cursor, "message", sender_id=sender_id, receiver_id=receiver_id, message=message)
     db.commit()
-    c2.close()
     cursor.close()
     db.close()
     return jsonify({"message": "Message sent"})
 
+def messages_page_query(page, user1_id, user2_id):
+    # Both directions share one conversation_id: a single range scan on (conversation_id, timestamp)
+    where, params = page.where("timestamp", "id")
+    return (
+        "SELECT id, sender_id, receiver_id, message, timestamp FROM messages WHERE conversation_id=%s"
+        + where + page.order_by("timestamp", "id"),
+        [conversations.conversation_id(user1_id, user2_id)] + params
+    )
+
 @app.route("/messages/<int:user1_id>/<int:user2_id>", methods=["GET"])
 def get_messages(user1_id, user2_id):
+    page = Page(40)
+    db = get_db()
+    cursor = db.cursor(dictionary=True)
+    cursor.execute(*messages_page_query(page, user1_id, user2_id))
+    msgs = page.finish(cursor.fetchall())
+    cursor.close()
+    db.close()
+    # Return in chronological order
+    return page.response(list(reversed(msgs)))
+
+# --- Conversations inbox: one row per conversation, most recent first ---
+@app.route("/conversations/<int:user_id>", methods=["GET"])
+def get_conversations(user_id):
+    page = Page(30)
+    where, params = page.where("cs.last_message_at", "cs.other_id")
     db = get_db()
     cursor = db.cursor(dictionary=True)
     cursor.execute(
-        """
-        SELECT sender_id, receiver_id, message, timestamp 
-        FROM messages 
-        WHERE (sender_id=%s AND receiver_id=%s) OR (sender_id=%s AND receiver_id=%s)
-        ORDER BY timestamp DESC LIMIT 40
-        """,
-        (user1_id, user2_id, user2_id, user1_id)
+        "SELECT cs.other_id, u.name AS other_name, u.role AS other_role, cs.last_message, cs.last_sender_id, "
+        "cs.last_message_at, cs.unread FROM conversation_summaries cs JOIN users u ON u.id = cs.other_id "
+        "WHERE cs.user_id=%s" + where + page.order_by("cs.last_message_at", "cs.other_id"),
+        [user_id] + params
     )
-    msgs = cursor.fetchall()
+    rows = page.finish(cursor.fetchall(), ts_key="last_message_at", id_key="other_id")
     cursor.close()
     db.close()
-    # Return in chronological order
-    return jsonify(list(reversed(msgs)))
+    return page.response(rows)
+
+@app.route("/conversations/<int:user_id>/<int:other_id>/read", methods=["PUT"])
+def mark_conversation_read(user_id, other_id):
+    db = get_db()
+    cursor = db.cursor()
+    cursor.execute(
+        "UPDATE conversation_summaries SET unread=0 WHERE user_id=%s AND other_id=%s",
+        (user_id, other_id)
+    )
+    db.commit()
+    cursor.close()
+    db.close()
+    return jsonify({"message": "Conversation marked as read"})
+
+# flask --app app rebuild-conversations
+@app.cli.command("rebuild-conversations")
+def rebuild_conversations_command():
+    db = pool.acquire()
+    try:
+        click.echo(conversations.rebuild(db))
+    finally:
+        db.close()
 
 # --- Articles ---
 @app.route("/articles", methods=["POST"])
@@ -734,21 +1238,43 @@ def add_article():
         (doctor_id, title, content)
     )
     db.commit()
+    response_cache.invalidate("articles")
     cursor.close()
     db.close()
     return jsonify({"message": "Article posted"})
 
+# ?fields=summary drops the body for a short excerpt; GET /articles/<id> has the full text
 @app.route("/articles", methods=["GET"])
 def get_articles():
+    fields = fieldsets.ARTICLES.pick()
+    def load():
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        cursor.execute(
+            "SELECT " + fields.sql + " FROM articles a JOIN users u ON a.doctor_id=u.id ORDER BY a.timestamp DESC"
+        )
+        articles = cursor.fetchall()
+        cursor.close()
+        db.close()
+        return articles
+    key = "articles?" + fields.key if fields.key else "articles"
+    return response_cache.respond(key, load, app.json.dumps)
+
+@app.route("/articles/<int:article_id>", methods=["GET"])
+def get_article(article_id):
     db = get_db()
     cursor = db.cursor(dictionary=True)
     cursor.execute(
-        "SELECT articles.id, articles.title, articles.content, articles.timestamp, users.name as doctor_name FROM articles JOIN users ON articles.doctor_id=users.id ORDER BY articles.timestamp DESC"
+        "SELECT a.id, a.title, a.content, a.timestamp, a.doctor_id, u.name as doctor_name "
+        "FROM articles a LEFT JOIN users u ON a.doctor_id=u.id WHERE a.id=%s",
+        (article_id,)
     )
-    articles = cursor.fetchall()
+    article = cursor.fetchone()
     cursor.close()
     db.close()
-    return jsonify(articles)
+    if not article:
+        return jsonify({"error": "Article not found"}), 404
+    return jsonify(article)
 
 # --- Challenges ---
 @app.route("/challenges", methods=["POST"])
@@ -768,6 +1294,7 @@ def create_challenge():
         (creator_id, title, description, start_date, end_date)
     )
     db.commit()
+    response_cache.invalidate("challenges")
     cursor.close()
     db.close()
     return jsonify({"message": "Challenge created"})
@@ -810,22 +1337,27 @@ def leave_challenge():
 
 @app.route("/challenges", methods=["GET"])
 def get_challenges():
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-    cursor.execute(
-        "SELECT challenges.*, users.name as creator_name FROM challenges JOIN users ON challenges.creator_id=users.id ORDER BY start_date DESC"
-    )
-    challenges = cursor.fetchall()
-    cursor.close()
-    db.close()
-    return jsonify(challenges)
+    fields = fieldsets.CHALLENGES.pick()
+    def load():
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        cursor.execute(
+            "SELECT " + fields.sql + " FROM challenges c JOIN users u ON c.creator_id=u.id ORDER BY c.start_date DESC"
+        )
+        challenges = cursor.fetchall()
+        cursor.close()
+        db.close()
+        return challenges
+    key = "challenges?" + fields.key if fields.key else "challenges"
+    return response_cache.respond(key, load, app.json.dumps)
 
 @app.route("/challenges/user/<int:user_id>", methods=["GET"])
 def get_user_challenges(user_id):
+    fields = fieldsets.CHALLENGES.pick()
     db = get_db()
     cursor = db.cursor(dictionary=True)
     cursor.execute("""
-        SELECT c.*, u.name as creator_name 
+        SELECT """ + fields.sql + """
         FROM challenge_participants cp
         JOIN challenges c ON cp.challenge_id = c.id
         JOIN users u ON c.creator_id = u.id
@@ -853,6 +1385,7 @@ def add_faq():
         (question, answer, doctor_id)
     )
     db.commit()
+    response_cache.invalidate("faqs")
     cursor.close()
     db.close()
     return jsonify({"message": "FAQ submitted"})
@@ -871,35 +1404,140 @@ def answer_faq(faq_id):
         (answer, doctor_id, faq_id)
     )
     db.commit()
+    response_cache.invalidate("faqs")
     cursor.close()
     db.close()
     return jsonify({"message": "FAQ answered"})
 
 @app.route("/faqs", methods=["GET"])
 def get_faqs():
+    def load():
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT faqs.id, faqs.question, faqs.answer, faqs.timestamp, users.name as doctor_name
+            FROM faqs LEFT JOIN users ON faqs.doctor_id = users.id
+            ORDER BY faqs.timestamp DESC
+        """)
+        faqs = cursor.fetchall()
+        cursor.close()
+        db.close()
+        return faqs
+    return response_cache.respond("faqs", load, app.json.dumps)
+# --- Search over articles and FAQs (FULLTEXT, ranked, snippets) ---
+# ?q=...&type=all|articles|faqs&limit=20&offset=0; X-Has-More tells if another page exists
+SEARCH_TYPES = {"all": ("articles", "faqs"), "articles": ("articles",), "faqs": ("faqs",)}
+MAX_SEARCH_LIMIT = 50
+MAX_SEARCH_OFFSET = 1000
+
+@app.route("/search", methods=["GET"])
+def search_content():
+    q = (request.args.get("q") or "").strip()
+    if not search.terms(q):
+        return jsonify({"error": "q needs at least one word of 3 or more characters"}), 400
+    kinds = SEARCH_TYPES.get(request.args.get("type", "all"))
+    if kinds is None:
+        return jsonify({"error": "type must be all, articles or faqs"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), MAX_SEARCH_LIMIT))
+        offset = max(0, min(int(request.args.get("offset", 0)), MAX_SEARCH_OFFSET))
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers"}), 400
     db = get_db()
-    cursor = db.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT faqs.id, faqs.question, faqs.answer, faqs.timestamp, users.name as doctor_name
-        FROM faqs LEFT JOIN users ON faqs.doctor_id = users.id
-        ORDER BY faqs.timestamp DESC
-    """)
-    faqs = cursor.fetchall()
-    cursor.close()
+    hits, has_more = search.search(db, q, kinds, limit, offset)
     db.close()
-    return jsonify(faqs)
+    resp = jsonify(hits)
+    resp.headers["X-Has-More"] = "1" if has_more else "0"
+    return resp
+
+# --- Full history export (streamed) ---
+# ?format=ndjson|csv, ?sections=glucose_logs,meals,... (default all),
+# ?from/?to ISO dates on each section's own time column (to is exclusive)
+@app.route("/export/<int:patient_id>", methods=["GET"])
+def export_patient(patient_id):
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in export.FORMATS:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    sections = [s.strip() for s in request.args.get("sections", "").split(",") if s.strip()] or list(export.SECTIONS)
+    unknown = [s for s in sections if s not in export.SECTIONS]
+    if unknown:
+        return jsonify({"error": f"Unknown section: {unknown[0]}. Available: {', '.join(export.SECTIONS)}"}), 400
+    try:
+        start = datetime.fromisoformat(request.args["from"]) if request.args.get("from") else None
+        end = datetime.fromisoformat(request.args["to"]) if request.args.get("to") else None
+    except ValueError:
+        return jsonify({"error": "from/to must be ISO dates or datetimes"}), 400
+
+    db = get_db()
+    c = db.cursor()
+    c.execute("SELECT id FROM users WHERE id=%s", (patient_id,))
+    found = c.fetchone()
+    c.close()
+    db.close()
+    if not found:
+        return jsonify({"error": "Patient not found"}), 404
+
+    mimetype, ext = export.FORMATS[fmt]
+    body = export.WRITERS[fmt](pool, patient_id, sections, start, end, retention_policy.boundaries())
+    return Response(body, mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="patient-{patient_id}.{ext}"',
+        "X-Accel-Buffering": "no",
+    })
+
+# --- Glucose graph: time range, downsampled server-side ---
+# ?from=&to= (ISO datetimes, default last 30 days), ?points=N (default 300),
+# ?method=lttb|minmax. Rows are streamed from an unbuffered cursor through the
+# downsampler, so a 3-month CGM range never sits in memory in full.
+MAX_GRAPH_POINTS = 5000
+
+def iter_rows(cursor, size=2000):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield from rows
+
 @app.route("/glucose/graph/<int:user_id>", methods=["GET"])
 def get_glucose_for_graph(user_id):
+    try:
+        end = datetime.fromisoformat(request.args["to"]) if request.args.get("to") else datetime.now()
+        start = datetime.fromisoformat(request.args["from"]) if request.args.get("from") else end - timedelta(days=30)
+        points = int(request.args.get("points", 300))
+    except ValueError:
+        return jsonify({"error": "from/to must be ISO datetimes and points an integer"}), 400
+    method = downsample.METHODS.get(request.args.get("method", "lttb"))
+    if method is None:
+        return jsonify({"error": "method must be lttb or minmax"}), 400
+    if start >= end:
+        return jsonify({"error": "from must be before to"}), 400
+    points = max(3, min(points, MAX_GRAPH_POINTS))
+
     db = get_db()
     cursor = db.cursor(dictionary=True)
-    cursor.execute(
-        "SELECT timestamp, glucose_level, context, category FROM glucose_logs WHERE user_id=%s ORDER BY timestamp ASC LIMIT 100",
-        (user_id,)
-    )
-    logs = cursor.fetchall()
+    boundaries = retention_policy.boundaries()
+    # Last reading in the range (one index lookup per table): buckets end where the data does
+    cursor.execute(*retention.covering(
+        "SELECT MAX(timestamp) AS last FROM {table} WHERE user_id=%s AND timestamp >= %s AND timestamp <= %s",
+        (user_id, start, end), "glucose_logs", start, boundaries
+    ))
+    last = max((r["last"] for r in cursor.fetchall() if r["last"] is not None), default=end)
+    cursor.execute(*retention.covering(
+        "SELECT id, timestamp, glucose_level, context, category FROM {table} "
+        "WHERE user_id=%s AND timestamp >= %s AND timestamp <= %s",
+        (user_id, start, end), "glucose_logs", start, boundaries, " ORDER BY timestamp, id"
+    ))
+    scanned = 0
+    def counted(rows):
+        nonlocal scanned
+        for row in rows:
+            scanned += 1
+            yield row
+    logs = list(method(counted(iter_rows(cursor)), start, last, points))
     cursor.close()
     db.close()
-    return jsonify(logs)
+    resp = jsonify(logs)
+    resp.headers["X-Source-Count"] = str(scanned)
+    return resp
 # --- Physical Activity: Add Activity ---
 @app.route("/activities", methods=["POST"])
 def add_activity():
@@ -934,17 +1572,32 @@ def delete_activity(activity_id):
 # --- Physical Activity: Get User Activities ---
 @app.route("/activities/<int:user_id>", methods=["GET"])
 def get_activities(user_id):
+    page = Page(30)
+    fields = fieldsets.ACTIVITIES.pick()
+    where, params = page.where("timestamp", "id")
     db = get_db()
     cur = db.cursor(dictionary=True)
     cur.execute(
-        "SELECT * FROM physical_activities WHERE user_id=%s ORDER BY timestamp DESC LIMIT 30",
-        (user_id,)
+        "SELECT " + fields.sql + " FROM physical_activities WHERE user_id=%s" + where + page.order_by("timestamp", "id"),
+        [user_id] + params
     )
-    activities = cur.fetchall()
+    activities = fields.trim(page.finish(cur.fetchall()))
     cur.close()
     db.close()
-    return jsonify(activities)
+    return page.response(activities)
 # --- Appointments API ---
+# Bookings lock the doctor's row, then check for overlaps (availability.py);
+# a clash is a 409 listing the appointments in the way.
+
+def parse_appointment_time(value):
+    # Clients send local ISO datetimes; an offset, if any, is dropped as MySQL would
+    return datetime.fromisoformat(str(value)).replace(tzinfo=None)
+
+def conflict_response(db, c, e):
+    db.rollback()
+    c.close()
+    db.close()
+    return jsonify({"error": str(e), "conflicts": e.appointments}), 409
 
 @app.route("/appointments", methods=["POST"])
 def create_appointment():
@@ -955,23 +1608,38 @@ def create_appointment():
     notes = data.get("notes", "")
     if not (doctor_id and patient_id and appointment_time):
         return jsonify({"error": "doctor_id, patient_id, appointment_time required"}), 400
+    try:
+        appointment_time = parse_appointment_time(appointment_time)
+        duration = int(data["duration_minutes"]) if data.get("duration_minutes") else None
+    except ValueError:
+        return jsonify({"error": "appointment_time must be an ISO datetime, duration_minutes an integer"}), 400
+    if duration is not None and not 5 <= duration <= availability.MAX_SLOT_MINUTES:
+        return jsonify({"error": f"duration_minutes must be 5-{availability.MAX_SLOT_MINUTES}"}), 400
     db = get_db()
     c = db.cursor()
+    slot_minutes = availability.lock_doctor(c, doctor_id)
+    if slot_minutes is None:
+        db.rollback()
+        c.close()
+        db.close()
+        return jsonify({"error": "Doctor not found"}), 404
+    duration = duration or slot_minutes
+    try:
+        availability.check_free(c, doctor_id, appointment_time, duration)
+    except availability.Conflict as e:
+        return conflict_response(db, c, e)
     c.execute(
-        "INSERT INTO appointments (doctor_id, patient_id, appointment_time, notes) VALUES (%s, %s, %s, %s)",
-        (doctor_id, patient_id, appointment_time, notes)
+        "INSERT INTO appointments (doctor_id, patient_id, appointment_time, duration_minutes, notes) "
+        "VALUES (%s, %s, %s, %s, %s)",
+        (doctor_id, patient_id, appointment_time, duration, notes)
     )
+    appointment_id = c.lastrowid
     # --- NOTIFICATION LOGIC ---
-    notif_title = "New Appointment"
-    notif_body = "You have a new appointment scheduled."
-    c.execute(
-        "INSERT INTO notifications (user_id, type, title, body) VALUES (%s, %s, %s, %s)",
-        (patient_id, 'appointment', notif_title, notif_body)
-    )
+    queue_notification(c, "appointment_created", patient_id=patient_id, doctor_id=doctor_id)
     db.commit()
     c.close()
     db.close()
-    return jsonify({"message": "Appointment scheduled"})
+    return jsonify({"message": "Appointment scheduled", "id": appointment_id})
 
 @app.route("/appointments/<int:appointment_id>", methods=["PUT"])
 def update_appointment(appointment_id):
@@ -979,32 +1647,28 @@ def update_appointment(appointment_id):
     appointment_time = data.get("appointment_time")
     notes = data.get("notes", "")
     status = data.get("status")
+    try:
+        appointment_time = parse_appointment_time(appointment_time) if appointment_time else None
+    except ValueError:
+        return jsonify({"error": "appointment_time must be an ISO datetime"}), 400
     db = get_db()
     c = db.cursor()
+    c.execute("SELECT patient_id, doctor_id, duration_minutes FROM appointments WHERE id=%s", (appointment_id,))
+    row = c.fetchone()
+    if row and appointment_time is not None and status not in ("cancelled", "completed"):
+        availability.lock_doctor(c, row[1])
+        try:
+            availability.check_free(c, row[1], appointment_time, row[2], exclude_id=appointment_id)
+        except availability.Conflict as e:
+            return conflict_response(db, c, e)
     c.execute(
         "UPDATE appointments SET appointment_time=%s, notes=%s, status=%s WHERE id=%s",
         (appointment_time, notes, status, appointment_id)
     )
-    c.execute("SELECT patient_id, doctor_id FROM appointments WHERE id=%s", (appointment_id,))
-    row = c.fetchone()
     if row:
-        patient_id, doctor_id = row
-        patient_name = get_patient_name(patient_id)
-        # Notify patient
-        notif_title = "Appointment Updated"
-        notif_body = "Your appointment was updated."
-        c.execute(
-            "INSERT INTO notifications (user_id, type, title, body) VALUES (%s, %s, %s, %s)",
-            (patient_id, 'appointment', notif_title, notif_body)
-        )
-        # If patient rescheduled, notify doctor as well
-        if status and status.lower() == "rescheduled":
-            doc_notif_title = f"{patient_name} rescheduled an appointment"
-            doc_notif_body = f"{patient_name} has rescheduled their appointment. Please review."
-            c.execute(
-                "INSERT INTO notifications (user_id, type, title, body) VALUES (%s, %s, %s, %s)",
-                (doctor_id, 'appointment', doc_notif_title, doc_notif_body)
-            )
+        patient_id, doctor_id = row[0], row[1]
+        # Notify patient (and doctor if rescheduled)
+        queue_notification(c, "appointment_updated", patient_id=patient_id, doctor_id=doctor_id, status=status)
     db.commit()
     c.close()
     db.close()
@@ -1017,79 +1681,284 @@ def delete_appointment(appointment_id):
     row = c.fetchone()
     if row:
         patient_id, doctor_id = row
-        patient_name = get_patient_name(patient_id)
-        notif_title = "Appointment Cancelled"
-        notif_body = "Your appointment was cancelled."
-        c.execute(
-            "INSERT INTO notifications (user_id, type, title, body) VALUES (%s, %s, %s, %s)",
-            (patient_id, 'appointment', notif_title, notif_body)
-        )
-        # Notify doctor as well
-        doc_notif_title = f"{patient_name} cancelled an appointment"
-        doc_notif_body = f"{patient_name} has cancelled their appointment."
-        c.execute(
-            "INSERT INTO notifications (user_id, type, title, body) VALUES (%s, %s, %s, %s)",
-            (doctor_id, 'appointment', doc_notif_title, doc_notif_body)
-        )
+        # Notify patient and doctor
+        queue_notification(c, "appointment_cancelled", patient_id=patient_id, doctor_id=doctor_id)
     c.execute("DELETE FROM appointments WHERE id=%s", (appointment_id,))
     db.commit()
     c.close()
     db.close()
     return jsonify({"message": "Appointment cancelled"})
+# --- Doctor availability: working hours, slot length, free slots ---
+@app.route("/doctors/<int:doctor_id>/hours", methods=["GET"])
+def get_doctor_hours(doctor_id):
+    db = get_db()
+    c = db.cursor()
+    c.execute("SELECT slot_minutes FROM doctors WHERE user_id=%s", (doctor_id,))
+    row = c.fetchone()
+    c.execute(
+        "SELECT weekday, start_time, end_time FROM doctor_hours WHERE doctor_id=%s ORDER BY weekday, start_time",
+        (doctor_id,)
+    )
+    hours = c.fetchall()
+    c.close()
+    db.close()
+    if row is None:
+        return jsonify({"error": "Doctor not found"}), 404
+    return jsonify({
+        "slot_minutes": row[0],
+        "hours": [{"weekday": w, "start": str(s)[:-3].zfill(5), "end": str(e)[:-3].zfill(5)} for w, s, e in hours],
+    })
+
+# {"slot_minutes": 30, "hours": [{"weekday": 0, "start": "09:00", "end": "12:30"}, ...]} replaces the week
+@app.route("/doctors/<int:doctor_id>/hours", methods=["PUT"])
+def set_doctor_hours(doctor_id):
+    data = request.json or {}
+    try:
+        hours = availability.parse_hours(data.get("hours") or [])
+        slot_minutes = int(data.get("slot_minutes", 30))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if not 5 <= slot_minutes <= availability.MAX_SLOT_MINUTES:
+        return jsonify({"error": f"slot_minutes must be 5-{availability.MAX_SLOT_MINUTES}"}), 400
+    db = get_db()
+    c = db.cursor()
+    if availability.lock_doctor(c, doctor_id) is None:
+        db.rollback()
+        c.close()
+        db.close()
+        return jsonify({"error": "Doctor not found"}), 404
+    c.execute("UPDATE doctors SET slot_minutes=%s WHERE user_id=%s", (slot_minutes, doctor_id))
+    c.execute("DELETE FROM doctor_hours WHERE doctor_id=%s", (doctor_id,))
+    if hours:
+        c.executemany(
+            "INSERT INTO doctor_hours (doctor_id, weekday, start_time, end_time) VALUES (%s, %s, %s, %s)",
+            [(doctor_id, w, str(s), str(e)) for w, s, e in hours]
+        )
+    db.commit()
+    c.close()
+    db.close()
+    return jsonify({"message": "Working hours updated"})
+
+# ?from=&to= ISO datetimes (default: now to 7 days ahead, at most MAX_RANGE_DAYS)
+@app.route("/doctors/<int:doctor_id>/availability", methods=["GET"])
+def get_doctor_availability(doctor_id):
+    now = datetime.now().replace(second=0, microsecond=0)
+    try:
+        start = parse_appointment_time(request.args["from"]) if request.args.get("from") else now
+        end = parse_appointment_time(request.args["to"]) if request.args.get("to") else start + timedelta(days=7)
+    except ValueError:
+        return jsonify({"error": "from/to must be ISO datetimes"}), 400
+    start = max(start, now)
+    if end <= start or end - start > timedelta(days=availability.MAX_RANGE_DAYS):
+        return jsonify({"error": f"to must be after from, at most {availability.MAX_RANGE_DAYS} days"}), 400
+    db = get_db()
+    c = db.cursor()
+    result = availability.availability(c, doctor_id, start, end)
+    c.close()
+    db.close()
+    if result is None:
+        return jsonify({"error": "Doctor not found"}), 404
+    return jsonify(result)
+
+# {fields} comes from fieldsets.DOCTOR_APPOINTMENTS / PATIENT_APPOINTMENTS
+DOCTOR_APPOINTMENTS_SQL = """
+    SELECT {fields}
+    FROM appointments a
+    JOIN users u ON a.patient_id = u.id
+    WHERE a.doctor_id = %s
+    ORDER BY a.appointment_time ASC
+"""
+PATIENT_APPOINTMENTS_SQL = """
+    SELECT {fields}
+    FROM appointments a
+    JOIN users u ON a.doctor_id = u.id
+    WHERE a.patient_id = %s
+    ORDER BY a.appointment_time ASC
+"""
+
 @app.route("/appointments/<int:doctor_id>", methods=["GET"])
 def get_appointments(doctor_id):
+    fields = fieldsets.DOCTOR_APPOINTMENTS.pick()
     db = get_db()
     c = db.cursor(dictionary=True)
-    c.execute("""
-        SELECT a.*, u.name as patient_name, u.email as patient_email
-        FROM appointments a
-        JOIN users u ON a.patient_id = u.id
-        WHERE a.doctor_id = %s
-        ORDER BY a.appointment_time ASC
-    """, (doctor_id,))
+    c.execute(DOCTOR_APPOINTMENTS_SQL.format(fields=fields.sql), (doctor_id,))
     appointments = c.fetchall()
     c.close()
     db.close()
     return jsonify(appointments)
 @app.route("/appointments/patient/<int:patient_id>", methods=["GET"])
 def get_patient_appointments(patient_id):
+    fields = fieldsets.PATIENT_APPOINTMENTS.pick()
     db = get_db()
     c = db.cursor(dictionary=True)
-    c.execute("""
-        SELECT a.*, u.name as doctor_name, u.email as doctor_email
-        FROM appointments a
-        JOIN users u ON a.doctor_id = u.id
-        WHERE a.patient_id = %s
-        ORDER BY a.appointment_time ASC
-    """, (patient_id,))
+    c.execute(PATIENT_APPOINTMENTS_SQL.format(fields=fields.sql), (patient_id,))
     appointments = c.fetchall()
     c.close()
     db.close()
     return jsonify(appointments)
 # --- Notifications API ---
 
+# `read` is computed from the user's read watermark plus the per-item flag;
+# archived notifications are all read
+# Notification columns with the effective read flag (per-item flag or read watermark)
+NOTIFICATIONS_SELECT = (
+    "SELECT n.id, n.user_id, n.patient_id, n.type, n.title, n.body, n.created_at, "
+    + notification_state.READ_SQL + " AS `read` FROM notifications n "
+    "LEFT JOIN notification_state s ON s.user_id = n.user_id"
+)
+
+def notifications_page_query(page, user_id, archived=False):
+    where, params = page.where("n.created_at", "n.id")
+    select = (
+        "SELECT n.id, n.user_id, n.patient_id, n.type, n.title, n.body, n.created_at, n.`read` "
+        "FROM " + retention.ARCHIVES["notifications"] + " n" if archived else NOTIFICATIONS_SELECT
+    )
+    return (
+        select
+        + " WHERE n.user_id=%s" + where + page.order_by("n.created_at", "n.id"),
+        [user_id] + params
+    )
+
 @app.route("/notifications/<int:user_id>", methods=["GET"])
 def get_notifications(user_id):
+    page = Page(30)
     db = get_db()
     cur = db.cursor(dictionary=True)
-    cur.execute(
-        "SELECT * FROM notifications WHERE user_id=%s ORDER BY created_at DESC LIMIT 30",
-        (user_id,)
-    )
-    notifications = cur.fetchall()
+    cur.execute(*notifications_page_query(page, user_id))
+    rows = cur.fetchall()
+    if retention.archive_needed(page, rows, "created_at", retention_policy.boundaries().get("notifications")):
+        cur.execute(*notifications_page_query(page, user_id, archived=True))
+        rows = retention.merge(page, rows, cur.fetchall(), "created_at")
+    notifications = page.finish(rows, ts_key="created_at")
+    cur.close()
+    db.close()
+    return page.response(notifications)
+
+# --- Notification stream (Server-Sent Events) ---
+# Subscribe once instead of polling GET /notifications. Resume with ?last_id=N
+# or the Last-Event-ID header the browser/EventSource sends on reconnect.
+STREAM_HEARTBEAT = float(os.environ.get("NOTIFICATION_STREAM_HEARTBEAT", 15))
+# Re-read the cursor this often even without a wake-up, for rows written by other processes
+STREAM_RECHECK = float(os.environ.get("NOTIFICATION_STREAM_RECHECK", 60))
+
+def fetch_notifications_after(user_id, last_id, limit=100):
+    db = pool.acquire()
+    cur = db.cursor(dictionary=True)
+    try:
+        cur.execute(
+            NOTIFICATIONS_SELECT + " WHERE n.user_id=%s AND n.id>%s ORDER BY n.id LIMIT %s",
+            (user_id, last_id, limit)
+        )
+        return cur.fetchall()
+    finally:
+        cur.close()
+        db.close()
+
+@app.route("/notifications/stream/<int:user_id>", methods=["GET"])
+def stream_notifications(user_id):
+    last_id = request.args.get("last_id", request.headers.get("Last-Event-ID"))
+    if last_id is None:
+        # Only new notifications from now on
+        db = get_db()
+        c = db.cursor()
+        c.execute("SELECT COALESCE(MAX(id), 0) FROM notifications WHERE user_id=%s", (user_id,))
+        last_id = c.fetchone()[0]
+        c.close()
+        db.close()
+    try:
+        last_id = int(last_id)
+    except ValueError:
+        return jsonify({"error": "last_id must be an integer"}), 400
+
+    # Subscribe before the first read so nothing published in between is missed
+    sub = notification_hub.subscribe(user_id)
+
+    def events(cursor):
+        try:
+            yield "retry: 3000\n\n"
+            idle = 0.0
+            check = True
+            while True:
+                if check:
+                    rows = fetch_notifications_after(user_id, cursor)
+                    while rows:
+                        for row in rows:
+                            cursor = row["id"]
+                            yield f"id: {cursor}\nevent: notification\ndata: {app.json.dumps(row)}\n\n"
+                        rows = fetch_notifications_after(user_id, cursor) if len(rows) == 100 else []
+                    idle = 0.0
+                if sub.wait(STREAM_HEARTBEAT):
+                    check = True
+                else:
+                    yield ": heartbeat\n\n"
+                    idle += STREAM_HEARTBEAT
+                    check = idle >= STREAM_RECHECK
+        finally:
+            notification_hub.unsubscribe(sub)
+
+    return Response(events(last_id), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@app.route("/notifications/stream/stats", methods=["GET"])
+def get_stream_stats():
+    return jsonify(notification_hub.stats())
+
+# --- Read state: watermark + unread counter in notification_state ---
+@app.route("/notifications/<int:user_id>/unread_count", methods=["GET"])
+def get_unread_count(user_id):
+    db = get_db()
+    cur = db.cursor()
+    unread, last_read_id = notification_state.unread_count(cur, user_id)
     cur.close()
     db.close()
-    return jsonify(notifications)
+    return jsonify({"unread": unread, "last_read_id": last_read_id})
 
+# Mark all read; ?up_to=<id> (or {"up_to": id}) stops at the newest notification the client has shown
 @app.route("/notifications/mark_read/<int:user_id>", methods=["PUT"])
 def mark_notifications_read(user_id):
+    data = request.get_json(silent=True) or {}
+    up_to = request.args.get("up_to", data.get("up_to"))
+    try:
+        up_to = int(up_to) if up_to is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "up_to must be a notification id"}), 400
     db = get_db()
     cur = db.cursor()
-    cur.execute("UPDATE notifications SET read=1 WHERE user_id=%s", (user_id,))
+    notification_state.mark_all_read(cur, user_id, up_to)
     db.commit()
     cur.close()
     db.close()
     return jsonify({"message": "All notifications marked as read"})
 
+# Per-item read: {"ids": [..]}; ids at or below the watermark are already read
+@app.route("/notifications/<int:user_id>/read", methods=["PUT"])
+def mark_notifications_read_items(user_id):
+    data = request.get_json(silent=True) or {}
+    ids = data.get("ids")
+    if not isinstance(ids, list) or not ids:
+        return jsonify({"error": "ids must be a non-empty list"}), 400
+    try:
+        ids = [int(i) for i in ids]
+    except (TypeError, ValueError):
+        return jsonify({"error": "ids must be notification ids"}), 400
+    db = get_db()
+    cur = db.cursor()
+    changed = notification_state.mark_read(cur, user_id, ids)
+    db.commit()
+    cur.close()
+    db.close()
+    return jsonify({"message": "Notifications marked as read", "updated": changed})
+
+# flask --app app rebuild-notification-state  (run with writers stopped)
+@app.cli.command("rebuild-notification-state")
+def rebuild_notification_state_command():
+    db = pool.acquire()
+    try:
+        click.echo(notification_state.rebuild(db))
+    finally:
+        db.close()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0")
\ No newline at end of file
@@ -0,0 +1,223 @@
+import contextvars
+import os
+import re
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import aiomysql
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.datastructures import MultiDict
+
+import app as backend
+from auth import AuthError
+from metrics import RequestStats
+from fieldsets import BadFields, DOCTOR_APPOINTMENTS, PATIENT_APPOINTMENTS
+from pagination import Page, BadCursor
+import retention
+
+# --- ASGI serving mode ---
+#   uvicorn asgi:app --port 5000
+# The read-heavy GETs below run on the event loop against an aiomysql pool, so
+# a slow query holds a coroutine instead of a worker thread. Every other
+# request (writes, SSE, stats, CLI-backed routes) goes to the Flask app through
+# asgiref's WSGI adapter, same URLs and same JSON encoding.
+#
+# asgiref runs every WSGI request with thread_sensitive=True, i.e. on one
+# shared thread, so a single SSE subscriber or export would stall all the
+# others. Flask requests get their own pool of WSGI_THREADS threads instead;
+# each open stream holds one of them.
+ASYNC_DB_POOL_MIN = int(os.environ.get("ASYNC_DB_POOL_MIN", 5))
+ASYNC_DB_POOL_MAX = int(os.environ.get("ASYNC_DB_POOL_MAX", 50))
+WSGI_THREADS = int(os.environ.get("WSGI_THREADS", 64))
+
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+
+
+class ThreadedWsgiInstance(WsgiToAsgiInstance):
+    # Same sync body as asgiref's run_wsgi_app, unwrapped from its @sync_to_async
+    run_wsgi_app = sync_to_async(
+        WsgiToAsgiInstance.__dict__["run_wsgi_app"].func, thread_sensitive=False, executor=wsgi_executor
+    )
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await ThreadedWsgiInstance(self.wsgi_application)(scope, receive, send)
+
+
+flask_app = ThreadedWsgiToAsgi(backend.app)
+db_pool = None
+# SQL count / DB time of the async request being served, for backend.metrics
+request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+async def fetch_all(sql, params):
+    start = time.perf_counter()
+    try:
+        async with db_pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(sql, params)
+                return list(await cur.fetchall())
+    finally:
+        elapsed = time.perf_counter() - start
+        backend.metrics.query(sql, params, elapsed)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.sql += 1
+            stats.db_seconds += elapsed
+            stats.connections += 1
+
+
+# --- Async handlers: (query args, *url ids) -> (rows, extra headers) ---
+async def archive_boundaries():
+    boundaries = backend.retention_policy.cached_boundaries()
+    if boundaries is None:
+        rows = await fetch_all(retention.BOUNDARY_SQL, ())
+        boundaries = backend.retention_policy.set_boundaries([(r["table_name"], r["archived_before"]) for r in rows])
+    return boundaries
+
+
+async def get_glucose(args, user_id):
+    page = Page(30, args)
+    rows = await fetch_all(*backend.glucose_page_query(page, user_id))
+    if retention.archive_needed(page, rows, "timestamp", (await archive_boundaries()).get("glucose_logs")):
+        archived = await fetch_all(*backend.glucose_page_query(page, user_id, retention.ARCHIVES["glucose_logs"]))
+        rows = retention.merge(page, rows, archived, "timestamp")
+    logs = page.finish(rows)
+    return logs, page.headers()
+
+
+async def get_notifications(args, user_id):
+    page = Page(30, args)
+    rows = await fetch_all(*backend.notifications_page_query(page, user_id))
+    if retention.archive_needed(page, rows, "created_at", (await archive_boundaries()).get("notifications")):
+        archived = await fetch_all(*backend.notifications_page_query(page, user_id, archived=True))
+        rows = retention.merge(page, rows, archived, "created_at")
+    rows = page.finish(rows, ts_key="created_at")
+    return rows, page.headers()
+
+
+async def get_unread_count(args, user_id):
+    rows = await fetch_all("SELECT unread, last_read_id FROM notification_state WHERE user_id=%s", (user_id,))
+    row = rows[0] if rows else {"unread": 0, "last_read_id": 0}
+    return {"unread": row["unread"], "last_read_id": row["last_read_id"]}, {}
+
+
+async def get_messages(args, user1_id, user2_id):
+    page = Page(40, args)
+    msgs = page.finish(await fetch_all(*backend.messages_page_query(page, user1_id, user2_id)))
+    # Return in chronological order
+    return list(reversed(msgs)), page.headers()
+
+
+async def get_appointments(args, doctor_id):
+    fields = DOCTOR_APPOINTMENTS.pick(args)
+    return await fetch_all(backend.DOCTOR_APPOINTMENTS_SQL.format(fields=fields.sql), (doctor_id,)), {}
+
+
+async def get_patient_appointments(args, patient_id):
+    fields = PATIENT_APPOINTMENTS.pick(args)
+    return await fetch_all(backend.PATIENT_APPOINTMENTS_SQL.format(fields=fields.sql), (patient_id,)), {}
+
+
+# (path pattern, Flask rule it stands in for, used as the metrics label, handler)
+ROUTES = [
+    (re.compile(r"/glucose/(\d+)"), "/glucose/<int:user_id>", get_glucose),
+    (re.compile(r"/notifications/(\d+)"), "/notifications/<int:user_id>", get_notifications),
+    (re.compile(r"/notifications/(\d+)/unread_count"), "/notifications/<int:user_id>/unread_count", get_unread_count),
+    (re.compile(r"/messages/(\d+)/(\d+)"), "/messages/<int:user1_id>/<int:user2_id>", get_messages),
+    (re.compile(r"/appointments/patient/(\d+)"), "/appointments/patient/<int:patient_id>", get_patient_appointments),
+    (re.compile(r"/appointments/(\d+)"), "/appointments/<int:doctor_id>", get_appointments),
+]
+
+
+def match(scope):
+    if scope["type"] != "http" or scope["method"] != "GET":
+        return None, None, None
+    for pattern, rule, handler in ROUTES:
+        m = pattern.fullmatch(scope["path"])
+        if m:
+            return handler, rule, [int(x) for x in m.groups()]
+    return None, None, None
+
+
+async def respond(send, status, body, headers=None, accept_encoding=None):
+    headers = dict(headers or {})
+    # Same CORS policy as flask_cors and same gzip threshold as the Flask app
+    headers["Access-Control-Allow-Origin"] = "*"
+    headers["Access-Control-Expose-Headers"] = ", ".join(backend.EXPOSE_HEADERS)
+    headers["Content-Type"] = "application/json"
+    headers["Vary"] = "Accept-Encoding"
+    compressed = backend.compressor.compress(body, accept_encoding)
+    if compressed is not None:
+        body = compressed
+        headers["Content-Encoding"] = "gzip"
+    headers["Content-Length"] = str(len(body))
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def dumps(obj):
+    # Byte-for-byte what jsonify() produces outside debug mode
+    return (backend.app.json.dumps(obj, separators=(",", ":")) + "\n").encode()
+
+
+async def lifespan(receive, send):
+    global db_pool
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            cfg = backend.DB_CONFIG
+            db_pool = await aiomysql.create_pool(
+                host=cfg["host"], user=cfg["user"], password=cfg["password"], db=cfg["database"],
+                minsize=ASYNC_DB_POOL_MIN, maxsize=ASYNC_DB_POOL_MAX, autocommit=True,
+            )
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            db_pool.close()
+            await db_pool.wait_closed()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    handler, rule, ids = match(scope)
+    if handler is None:
+        return await flask_app(scope, receive, send)
+
+    stats = RequestStats()
+    request_stats.set(stats)
+    status = await serve(scope, send, handler, ids)
+    backend.metrics.record("GET", rule, stats, status)
+
+
+async def serve(scope, send, handler, ids):
+    # -> status code sent; every response, errors included, goes through respond() for CORS
+    request_headers = {k.decode().lower(): v.decode() for k, v in scope["headers"]}
+    args = MultiDict(parse_qsl(scope["query_string"].decode()))
+    try:
+        auth = request_headers.get("authorization", "")
+        if auth.startswith("Bearer "):
+            backend.tokens.verify(auth[7:].strip())
+        rows, headers = await handler(args, *ids)
+    except AuthError as e:
+        await respond(send, 401, dumps({"error": str(e)}))
+        return 401
+    except (BadCursor, BadFields) as e:
+        await respond(send, 400, dumps({"error": str(e)}))
+        return 400
+    except Exception:
+        traceback.print_exc()
+        await respond(send, 500, dumps({"error": "Internal server error"}))
+        return 500
+    await respond(send, 200, dumps(rows), headers, request_headers.get("accept-encoding"))
+    return 200
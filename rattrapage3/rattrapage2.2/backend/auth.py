@@ -0,0 +1,98 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# --- Signed session tokens ---
+# Stateless: the token carries user id and role, signed with the app secret
+# and timestamped, so verifying it is an HMAC check with no DB round trip.
+# Access tokens are short-lived; the refresh token (separate salt, so neither
+# can stand in for the other) only buys new access tokens.
+
+
+class AuthError(Exception):
+    pass
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class TokenSigner:
+    def __init__(self, secret, access_ttl=3600, refresh_ttl=7 * 86400):
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+        self._access = URLSafeTimedSerializer(secret, salt="access")
+        self._refresh = URLSafeTimedSerializer(secret, salt="refresh")
+
+    def issue(self, user_id, role):
+        claims = {"id": user_id, "role": role}
+        return {
+            "token": self._access.dumps(claims),
+            "refresh_token": self._refresh.dumps(claims),
+            "expires_in": self.access_ttl,
+        }
+
+    def refresh(self, refresh_token):
+        claims = self._load(self._refresh, refresh_token, self.refresh_ttl)
+        return {
+            "token": self._access.dumps(claims),
+            "expires_in": self.access_ttl,
+        }
+
+    def verify(self, token):
+        return self._load(self._access, token, self.access_ttl)
+
+    def _load(self, serializer, token, max_age):
+        try:
+            return serializer.loads(token, max_age=max_age)
+        except SignatureExpired:
+            raise AuthError("Token expired")
+        except BadSignature:
+            raise AuthError("Invalid token")
+
+
+# --- Password hashing off the request threads ---
+# check_password_hash / generate_password_hash are deliberately slow. They run
+# on a small fixed pool; at most `workers + queue` are admitted at once and the
+# rest are turned away (HasherBusy -> 503) instead of piling up.
+class PasswordHasher:
+    def __init__(self, workers=2, queue=16, timeout=10.0):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._lock = threading.Lock()
+        self._stats = {"checks": 0, "hashes": 0, "rejected": 0, "in_flight": 0}
+
+    def _run(self, kind, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise HasherBusy("Too many concurrent logins, retry shortly")
+        with self._lock:
+            self._stats[kind] += 1
+            self._stats["in_flight"] += 1
+        # The slot is held until the hash finishes, even if the caller gave up waiting
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HasherBusy("Password check timed out, retry shortly")
+
+    def _done(self, future):
+        with self._lock:
+            self._stats["in_flight"] -= 1
+        self._slots.release()
+
+    def check(self, password_hash, password):
+        return self._run("checks", check_password_hash, password_hash, password)
+
+    def hash(self, password):
+        return self._run("hashes", generate_password_hash, password)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, workers=self.workers)
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+from reminder_scheduler import parse_time
+
+# --- Doctor availability ---
+# doctor_hours holds each doctor's weekly working windows (weekday 0 = Monday)
+# and doctors.slot_minutes the slot length; every appointment keeps its own
+# duration_minutes. Booked intervals are read from the (doctor_id,
+# appointment_time) index: nothing lasts longer than MAX_SLOT_MINUTES, so an
+# overlap with [start, end) can only start in [start - MAX_SLOT_MINUTES, end)
+# and every lookup is one short range scan, however many years of history
+# the doctor has. Bookings lock the doctor's row first, so the conflict check
+# and the insert/update are atomic per doctor across processes.
+
+MAX_SLOT_MINUTES = 240
+MAX_RANGE_DAYS = 62
+# cancelled and completed appointments free their slot
+ACTIVE = "(status IS NULL OR status IN ('scheduled', 'rescheduled'))"
+
+
+class Conflict(Exception):
+    def __init__(self, appointments):
+        super().__init__("The doctor already has an appointment at that time")
+        self.appointments = appointments
+
+
+def parse_hours(items):
+    # [{"weekday": 0-6, "start": "HH:MM", "end": "HH:MM"}] -> sorted, non-overlapping rows
+    rows = []
+    for item in items:
+        weekday = item.get("weekday")
+        if not isinstance(weekday, int) or not 0 <= weekday <= 6:
+            raise ValueError("weekday must be 0 (Monday) to 6 (Sunday)")
+        start_h, start_m = parse_time(item.get("start"))
+        end_h, end_m = parse_time(item.get("end"))
+        start, end = timedelta(hours=start_h, minutes=start_m), timedelta(hours=end_h, minutes=end_m)
+        if end <= start:
+            raise ValueError("end must be after start")
+        rows.append((weekday, start, end))
+    rows.sort()
+    for a, b in zip(rows, rows[1:]):
+        if a[0] == b[0] and b[1] < a[2]:
+            raise ValueError("working hours overlap")
+    return rows
+
+
+def lock_doctor(cursor, doctor_id):
+    # Serializes bookings for one doctor; returns the slot length, None if not a doctor
+    cursor.execute("SELECT slot_minutes FROM doctors WHERE user_id=%s FOR UPDATE", (doctor_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def booked(cursor, doctor_id, start, end, exclude_id=None):
+    # Active appointments overlapping [start, end): [(start, end, id)] by start time
+    sql = (
+        "SELECT id, appointment_time, duration_minutes FROM appointments "
+        "WHERE doctor_id=%s AND appointment_time > %s AND appointment_time < %s AND " + ACTIVE
+    )
+    params = [doctor_id, start - timedelta(minutes=MAX_SLOT_MINUTES), end]
+    if exclude_id is not None:
+        sql += " AND id <> %s"
+        params.append(exclude_id)
+    cursor.execute(sql + " ORDER BY appointment_time", params)
+    out = []
+    for row_id, at, minutes in cursor.fetchall():
+        until = at + timedelta(minutes=minutes)
+        if until > start:
+            out.append((at, until, row_id))
+    return out
+
+
+def check_free(cursor, doctor_id, start, minutes, exclude_id=None):
+    # Call after lock_doctor(), in the transaction that writes the appointment
+    clashes = booked(cursor, doctor_id, start, start + timedelta(minutes=minutes), exclude_id)
+    if clashes:
+        raise Conflict([
+            {"id": row_id, "start": at.isoformat(), "end": until.isoformat()}
+            for at, until, row_id in clashes
+        ])
+
+
+def free_slots(hours, slot_minutes, busy, start, end):
+    # hours: parse_hours() rows; busy: booked() output. Slots are aligned on
+    # the working window start; one overlapping any booking is taken.
+    step = timedelta(minutes=slot_minutes)
+    windows = {}
+    for weekday, w_start, w_end in hours:
+        windows.setdefault(weekday, []).append((w_start, w_end))
+    slots = []
+    i = 0
+    day = datetime.combine(start.date(), datetime.min.time())
+    while day < end:
+        for w_start, w_end in windows.get(day.weekday(), ()):
+            at, close = day + w_start, day + w_end
+            while at + step <= close:
+                until = at + step
+                # busy is sorted by start; skip bookings that end before this slot
+                while i < len(busy) and busy[i][1] <= at:
+                    i += 1
+                j, taken = i, False
+                while j < len(busy) and busy[j][0] < until and not taken:
+                    taken = busy[j][1] > at
+                    j += 1
+                if at >= start and until <= end and not taken:
+                    slots.append({"start": at.isoformat(), "end": until.isoformat()})
+                at = until
+        day += timedelta(days=1)
+    return slots
+
+
+def availability(cursor, doctor_id, start, end):
+    cursor.execute("SELECT slot_minutes FROM doctors WHERE user_id=%s", (doctor_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    cursor.execute(
+        "SELECT weekday, start_time, end_time FROM doctor_hours WHERE doctor_id=%s ORDER BY weekday, start_time",
+        (doctor_id,)
+    )
+    hours = cursor.fetchall()
+    busy = booked(cursor, doctor_id, start, end) if hours else []
+    return {
+        "doctor_id": doctor_id,
+        "slot_minutes": row[0],
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "slots": free_slots(hours, row[0], busy, start, end),
+    }
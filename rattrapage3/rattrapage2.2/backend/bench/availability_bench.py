@@ -0,0 +1,117 @@
+# GET /doctors/<id>/availability and POST /appointments latency as a doctor's
+# appointment history grows. Needs the diabetes database from diabetes.sql;
+# writes appointments and working hours for --doctor-id (use a throwaway doctor).
+#
+#   python bench/availability_bench.py --doctor-id 2 --patient-id 5 --years 10
+#
+# History is seeded with one slot-length appointment every working half hour
+# going back --years years; each measured booking is rolled back afterwards.
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as backend
+import availability
+
+HOURS = [{"weekday": d, "start": "09:00", "end": "17:00"} for d in range(5)]
+
+
+def seed(db, doctor_id, patient_id, start, end):
+    cur = db.cursor()
+    rows = []
+    day = start
+    while day < end:
+        if day.weekday() < 5:
+            for i in range(16):
+                rows.append((doctor_id, patient_id, day + timedelta(hours=9, minutes=30 * i), 30, "completed"))
+        if len(rows) >= 5000:
+            cur.executemany(
+                "INSERT INTO appointments (doctor_id, patient_id, appointment_time, duration_minutes, status) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                rows
+            )
+            db.commit()
+            rows = []
+        day += timedelta(days=1)
+    if rows:
+        cur.executemany(
+            "INSERT INTO appointments (doctor_id, patient_id, appointment_time, duration_minutes, status) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            rows
+        )
+        db.commit()
+    cur.close()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctor-id", type=int, required=True)
+    parser.add_argument("--patient-id", type=int, required=True)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    client = backend.app.test_client()
+    resp = client.put(f"/doctors/{args.doctor_id}/hours", json={"slot_minutes": 30, "hours": HOURS})
+    if resp.status_code != 200:
+        sys.exit(resp.get_json())
+    db = backend.pool.acquire()
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    cur = db.cursor()
+    cur.execute("SELECT COUNT(*) FROM appointments WHERE doctor_id=%s", (args.doctor_id,))
+    have = cur.fetchone()[0]
+    cur.close()
+
+    print("%8s %14s %16s %16s %14s" % ("years", "appointments", "7d avail ms", "31d avail ms", "book ms"))
+    seeded_from = today
+    for years in range(1, args.years + 1):
+        start = today - timedelta(days=365 * years)
+        if have < 4000 * years:
+            seed(db, args.doctor_id, args.patient_id, start, seeded_from)
+        seeded_from = start
+        cur = db.cursor()
+        cur.execute("SELECT COUNT(*) FROM appointments WHERE doctor_id=%s", (args.doctor_id,))
+        count = cur.fetchone()[0]
+        cur.close()
+        week = timed(lambda: client.get(f"/doctors/{args.doctor_id}/availability"), args.repeat)
+        month = timed(
+            lambda: client.get(f"/doctors/{args.doctor_id}/availability?to={(today + timedelta(days=31)).isoformat()}"),
+            args.repeat
+        )
+
+        def book():
+            # Lock + overlap check + insert, as POST /appointments does, then undone
+            c = db.cursor()
+            availability.lock_doctor(c, args.doctor_id)
+            at = today + timedelta(days=3, hours=10)
+            try:
+                availability.check_free(c, args.doctor_id, at, 30)
+                c.execute(
+                    "INSERT INTO appointments (doctor_id, patient_id, appointment_time, duration_minutes) "
+                    "VALUES (%s, %s, %s, %s)",
+                    (args.doctor_id, args.patient_id, at, 30)
+                )
+            except availability.Conflict:
+                pass
+            db.rollback()
+            c.close()
+        booking = timed(book, args.repeat)
+        print("%8d %14d %16.2f %16.2f %14.2f" % (years, count, week[0], month[0], booking[0]))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
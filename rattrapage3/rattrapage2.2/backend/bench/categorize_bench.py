@@ -0,0 +1,43 @@
+# Readings/sec for scalar vs batch (NumPy) glucose categorization. No DB needed.
+#
+#   python bench/categorize_bench.py --readings 1000000
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from glucose_categories import CONTEXTS, DIABETES_TYPES, categorize_glucose, categorize_many
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readings", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    levels = [rnd.uniform(40, 300) for _ in range(args.readings)]
+    contexts = [rnd.choice(CONTEXTS) for _ in range(args.readings)]
+    types = [rnd.choice(DIABETES_TYPES) for _ in range(args.readings)]
+
+    # Mixed diabetes types (whole-table backfill) and a single type (one patient's upload)
+    for label, t in (("mixed types", types), ("single type", "Type 2")):
+        per_row = t if isinstance(t, list) else [t] * args.readings
+        start = time.perf_counter()
+        scalar = [categorize_glucose(l, c, d) for l, c, d in zip(levels, contexts, per_row)]
+        scalar_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = categorize_many(levels, contexts, t)
+        batch_time = time.perf_counter() - start
+
+        assert scalar == batch
+        print(label)
+        print("  scalar : %12.0f readings/s" % (args.readings / scalar_time))
+        print("  batch  : %12.0f readings/s" % (args.readings / batch_time))
+        print("  speedup: %12.1fx" % (scalar_time / batch_time))
+
+if __name__ == "__main__":
+    main()
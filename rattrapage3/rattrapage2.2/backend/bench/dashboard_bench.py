@@ -0,0 +1,95 @@
+# GET /doctor_dashboard/<doctor_id> against the per-patient fan-out the doctor
+# home screen used to do. Needs the diabetes database from diabetes.sql; with
+# --seed N it creates N throwaway patients (with a week of readings and two
+# medications each) assigned to --doctor-id.
+#
+#   python bench/dashboard_bench.py --doctor-id 2 --seed 200
+#
+# Both variants run through the Flask test client, so the numbers are server
+# time only; over a real network the fan-out also pays one round trip per call.
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as backend
+import glucose_rollups
+
+
+def seed(db, doctor_id, count):
+    cur = db.cursor()
+    tag = uuid.uuid4().hex[:8]
+    now = datetime.now()
+    for i in range(count):
+        cur.execute(
+            "INSERT INTO users (email, password_hash, name, role) VALUES (%s, '', %s, 'patient')",
+            (f"bench-{tag}-{i}@example.com", f"Bench patient {i}")
+        )
+        uid = cur.lastrowid
+        cur.execute("INSERT INTO patients (user_id, diabetes_type) VALUES (%s, 'Type 2')", (uid,))
+        cur.execute("INSERT INTO doctor_patient (doctor_id, patient_id) VALUES (%s, %s)", (doctor_id, uid))
+        readings = [(uid, now - timedelta(hours=4 * k), random.uniform(60, 250), "Other", "Normal") for k in range(42)]
+        cur.executemany(
+            "INSERT INTO glucose_logs (user_id, timestamp, glucose_level, context, category) VALUES (%s, %s, %s, %s, %s)",
+            readings
+        )
+        cur.executemany(
+            "INSERT INTO medications (patient_id, doctor_id, med_name, dosage, med_type) VALUES (%s, %s, %s, '1', 'Oral')",
+            [(uid, doctor_id, "Metformin"), (uid, doctor_id, "Insulin")]
+        )
+        db.commit()
+        glucose_rollups.rebuild(db, uid)
+    cur.close()
+
+
+def fan_out(client, doctor_id):
+    patients = client.get(f"/patients/{doctor_id}").get_json()
+    calls = 1
+    for p in patients:
+        for path in (f"/glucose/{p['id']}?limit=1", f"/glucose/daily_count/{p['id']}",
+                     f"/glucose/stats/{p['id']}?days=7", f"/medications/{p['id']}"):
+            client.get(path)
+            calls += 1
+    client.get(f"/notifications/{doctor_id}")
+    return calls + 1
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctor-id", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=0, help="create this many extra patients first")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.seed:
+        db = backend.pool.acquire()
+        seed(db, args.doctor_id, args.seed)
+        db.close()
+
+    client = backend.app.test_client()
+    patients = len(client.get(f"/patients/{args.doctor_id}").get_json())
+    calls = fan_out(client, args.doctor_id)
+    dash_med, dash_max = timed(lambda: client.get(f"/doctor_dashboard/{args.doctor_id}"), args.repeat)
+    fan_med, fan_max = timed(lambda: fan_out(client, args.doctor_id), args.repeat)
+    print(f"patients: {patients}")
+    print("%-12s %8s %12s %12s" % ("variant", "requests", "median ms", "max ms"))
+    print("%-12s %8d %12.1f %12.1f" % ("dashboard", 1, dash_med, dash_max))
+    print("%-12s %8d %12.1f %12.1f" % ("fan-out", calls, fan_med, fan_max))
+
+
+if __name__ == "__main__":
+    main()
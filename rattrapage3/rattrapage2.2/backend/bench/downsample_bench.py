@@ -0,0 +1,45 @@
+# Cost of the server-side graph downsampling over long CGM histories.
+# No database needed: synthetic 5-minute readings are fed straight into the
+# downsamplers the /glucose/graph route uses.
+#
+#   python bench/downsample_bench.py --days 90 --points 300
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from downsample import METHODS
+
+
+def readings(start, days):
+    for i in range(days * 288):
+        yield {
+            "id": i,
+            "timestamp": start + timedelta(minutes=5 * i),
+            "glucose_level": 130 + 50 * math.sin(i / 40) + random.gauss(0, 12),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--points", type=int, default=300)
+    args = parser.parse_args()
+
+    start = datetime(2025, 1, 1)
+    end = start + timedelta(days=args.days)
+    rows = list(readings(start, args.days))
+    print("%8s %10s %8s %10s" % ("method", "rows", "points", "ms"))
+    for name, fn in METHODS.items():
+        t = time.perf_counter()
+        out = list(fn(iter(rows), start, end, args.points))
+        ms = (time.perf_counter() - t) * 1000
+        print("%8s %10d %8d %10.1f" % (name, len(rows), len(out), ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# GET /export/<patient_id> throughput and peak Python memory. Needs the
+# diabetes database from diabetes.sql; --seed N first adds N glucose readings
+# (one every 5 minutes, going back from now) to --patient-id.
+#
+#   python bench/export_bench.py --patient-id 5 --seed 1000000
+#
+# Peak memory is tracemalloc's view of the Python heap while the body is
+# consumed chunk by chunk; it should not grow with the number of rows.
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as backend
+
+
+def seed(db, patient_id, count, batch=5000):
+    cur = db.cursor()
+    now = datetime.now()
+    for start in range(0, count, batch):
+        rows = [(patient_id, now - timedelta(minutes=5 * k), random.uniform(60, 250), "Other", "Normal")
+                for k in range(start, min(start + batch, count))]
+        cur.executemany(
+            "INSERT INTO glucose_logs (user_id, timestamp, glucose_level, context, category) VALUES (%s, %s, %s, %s, %s)",
+            rows
+        )
+        db.commit()
+    cur.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patient-id", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=0, help="add this many glucose readings first")
+    args = parser.parse_args()
+
+    if args.seed:
+        db = backend.pool.acquire()
+        seed(db, args.patient_id, args.seed)
+        db.close()
+
+    client = backend.app.test_client()
+    print("%-8s %12s %12s %10s %14s" % ("format", "lines", "MB", "seconds", "peak heap MB"))
+    for fmt in ("ndjson", "csv"):
+        tracemalloc.start()
+        start = time.perf_counter()
+        resp = client.get(f"/export/{args.patient_id}?format={fmt}", buffered=False)
+        lines = size = 0
+        for chunk in resp.response:
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+        resp.close()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print("%-8s %12d %12.1f %10.2f %14.1f" % (fmt, lines, size / 1e6, elapsed, peak / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Nearest-doctor queries on the in-memory grid (geo_index.DoctorGeoIndex)
+# against a linear scan over every doctor, at 100k doctors. Runs without the
+# database: doctors are synthetic, mostly clustered around cities, the rest
+# spread over the globe.
+#
+#   python bench/geo_bench.py --doctors 100000 --queries 2000
+#
+# Every grid answer is checked against the linear scan.
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import geo_index
+
+CITIES = [(36.75, 3.06), (35.70, -0.63), (48.85, 2.35), (40.71, -74.0), (35.68, 139.69),
+          (-33.87, 151.21), (30.04, 31.24), (-23.55, -46.63), (55.75, 37.62), (6.52, 3.38)]
+
+
+def synthetic(n, specialties):
+    rows = []
+    for i in range(1, n + 1):
+        if random.random() < 0.8:
+            lat, lng = random.choice(CITIES)
+            lat, lng = lat + random.gauss(0, 0.3), lng + random.gauss(0, 0.3)
+        else:
+            lat, lng = random.uniform(-60, 70), random.uniform(-180, 180)
+        rows.append((i, max(-90.0, min(90.0, lat)), (lng + 180) % 360 - 180, random.randint(1, specialties)))
+    return rows
+
+
+def linear(rows, lat, lng, k, radius_km, specialty_id):
+    found = (
+        (geo_index.distance_km(lat, lng, r[1], r[2]), r[0])
+        for r in rows if specialty_id is None or r[3] == specialty_id
+    )
+    if radius_km is not None:
+        found = (f for f in found if f[0] <= radius_km)
+    return heapq.nsmallest(k, found)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--specialties", type=int, default=8)
+    parser.add_argument("--cell-deg", type=float, default=0.1)
+    parser.add_argument("--linear-queries", type=int, default=50)
+    args = parser.parse_args()
+    random.seed(1)
+
+    rows = synthetic(args.doctors, args.specialties)
+    index = geo_index.DoctorGeoIndex(cell_deg=args.cell_deg)
+    start = time.perf_counter()
+    index.build(rows)
+    print(f"built {args.doctors} doctors in {(time.perf_counter() - start) * 1000:.0f} ms, {index.stats()['cells']} cells")
+    start = time.perf_counter()
+    for doctor_id, lat, lng, specialty_id in rows[:1000]:
+        index.upsert(doctor_id, lat + 0.01, lng, specialty_id)
+    print(f"upsert {(time.perf_counter() - start) * 1000:.3f} us per doctor")
+    for doctor_id, lat, lng, specialty_id in rows[:1000]:
+        index.upsert(doctor_id, lat, lng, specialty_id)
+
+    cases = [
+        ("k=10 in a city", lambda: random.choice(CITIES), 10, None, None),
+        ("k=10 anywhere", lambda: (random.uniform(-60, 70), random.uniform(-180, 180)), 10, None, None),
+        ("k=10 specialty", lambda: random.choice(CITIES), 10, None, 3),
+        ("radius 25 km", lambda: random.choice(CITIES), 100, 25.0, None),
+    ]
+    print("%-18s %12s %12s %14s %10s" % ("query", "grid p50 us", "grid p99 us", "linear p50 ms", "checked"))
+    for name, where, k, radius_km, specialty_id in cases:
+        grid, scan, checked = [], [], 0
+        for i in range(args.queries):
+            lat, lng = where()
+            lat, lng = lat + random.gauss(0, 0.1), lng + random.gauss(0, 0.1)
+            start = time.perf_counter()
+            hits = index.nearest(lat, lng, k, radius_km, specialty_id)
+            grid.append((time.perf_counter() - start) * 1e6)
+            if i < args.linear_queries:
+                start = time.perf_counter()
+                expected = linear(rows, lat, lng, k, radius_km, specialty_id)
+                scan.append((time.perf_counter() - start) * 1000)
+                if [d for _, d in hits] != [d for _, d in expected]:
+                    sys.exit(f"mismatch for {name} at ({lat}, {lng})")
+                checked += 1
+        grid.sort()
+        print("%-18s %12.1f %12.1f %14.1f %10d" % (
+            name, statistics.median(grid), grid[int(len(grid) * 0.99)], statistics.median(scan), checked))
+    print(index.stats())
+
+
+if __name__ == "__main__":
+    main()
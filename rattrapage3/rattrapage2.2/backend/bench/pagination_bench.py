@@ -0,0 +1,109 @@
+# Per-page latency of GET /glucose/<user_id> as a patient's log grows to 1M rows.
+# Needs the diabetes database from diabetes.sql; writes into glucose_logs for
+# --user-id (use a throwaway patient).
+#
+#   python bench/pagination_bench.py --user-id 1 --rows 1000000
+#
+# For each history size the first page, a page 10% deep and a page 90% deep are
+# fetched with the keyset cursor, next to the same depth with LIMIT/OFFSET.
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as backend
+from pagination import make_cursor
+
+
+def seed(db, user_id, start_count, target, start_ts):
+    cur = db.cursor()
+    batch = []
+    for i in range(start_count, target):
+        ts = start_ts + timedelta(minutes=5 * i)
+        batch.append((user_id, ts, random.uniform(60, 250), "Other", "Normal"))
+        if len(batch) == 5000:
+            cur.executemany(
+                "INSERT INTO glucose_logs (user_id, timestamp, glucose_level, context, category) VALUES (%s, %s, %s, %s, %s)",
+                batch
+            )
+            db.commit()
+            batch = []
+    if batch:
+        cur.executemany(
+            "INSERT INTO glucose_logs (user_id, timestamp, glucose_level, context, category) VALUES (%s, %s, %s, %s, %s)",
+            batch
+        )
+        db.commit()
+    cur.close()
+
+
+def cursor_at(db, user_id, depth):
+    cur = db.cursor()
+    cur.execute(
+        "SELECT timestamp, id FROM glucose_logs WHERE user_id=%s ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET %s",
+        (user_id, depth)
+    )
+    ts, row_id = cur.fetchone()
+    cur.close()
+    return make_cursor(ts, row_id)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--page-size", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    client = backend.app.test_client()
+    db = backend.pool.acquire()
+    cur = db.cursor()
+    cur.execute("SELECT COUNT(*) FROM glucose_logs WHERE user_id=%s", (args.user_id,))
+    have = cur.fetchone()[0]
+    cur.close()
+    start_ts = datetime.now() - timedelta(minutes=5 * args.rows)
+
+    print("%10s %8s %12s %12s" % ("rows", "depth", "keyset ms", "offset ms"))
+    size = 1000
+    while size <= args.rows:
+        if have < size:
+            seed(db, args.user_id, have, size, start_ts)
+            have = size
+        for frac in (0.0, 0.1, 0.9):
+            depth = int(size * frac)
+            path = "/glucose/%d?limit=%d" % (args.user_id, args.page_size)
+            if depth:
+                path += "&before=" + cursor_at(db, args.user_id, depth - 1)
+            keyset_ms = timed(lambda: client.get(path), args.repeat)
+
+            def offset_page():
+                c = db.cursor()
+                c.execute(
+                    "SELECT id, timestamp, glucose_level, context, category FROM glucose_logs WHERE user_id=%s "
+                    "ORDER BY timestamp DESC, id DESC LIMIT %s OFFSET %s",
+                    (args.user_id, args.page_size, depth)
+                )
+                c.fetchall()
+                c.close()
+            offset_ms = timed(offset_page, args.repeat)
+            print("%10d %8d %12.2f %12.2f" % (size, depth, keyset_ms, offset_ms))
+        size *= 10
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
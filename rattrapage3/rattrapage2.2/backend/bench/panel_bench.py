@@ -0,0 +1,59 @@
+# GET /reports/panel/<doctor_id> cold (computed) and warm (cached), inline and
+# with the process pool. Needs the diabetes database from diabetes.sql; seed a
+# large panel first with bench/dashboard_bench.py --seed N.
+#
+#   python bench/panel_bench.py --doctor-id 2 --days 30
+#   python bench/panel_bench.py --doctor-id 2 --days 30 --end 2024-01-15   # period in glucose_logs_archive
+#
+# Cold runs pass a different ?target each time so every request misses the cache.
+# With --end older than GLUCOSE_HOT_MONTHS the report reads the archive too
+# (run `flask retention` first); any non-200 response stops the bench.
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as backend
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctor-id", type=int, required=True)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2, 4])
+    parser.add_argument("--end", help="ISO date the period ends on (default: tomorrow)")
+    args = parser.parse_args()
+
+    client = backend.app.test_client()
+    reports = backend.panel_reports
+    path = f"/reports/panel/{args.doctor_id}?days={args.days}" + (f"&end={args.end}" if args.end else "")
+    target = 1
+    print("%-12s %10s %12s %12s" % ("workers", "patients", "median ms", "max ms"))
+    for workers in args.workers:
+        reports.workers = workers
+        reports.parallel_min_rows = 0 if workers else float("inf")
+        samples = []
+        for _ in range(args.repeat):
+            target += 1
+            start = time.perf_counter()
+            resp = client.get(f"{path}&target={target}")
+            samples.append((time.perf_counter() - start) * 1000)
+            if resp.status_code != 200:
+                sys.exit(f"{resp.status_code}: {resp.get_data(as_text=True)}")
+        patients = len(resp.get_json()["patients"])
+        print("%-12s %10d %12.1f %12.1f" % (workers or "inline", patients, statistics.median(samples), max(samples)))
+
+    samples = []
+    for _ in range(args.repeat * 4):
+        start = time.perf_counter()
+        client.get(f"{path}&target={target}")
+        samples.append((time.perf_counter() - start) * 1000)
+    print("%-12s %10s %12.1f %12.1f" % ("cached", "", statistics.median(samples), max(samples)))
+    print(reports.stats())
+
+
+if __name__ == "__main__":
+    main()
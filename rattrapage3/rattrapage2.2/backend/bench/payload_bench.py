@@ -0,0 +1,44 @@
+# Response sizes of the list endpoints with the default projection, with
+# ?fields=summary, and gzipped. Needs the diabetes database from diabetes.sql
+# with some data in it (bench/suite.py seed fills it).
+#
+#   python bench/payload_bench.py --patient-id 5 --doctor-id 2
+#
+# Sizes are the bytes the Flask app hands to the server; rows is the length of
+# the JSON list, which stays the same across the three columns.
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as backend
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patient-id", type=int, required=True)
+    parser.add_argument("--doctor-id", type=int, required=True)
+    args = parser.parse_args()
+
+    paths = [
+        "/articles",
+        "/challenges",
+        f"/challenges/user/{args.patient_id}",
+        f"/medications/{args.patient_id}",
+        f"/activities/{args.patient_id}",
+        f"/appointments/{args.doctor_id}",
+        f"/appointments/patient/{args.patient_id}",
+    ]
+    client = backend.app.test_client()
+    print("%-32s %6s %12s %12s %12s" % ("endpoint", "rows", "full bytes", "summary", "summary+gz"))
+    for path in paths:
+        full = client.get(path)
+        summary = client.get(path + "?fields=summary")
+        gz = client.get(path + "?fields=summary", headers={"Accept-Encoding": "gzip"})
+        print("%-32s %6d %12d %12d %12d" % (
+            path, len(full.get_json()), len(full.data), len(summary.data), len(gz.data)))
+    print(backend.compressor.stats())
+
+
+if __name__ == "__main__":
+    main()
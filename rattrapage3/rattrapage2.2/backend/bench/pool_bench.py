@@ -0,0 +1,61 @@
+# Requests/sec with and without the MySQL connection pool.
+# Needs the diabetes database from diabetes.sql running locally.
+#
+#   python bench/pool_bench.py --user-id 1 --doctor-id 2 --requests 2000 --threads 16
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as backend
+from db_pool import ConnectionPool
+
+
+def run(pool, paths, total, threads):
+    backend.pool = pool
+    client = backend.app.test_client()
+
+    def hit(i):
+        resp = client.get(paths[i % len(paths)])
+        return resp.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        codes = list(ex.map(hit, range(total)))
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for c in codes if c >= 400)
+    return total / elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--doctor-id", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--pool-size", type=int, default=10)
+    args = parser.parse_args()
+
+    paths = [
+        "/glucose/%d" % args.user_id,
+        "/medications/%d" % args.user_id,
+        "/notifications/%d" % args.user_id,
+        "/messages/%d/%d" % (args.user_id, args.doctor_id),
+        "/specialties",
+    ]
+
+    no_pool_rps, no_pool_err = run(ConnectionPool(backend.DB_CONFIG, size=0), paths, args.requests, args.threads)
+    pooled = ConnectionPool(backend.DB_CONFIG, size=args.pool_size)
+    pool_rps, pool_err = run(pooled, paths, args.requests, args.threads)
+
+    print("no pool : %8.1f req/s  (%d errors)" % (no_pool_rps, no_pool_err))
+    print("pooled  : %8.1f req/s  (%d errors)" % (pool_rps, pool_err))
+    print("speedup : %8.2fx" % (pool_rps / no_pool_rps if no_pool_rps else 0))
+    print("pool    :", pooled.stats())
+    pooled.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Latency of the read-heavy GETs under many concurrent clients, to compare the
+# threaded WSGI server with the ASGI mode (asgi.py). Start one server, e.g.
+#
+#   waitress-serve --threads 16 --port 5000 app:app
+#   uvicorn asgi:app --port 5001
+#
+# then point this at it:
+#
+#   python bench/read_load.py --url http://localhost:5001 --clients 1000 --users 1-200
+#
+# Each client keeps one HTTP/1.1 connection open and loops over /glucose,
+# /notifications, /messages and /appointments for --duration seconds.
+import argparse
+import asyncio
+import random
+import time
+from urllib.parse import urlparse
+
+
+def paths_for(user_id, other_id):
+    return [
+        f"/glucose/{user_id}",
+        f"/notifications/{user_id}",
+        f"/messages/{user_id}/{other_id}",
+        f"/appointments/patient/{user_id}",
+    ]
+
+
+async def read_response(reader):
+    status = await reader.readline()
+    if not status:
+        raise ConnectionError("closed")
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status.split()[1])
+
+
+async def client(host, port, user_ids, deadline, results):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        results["connect_errors"] += 1
+        return
+    try:
+        while time.perf_counter() < deadline:
+            user_id, other_id = random.sample(user_ids, 2)
+            path = random.choice(paths_for(user_id, other_id))
+            start = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            await writer.drain()
+            status = await read_response(reader)
+            results["latencies"].append(time.perf_counter() - start)
+            if status != 200:
+                results["errors"] += 1
+    except (ConnectionError, asyncio.IncompleteReadError):
+        results["dropped"] += 1
+    finally:
+        writer.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--users", default="1-100", help="range of user ids to read as, e.g. 1-100")
+    parser.add_argument("--duration", type=float, default=30.0)
+    args = parser.parse_args()
+
+    u = urlparse(args.url)
+    lo, hi = (int(x) for x in args.users.split("-"))
+    user_ids = list(range(lo, hi + 1))
+    results = {"latencies": [], "errors": 0, "dropped": 0, "connect_errors": 0}
+    deadline = time.perf_counter() + args.duration
+    await asyncio.gather(*(client(u.hostname, u.port or 80, user_ids, deadline, results) for _ in range(args.clients)))
+
+    lat = sorted(results["latencies"])
+    def pct(p):
+        return lat[min(len(lat) - 1, int(p * len(lat)))] * 1000 if lat else float("nan")
+    print(f"clients {args.clients}  requests {len(lat)}  throughput {len(lat) / args.duration:.0f} req/s")
+    print(f"p50 {pct(0.50):.1f} ms  p95 {pct(0.95):.1f} ms  p99 {pct(0.99):.1f} ms  max {pct(1.0):.1f} ms")
+    print(f"non-200 {results['errors']}  dropped {results['dropped']}  connect errors {results['connect_errors']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+# Insert and recent-read latency with a 100M-row glucose history, before and
+# after retention moves the cold months into glucose_logs_archive. Needs the
+# diabetes database from diabetes.sql; writes into glucose_logs for the first
+# --patients patients (use a throwaway database). Seeding 100M rows takes hours
+# and resumes from what is already there.
+#
+#   python bench/retention_bench.py --rows 100000000 --months 36
+#
+# Readings are spread evenly over the last --months months. Measured: a single
+# reading insert + commit (what POST /glucose does), the first page of
+# GET /glucose/<id>, a 7-day GET /glucose/graph/<id> and a graph over a month
+# that is in the archive afterwards.
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as backend
+
+BATCH = 10000
+
+
+def seed(db, patients, have, target, start_ts, span):
+    cur = db.cursor()
+    step = span / target
+    rows = []
+    for i in range(have, target):
+        ts = start_ts + timedelta(seconds=step * i)
+        rows.append((patients[i % len(patients)], ts, random.uniform(60, 250), "Other", "Normal"))
+        if len(rows) == BATCH:
+            cur.executemany(
+                "INSERT INTO glucose_logs (user_id, timestamp, glucose_level, context, category) VALUES (%s, %s, %s, %s, %s)",
+                rows
+            )
+            db.commit()
+            rows = []
+            if i % (BATCH * 100) == BATCH * 100 - 1:
+                print(f"  seeded {i + 1} rows", flush=True)
+    if rows:
+        cur.executemany(
+            "INSERT INTO glucose_logs (user_id, timestamp, glucose_level, context, category) VALUES (%s, %s, %s, %s, %s)",
+            rows
+        )
+        db.commit()
+    cur.close()
+
+
+def table_size(db, table):
+    cur = db.cursor()
+    cur.execute(
+        "SELECT SUM(data_length + index_length) FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,)
+    )
+    size = cur.fetchone()[0]
+    cur.close()
+    return int(size or 0) / 1e6
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def measure(db, client, patients, old_month, repeat):
+    def insert():
+        cur = db.cursor()
+        cur.execute(
+            "INSERT INTO glucose_logs (user_id, glucose_level, context, category) VALUES (%s, %s, %s, %s)",
+            (random.choice(patients), random.uniform(60, 250), "Other", "Normal")
+        )
+        db.commit()
+        cur.close()
+
+    now = datetime.now()
+    week = f"from={(now - timedelta(days=7)).isoformat()}&to={now.isoformat()}"
+    old = f"from={old_month.isoformat()}&to={(old_month + timedelta(days=30)).isoformat()}"
+    return {
+        "insert": timed(insert, repeat),
+        "first page": timed(lambda: client.get(f"/glucose/{random.choice(patients)}"), repeat),
+        "graph 7 days": timed(lambda: client.get(f"/glucose/graph/{random.choice(patients)}?{week}"), repeat),
+        "graph archived month": timed(lambda: client.get(f"/glucose/graph/{random.choice(patients)}?{old}"), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000000)
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--hot-months", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    client = backend.app.test_client()
+    policy = backend.retention_policy
+    policy.glucose_hot_months = args.hot_months
+    policy.notification_hot_days = 0
+    policy.publish_delay = 0
+    db = backend.pool.acquire()
+    cur = db.cursor()
+    cur.execute("SELECT user_id FROM patients ORDER BY user_id LIMIT %s", (args.patients,))
+    patients = [r[0] for r in cur.fetchall()]
+    cur.execute("SELECT COUNT(*) FROM glucose_logs")
+    have = cur.fetchone()[0]
+    cur.close()
+    if not patients:
+        sys.exit("no patients in the database")
+
+    now = datetime.now()
+    start_ts = now - timedelta(days=30 * args.months)
+    if have < args.rows:
+        print(f"seeding {args.rows - have} rows over {args.months} months")
+        seed(db, patients, have, args.rows, start_ts, (now - start_ts).total_seconds())
+    old_month = start_ts + timedelta(days=30)
+
+    print("%-22s %14s %14s %14s %14s" % ("", "before p50 ms", "before p99 ms", "after p50 ms", "after p99 ms"))
+    sizes = [table_size(db, "glucose_logs")]
+    before = measure(db, client, patients, old_month, args.repeat)
+    started = time.perf_counter()
+    policy.run()  # publishes the boundary
+    moved = policy.run()["glucose_logs"]["moved"]
+    elapsed = time.perf_counter() - started
+    sizes += [table_size(db, "glucose_logs"), table_size(db, "glucose_logs_archive")]
+    after = measure(db, client, patients, old_month, args.repeat)
+    for name in before:
+        print("%-22s %14.2f %14.2f %14.2f %14.2f" % ((name,) + before[name] + after[name]))
+    print(f"moved {moved} rows to the archive in {elapsed:.1f}s")
+    print(f"glucose_logs {sizes[0]:.0f} MB -> {sizes[1]:.0f} MB, glucose_logs_archive {sizes[2]:.0f} MB (compressed)")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# GET /search latency against a large article table. Needs the diabetes
+# database from diabetes.sql (with the FULLTEXT keys); --seed N inserts N
+# generated articles by --doctor-id first, --cleanup deletes them afterwards.
+#
+#   python bench/search_bench.py --doctor-id 2 --seed 100000 --cleanup
+#
+# Queries run through the Flask test client, so the numbers are server time
+# only. Each query is timed cold-ish (first page) and at a deep offset.
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as backend
+
+TITLE_PREFIX = "[bench] "
+VOCABULARY = (
+    "insulin glucose diet exercise carbohydrate fiber sugar meal breakfast dinner walking running "
+    "metformin dosage injection pump sensor hypoglycemia hyperglycemia ketones kidney retina foot "
+    "weight sleep stress hydration protein vegetables fruit snack pregnancy children travel fasting"
+).split()
+QUERIES = ["insulin", "glucose diet", "hypoglycemia at night", "foot care walking", "metformin dosage",
+           "pregnancy", "fasting ketones", "carbohydrate counting breakfast", "zzzunknownterm"]
+
+
+def seed(db, doctor_id, count, batch=1000):
+    rng = random.Random(17)
+    cur = db.cursor()
+    for start in range(0, count, batch):
+        rows = []
+        for _ in range(min(batch, count - start)):
+            title = TITLE_PREFIX + " ".join(rng.sample(VOCABULARY, 4)).capitalize()
+            content = ". ".join(" ".join(rng.choices(VOCABULARY, k=12)) for _ in range(rng.randint(5, 30)))
+            rows.append((title, content, doctor_id))
+        cur.executemany("INSERT INTO articles (title, content, doctor_id) VALUES (%s, %s, %s)", rows)
+        db.commit()
+    cur.close()
+
+
+def cleanup(db):
+    cur = db.cursor()
+    cur.execute("DELETE FROM articles WHERE title LIKE %s", (TITLE_PREFIX + "%",))
+    deleted = cur.rowcount
+    db.commit()
+    cur.close()
+    return deleted
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctor-id", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0, help="insert this many generated articles first")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--cleanup", action="store_true", help="delete generated articles at the end")
+    args = parser.parse_args()
+
+    if args.seed:
+        if args.doctor_id is None:
+            parser.error("--seed needs --doctor-id")
+        db = backend.pool.acquire()
+        start = time.perf_counter()
+        seed(db, args.doctor_id, args.seed)
+        print(f"seeded {args.seed} articles in {time.perf_counter() - start:.1f} s")
+        db.close()
+
+    client = backend.app.test_client()
+    print("%-34s %8s %10s %10s %10s" % ("query", "page", "p50 ms", "p95 ms", "p99 ms"))
+    for q in QUERIES:
+        for label, offset in (("first", 0), ("deep", 500)):
+            samples = []
+            for _ in range(args.repeat):
+                t = time.perf_counter()
+                resp = client.get("/search", query_string={"q": q, "limit": 20, "offset": offset})
+                samples.append((time.perf_counter() - t) * 1000)
+                assert resp.status_code == 200, resp.get_data(as_text=True)
+            print("%-34s %8s %10.1f %10.1f %10.1f" % (
+                q, label, statistics.median(samples), percentile(samples, 95), percentile(samples, 99)))
+
+    if args.cleanup:
+        db = backend.pool.acquire()
+        print(f"deleted {cleanup(db)} generated articles")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
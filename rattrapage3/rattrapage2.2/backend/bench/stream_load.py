@@ -0,0 +1,111 @@
+# How many concurrent notification-stream subscribers one server process holds.
+# Start the server first (python app.py), then:
+#
+#   python bench/stream_load.py --url http://localhost:5000 --subscribers 2000 --users 1-200 --sender 1
+#
+# Opens N SSE connections spread over the given user ids, keeps them open for
+# --hold seconds, and sends one message to every user so the delivery latency
+# through outbox -> hub -> stream is measured as well.
+import argparse
+import asyncio
+import json
+import time
+import urllib.request
+from urllib.parse import urlparse
+
+
+async def subscriber(host, port, user_id, results, delivered, stop):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        results["failed"] += 1
+        return
+    writer.write(f"GET /notifications/stream/{user_id} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await writer.drain()
+    status = await reader.readline()
+    if b" 200 " not in status:
+        results["failed"] += 1
+        writer.close()
+        return
+    results["connected"] += 1
+    try:
+        while not stop.is_set():
+            try:
+                line = await asyncio.wait_for(reader.readline(), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            if not line:
+                results["dropped"] += 1
+                break
+            if line.startswith(b": heartbeat"):
+                results["heartbeats"] += 1
+            elif line.startswith(b"data: "):
+                body = json.loads(line[6:]).get("body") or ""
+                # Doctors get "<sender>: <message>", patients the bare message
+                sent = delivered.get(body) or delivered.get(body.split(": ", 1)[-1])
+                if sent is not None:
+                    results["latencies"].append(time.perf_counter() - sent)
+    except ConnectionError:
+        results["dropped"] += 1
+    finally:
+        writer.close()
+
+
+def post_json(url, payload):
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req) as resp:
+        return resp.status
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--users", default="1-100", help="range of user ids to subscribe as, e.g. 1-100")
+    parser.add_argument("--sender", type=int, default=1, help="user id sending the probe messages")
+    parser.add_argument("--hold", type=float, default=30.0)
+    args = parser.parse_args()
+
+    u = urlparse(args.url)
+    lo, hi = (int(x) for x in args.users.split("-"))
+    user_ids = list(range(lo, hi + 1))
+    results = {"connected": 0, "failed": 0, "dropped": 0, "heartbeats": 0, "latencies": []}
+    delivered = {}
+    stop = asyncio.Event()
+
+    tasks = []
+    for i in range(args.subscribers):
+        tasks.append(asyncio.create_task(
+            subscriber(u.hostname, u.port or 80, user_ids[i % len(user_ids)], results, delivered, stop)))
+        if i % 100 == 99:
+            await asyncio.sleep(0.05)
+    await asyncio.sleep(2)
+    print(f"connected {results['connected']} / {args.subscribers} (failed {results['failed']})")
+
+    # One probe message per user, delivered through outbox -> hub -> stream
+    loop = asyncio.get_running_loop()
+    for uid in user_ids:
+        if uid == args.sender:
+            continue
+        body = f"stream probe {uid} {time.time()}"
+        delivered[body] = time.perf_counter()
+        await loop.run_in_executor(None, post_json, args.url + "/messages",
+                                   {"sender_id": args.sender, "receiver_id": uid, "message": body})
+
+    await asyncio.sleep(args.hold)
+    with urllib.request.urlopen(args.url + "/notifications/stream/stats") as resp:
+        hub = resp.read().decode()
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    lat = sorted(results["latencies"])
+    def pct(p):
+        return lat[min(len(lat) - 1, int(p * len(lat)))] * 1000 if lat else float("nan")
+    print(f"still open at end: {results['connected'] - results['dropped']}")
+    print(f"heartbeats received: {results['heartbeats']}")
+    print(f"deliveries: {len(lat)}  p50 {pct(0.50):.1f} ms  p99 {pct(0.99):.1f} ms")
+    print("hub:", hub)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
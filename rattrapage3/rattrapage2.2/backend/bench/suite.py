@@ -0,0 +1,518 @@
+# End-to-end benchmark: seed a synthetic population, replay a mixed workload
+# against every route, record per-endpoint latency percentiles.
+# Needs the diabetes database from diabetes.sql and a running server.
+#
+#   python bench/suite.py seed --doctors 20 --patients 500 --months 3 --seed 42
+#   python app.py                                   # or waitress / uvicorn asgi:app
+#   python bench/suite.py run --url http://localhost:5000 --concurrency 32 --duration 60 --out bench/results/head.json
+#   python bench/suite.py compare bench/results/base.json bench/results/head.json
+#
+# Seeded users have emails "bench-...@example.com" and password "bench", so a
+# population can be dropped again with `seed --reset`. Results are written as
+# sorted, indented JSON (one endpoint per block) so two runs diff cleanly.
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as backend
+import glucose_rollups
+import conversations
+import notification_state
+from glucose_categories import categorize_many
+
+BENCH_EMAIL = "bench-%"
+PASSWORD = "bench"
+CHUNK = 5000
+
+
+# --- Seeding ---
+def insert_many(db, sql, rows):
+    cur = db.cursor()
+    for i in range(0, len(rows), CHUNK):
+        cur.executemany(sql, rows[i:i + CHUNK])
+        db.commit()
+    cur.close()
+
+
+def bench_user_ids(db):
+    cur = db.cursor()
+    cur.execute("SELECT id, role FROM users WHERE email LIKE %s ORDER BY id", (BENCH_EMAIL,))
+    rows = cur.fetchall()
+    cur.close()
+    return [r[0] for r in rows if r[1] == "doctor"], [r[0] for r in rows if r[1] == "patient"]
+
+
+def reset(db):
+    doctors, patients = bench_user_ids(db)
+    ids = doctors + patients
+    if not ids:
+        return
+    cur = db.cursor()
+    marks = ", ".join(["%s"] * len(ids))
+    for sql in (
+        "DELETE FROM glucose_logs WHERE user_id IN ({})",
+        "DELETE FROM glucose_logs_archive WHERE user_id IN ({})",
+        "DELETE FROM glucose_rollup_hourly WHERE user_id IN ({})",
+        "DELETE FROM glucose_rollup_daily WHERE user_id IN ({})",
+        "DELETE FROM meals WHERE user_id IN ({})",
+        "DELETE FROM physical_activities WHERE user_id IN ({})",
+        "DELETE FROM reminders WHERE user_id IN ({})",
+        "DELETE FROM notifications WHERE user_id IN ({})",
+        "DELETE FROM notifications_archive WHERE user_id IN ({})",
+        "DELETE FROM messages WHERE sender_id IN ({})",
+        "DELETE FROM conversation_summaries WHERE user_id IN ({})",
+        "DELETE FROM appointments WHERE patient_id IN ({})",
+        "DELETE FROM medication_changes WHERE doctor_id IN ({})",
+        "DELETE FROM medications WHERE patient_id IN ({})",
+        "DELETE FROM challenge_participants WHERE user_id IN ({})",
+        "DELETE FROM challenges WHERE creator_id IN ({})",
+        "DELETE FROM articles WHERE doctor_id IN ({})",
+        "DELETE FROM faqs WHERE doctor_id IN ({})",
+        "DELETE FROM doctor_patient WHERE patient_id IN ({})",
+        "DELETE FROM patients WHERE user_id IN ({})",
+        "DELETE FROM doctor_hours WHERE doctor_id IN ({})",
+        "DELETE FROM doctors WHERE user_id IN ({})",
+        "DELETE FROM users WHERE id IN ({})",
+    ):
+        cur.execute(sql.format(marks), ids)
+    db.commit()
+    cur.close()
+    print(f"removed {len(doctors)} doctors and {len(patients)} patients")
+
+
+def seed(args):
+    rng = random.Random(args.seed)
+    db = backend.pool.acquire()
+    if args.reset:
+        reset(db)
+    if any(bench_user_ids(db)):
+        sys.exit("bench population already present, use --reset")
+    password_hash = backend.hasher.hash(PASSWORD)
+    now = datetime.now().replace(microsecond=0)
+    start = now - timedelta(days=30 * args.months)
+    days = (now - start).days
+
+    cur = db.cursor()
+    cur.execute("SELECT id FROM specialties")
+    specialties = [r[0] for r in cur.fetchall()] or [None]
+
+    def add_user(email, name, role):
+        cur.execute(
+            "INSERT INTO users (email, password_hash, name, role) VALUES (%s, %s, %s, %s)",
+            (email, password_hash, name, role)
+        )
+        return cur.lastrowid
+
+    doctors = []
+    for i in range(args.doctors):
+        uid = add_user(f"bench-d{i}@example.com", f"Dr Bench {i}", "doctor")
+        cur.execute(
+            "INSERT INTO doctors (user_id, specialty_id, clinic, city, country, geo_lat, geo_lng) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (uid, rng.choice(specialties), f"Clinic {i}", "Algiers", "Algeria",
+             36.75 + rng.uniform(-0.5, 0.5), 3.06 + rng.uniform(-0.5, 0.5))
+        )
+        cur.executemany(
+            "INSERT INTO doctor_hours (doctor_id, weekday, start_time, end_time) VALUES (%s, %s, %s, %s)",
+            [(uid, day, "09:00:00", "17:00:00") for day in range(5)]
+        )
+        doctors.append(uid)
+    patients = []
+    for i in range(args.patients):
+        uid = add_user(f"bench-p{i}@example.com", f"Patient Bench {i}", "patient")
+        dtype = rng.choice(["Type 1", "Type 2", "Type 2", "Prediabetes", "Gestational"])
+        cur.execute(
+            "INSERT INTO patients (user_id, diabetes_type, city, country, gender) VALUES (%s, %s, %s, %s, %s)",
+            (uid, dtype, "Algiers", "Algeria", rng.choice(["M", "F"]))
+        )
+        doctor = rng.choice(doctors)
+        cur.execute("INSERT INTO doctor_patient (doctor_id, patient_id) VALUES (%s, %s)", (doctor, uid))
+        patients.append((uid, doctor, dtype))
+    db.commit()
+    cur.close()
+
+    for n, (uid, doctor, dtype) in enumerate(patients):
+        readings = []
+        for d in range(days):
+            for _ in range(args.readings_per_day):
+                ts = start + timedelta(days=d, seconds=rng.randrange(86400))
+                readings.append((ts, round(rng.gauss(140, 45), 1), rng.choice(["Fasting", "Post-meal", "Other"])))
+        readings.sort()
+        categories = categorize_many([r[1] for r in readings], [r[2] for r in readings], dtype)
+        insert_many(db,
+            "INSERT INTO glucose_logs (user_id, timestamp, glucose_level, context, category) VALUES (%s, %s, %s, %s, %s)",
+            [(uid, ts, level, ctx, cat) for (ts, level, ctx), cat in zip(readings, categories)])
+        insert_many(db,
+            "INSERT INTO meals (user_id, timestamp, description, meal_type, calories, carbs, protein, fat) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            [(uid, start + timedelta(days=d, hours=h), "Bench meal", t, rng.randint(200, 900), rng.randint(20, 120), rng.randint(5, 50), rng.randint(5, 40))
+             for d in range(days) for h, t in ((8, "breakfast"), (13, "lunch"), (20, "dinner"))])
+        insert_many(db,
+            "INSERT INTO physical_activities (user_id, activity_type, duration_minutes, calories_burned, activity_date, timestamp) VALUES (%s, %s, %s, %s, %s, %s)",
+            [(uid, rng.choice(["Walking", "Running", "Cycling"]), rng.randint(10, 90), rng.randint(50, 600),
+              (start + timedelta(days=d)).date(), start + timedelta(days=d, hours=18)) for d in range(0, days, 2)])
+        insert_many(db,
+            "INSERT INTO messages (conversation_id, sender_id, receiver_id, message, timestamp) VALUES (%s, %s, %s, %s, %s)",
+            [(conversations.conversation_id(uid, doctor),) + ((uid, doctor) if k % 2 else (doctor, uid))
+             + (f"Bench message {k}", start + timedelta(days=k * days / 40, minutes=k)) for k in range(40)])
+        insert_many(db,
+            "INSERT INTO notifications (user_id, patient_id, type, title, body, created_at, `read`) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [(rng.choice([uid, doctor]), uid, "glucose", "Bench notification", "Bench", start + timedelta(days=k * days / 60), int(k < 50))
+             for k in range(60)])
+        insert_many(db,
+            "INSERT INTO medications (patient_id, doctor_id, med_name, dosage, med_type) VALUES (%s, %s, %s, %s, %s)",
+            [(uid, doctor, "Metformin", "500mg", "Oral"), (uid, doctor, "Insulin glargine", "10u", "Insulin")])
+        insert_many(db,
+            "INSERT INTO reminders (user_id, title, type, time, frequency) VALUES (%s, %s, %s, %s, %s)",
+            [(uid, "Check glucose", "glucose", "08:00:00", "daily"), (uid, "Metformin", "medication", "20:00:00", "daily")])
+        insert_many(db,
+            "INSERT INTO appointments (doctor_id, patient_id, appointment_time, notes) VALUES (%s, %s, %s, %s)",
+            [(doctor, uid, now + timedelta(days=rng.randint(1, 60), hours=rng.randint(8, 17)), "Bench")])
+        glucose_rollups.rebuild(db, uid)
+        if n % 50 == 49:
+            print(f"seeded {n + 1}/{len(patients)} patients")
+
+    insert_many(db, "INSERT INTO articles (doctor_id, title, content) VALUES (%s, %s, %s)",
+                [(rng.choice(doctors), f"Bench article {k}", "Lorem ipsum dolor sit amet. " * 200) for k in range(args.doctors * 3)])
+    insert_many(db, "INSERT INTO faqs (question, answer, doctor_id) VALUES (%s, %s, %s)",
+                [(f"Bench question {k}?", "Bench answer." if k % 3 else None, rng.choice(doctors)) for k in range(args.doctors * 5)])
+    insert_many(db, "INSERT INTO challenges (creator_id, title, description, start_date, end_date) VALUES (%s, %s, %s, %s, %s)",
+                [(rng.choice(doctors), f"Bench challenge {k}", "Walk every day", now.date(), (now + timedelta(days=30)).date())
+                 for k in range(10)])
+    conversations.rebuild(db)
+    notification_state.rebuild(db)
+    db.close()
+    print(f"seeded {len(doctors)} doctors, {len(patients)} patients, {days} days of history")
+
+
+# --- Workload ---
+class Population:
+    def __init__(self, db):
+        cur = db.cursor()
+        self.doctors, patient_ids = bench_user_ids(db)
+        if not patient_ids:
+            sys.exit("no bench population, run `suite.py seed` first")
+        cur.execute(
+            "SELECT patient_id, doctor_id FROM doctor_patient WHERE patient_id IN (" + ", ".join(["%s"] * len(patient_ids)) + ")",
+            patient_ids
+        )
+        self.patients = cur.fetchall()
+        self.pools = {}
+        marks = ", ".join(["%s"] * len(patient_ids))
+        for name, sql in (
+            ("meals", "SELECT id FROM meals WHERE user_id IN ({})"),
+            ("activities", "SELECT id FROM physical_activities WHERE user_id IN ({})"),
+            ("reminders", "SELECT id FROM reminders WHERE user_id IN ({})"),
+            ("appointments", "SELECT id FROM appointments WHERE patient_id IN ({})"),
+            ("medications", "SELECT id FROM medications WHERE patient_id IN ({})"),
+            ("notifications", "SELECT id, user_id FROM notifications WHERE patient_id IN ({}) AND `read` = 0"),
+        ):
+            cur.execute(sql.format(marks), patient_ids)
+            self.pools[name] = [r[0] if len(r) == 1 else r for r in cur.fetchall()]
+        cur.execute("SELECT id FROM faqs WHERE question LIKE %s", ("Bench%",))
+        self.pools["faqs"] = [r[0] for r in cur.fetchall()]
+        cur.execute("SELECT id FROM challenges WHERE title LIKE %s", ("Bench%",))
+        self.challenges = [r[0] for r in cur.fetchall()]
+        cur.execute("SELECT id FROM articles WHERE title LIKE %s", ("Bench%",))
+        self.articles = [r[0] for r in cur.fetchall()]
+        cur.close()
+        self._lock = threading.Lock()
+        self.tag = uuid.uuid4().hex[:6]
+        self.registered = 0
+        self.refresh_token = None
+
+    def take(self, name, rng):
+        # Ids consumed by DELETE/PUT ops; None once a pool runs dry
+        with self._lock:
+            pool = self.pools[name]
+            if not pool:
+                return None
+            return pool.pop(rng.randrange(len(pool)))
+
+    def next_email(self):
+        with self._lock:
+            self.registered += 1
+            return f"bench-r{self.tag}-{self.registered}@example.com"
+
+
+def ago(days):
+    return (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
+
+
+HOURS = {"slot_minutes": 30, "hours": [{"weekday": day, "start": "09:00", "end": "17:00"} for day in range(5)]}
+
+
+# (weight, method, endpoint, build(pop, rng, patient, doctor) -> (path, body) or None)
+WORKLOAD = [
+    # Patient app, reads
+    (60, "GET", "/glucose/<user_id>", lambda p, r, pt, d: (f"/glucose/{pt}", None)),
+    (25, "GET", "/glucose/stats/<user_id>", lambda p, r, pt, d: (f"/glucose/stats/{pt}", None)),
+    (25, "GET", "/glucose/daily_count/<user_id>", lambda p, r, pt, d: (f"/glucose/daily_count/{pt}", None)),
+    (15, "GET", "/glucose/graph/<user_id>", lambda p, r, pt, d: (f"/glucose/graph/{pt}?from={ago(30)}", None)),
+    (20, "GET", "/meals/<user_id>", lambda p, r, pt, d: (f"/meals/{pt}", None)),
+    (15, "GET", "/activities/<user_id>", lambda p, r, pt, d: (f"/activities/{pt}", None)),
+    (20, "GET", "/medications/<patient_id>", lambda p, r, pt, d: (f"/medications/{pt}", None)),
+    (15, "GET", "/reminders/<user_id>", lambda p, r, pt, d: (f"/reminders/{pt}", None)),
+    (40, "GET", "/notifications/<user_id>", lambda p, r, pt, d: (f"/notifications/{r.choice([pt, d])}", None)),
+    (30, "GET", "/notifications/<user_id>/unread_count", lambda p, r, pt, d: (f"/notifications/{r.choice([pt, d])}/unread_count", None)),
+    (30, "GET", "/messages/<user1_id>/<user2_id>", lambda p, r, pt, d: (f"/messages/{pt}/{d}", None)),
+    (20, "GET", "/conversations/<user_id>", lambda p, r, pt, d: (f"/conversations/{r.choice([pt, d])}", None)),
+    (5, "PUT", "/conversations/<user_id>/<other_id>/read", lambda p, r, pt, d: (f"/conversations/{pt}/{d}/read", None)),
+    (10, "GET", "/patient_profile/<user_id>", lambda p, r, pt, d: (f"/patient_profile/{pt}", None)),
+    (10, "GET", "/mydoctor/<patient_id>", lambda p, r, pt, d: (f"/mydoctor/{pt}", None)),
+    (10, "GET", "/appointments/patient/<patient_id>", lambda p, r, pt, d: (f"/appointments/patient/{pt}", None)),
+    (10, "GET", "/challenges/user/<user_id>", lambda p, r, pt, d: (f"/challenges/user/{pt}", None)),
+    # Shared lists
+    (10, "GET", "/articles", lambda p, r, pt, d: ("/articles", None)),
+    (8, "GET", "/articles/<article_id>", lambda p, r, pt, d: p.articles and (f"/articles/{r.choice(p.articles)}", None)),
+    (10, "GET", "/faqs", lambda p, r, pt, d: ("/faqs", None)),
+    (8, "GET", "/challenges", lambda p, r, pt, d: ("/challenges", None)),
+    (5, "GET", "/doctors", lambda p, r, pt, d: ("/doctors", None)),
+    (5, "GET", "/specialties", lambda p, r, pt, d: ("/specialties", None)),
+    (8, "GET", "/search", lambda p, r, pt, d: (f"/search?q={r.choice(['insulin', 'glucose', 'diet', 'exercise'])}", None)),
+    (5, "GET", "/doctors/nearby", lambda p, r, pt, d: (f"/doctors/nearby?lat={36.75 + r.uniform(-0.5, 0.5):.4f}&lng={3.06 + r.uniform(-0.5, 0.5):.4f}&k=10", None)),
+    (5, "GET", "/doctors/<doctor_id>/availability", lambda p, r, pt, d: (f"/doctors/{d}/availability", None)),
+    (2, "GET", "/doctors/<doctor_id>/hours", lambda p, r, pt, d: (f"/doctors/{d}/hours", None)),
+    # Streamed NDJSON/CSV export of a month of history, read to the end
+    (1, "GET", "/export/<patient_id>", lambda p, r, pt, d: (f"/export/{pt}?format={r.choice(['ndjson', 'csv'])}&from={ago(30)}", None)),
+    # Doctor app, reads
+    (8, "GET", "/patients/<doctor_id>", lambda p, r, pt, d: (f"/patients/{d}", None)),
+    (8, "GET", "/doctor_dashboard/<doctor_id>", lambda p, r, pt, d: (f"/doctor_dashboard/{d}", None)),
+    (8, "GET", "/appointments/<doctor_id>", lambda p, r, pt, d: (f"/appointments/{d}", None)),
+    (5, "GET", "/doctor_profile/<user_id>", lambda p, r, pt, d: (f"/doctor_profile/{d}", None)),
+    (2, "GET", "/reports/panel/<doctor_id>", lambda p, r, pt, d: (f"/reports/panel/{d}?days={r.choice([7, 14, 30])}", None)),
+    # Writes
+    (30, "POST", "/glucose", lambda p, r, pt, d: ("/glucose", {"user_id": pt, "glucose_level": round(r.gauss(140, 45), 1), "context": "Other"})),
+    (2, "POST", "/glucose/batch", lambda p, r, pt, d: ("/glucose/batch", {"user_id": pt, "readings": [
+        {"glucose_level": round(r.gauss(140, 45), 1), "timestamp": ago(k / 288)} for k in range(288)]})),
+    (10, "POST", "/meals", lambda p, r, pt, d: ("/meals", {"user_id": pt, "description": "Bench meal", "meal_type": "snack", "calories": 250})),
+    (5, "POST", "/activities", lambda p, r, pt, d: ("/activities", {"user_id": pt, "activity_type": "Walking", "duration_minutes": 30, "calories_burned": 120})),
+    (15, "POST", "/messages", lambda p, r, pt, d: ("/messages", r.choice([
+        {"sender_id": pt, "receiver_id": d, "message": "Bench question"},
+        {"sender_id": d, "receiver_id": pt, "message": "Bench answer"}]))),
+    (3, "POST", "/medications", lambda p, r, pt, d: ("/medications", {"patient_id": pt, "doctor_id": d, "med_name": "Bench med", "dosage": "1", "med_type": "Oral"})),
+    (2, "PUT", "/medications/<med_id>", lambda p, r, pt, d: (lambda m: m and (f"/medications/{m}", {"doctor_id": d, "dosage": "2"}))(p.take("medications", r))),
+    (1, "DELETE", "/medications/<med_id>", lambda p, r, pt, d: (lambda m: m and (f"/medications/{m}?doctor_id={d}", None))(p.take("medications", r))),
+    (3, "POST", "/reminders", lambda p, r, pt, d: ("/reminders", {"user_id": pt, "title": "Bench", "type": "glucose", "time": "09:00:00"})),
+    (2, "PUT", "/reminders/<reminder_id>", lambda p, r, pt, d: (lambda m: m and (f"/reminders/{m}", {"title": "Bench", "type": "glucose", "time": "10:00:00"}))(p.take("reminders", r))),
+    (1, "DELETE", "/reminders/<reminder_id>", lambda p, r, pt, d: (lambda m: m and (f"/reminders/{m}", None))(p.take("reminders", r))),
+    (1, "DELETE", "/meals/<meal_id>", lambda p, r, pt, d: (lambda m: m and (f"/meals/{m}", None))(p.take("meals", r))),
+    (1, "DELETE", "/activities/<activity_id>", lambda p, r, pt, d: (lambda m: m and (f"/activities/{m}", None))(p.take("activities", r))),
+    (3, "POST", "/appointments", lambda p, r, pt, d: ("/appointments", {"doctor_id": d, "patient_id": pt, "appointment_time": (datetime.now() + timedelta(days=r.randint(1, 60))).isoformat(timespec="seconds")})),
+    (2, "PUT", "/appointments/<appointment_id>", lambda p, r, pt, d: (lambda m: m and (f"/appointments/{m}", {"appointment_time": (datetime.now() + timedelta(days=r.randint(1, 60))).isoformat(timespec="seconds"), "status": "rescheduled"}))(p.take("appointments", r))),
+    (1, "DELETE", "/appointments/<appointment_id>", lambda p, r, pt, d: (lambda m: m and (f"/appointments/{m}", None))(p.take("appointments", r))),
+    (5, "PUT", "/notifications/mark_read/<user_id>", lambda p, r, pt, d: (f"/notifications/mark_read/{pt}", None)),
+    (3, "PUT", "/notifications/<user_id>/read", lambda p, r, pt, d: (lambda m: m and (f"/notifications/{m[1]}/read", {"ids": [m[0]]}))(p.take("notifications", r))),
+    (2, "PUT", "/patient_profile/<user_id>", lambda p, r, pt, d: (f"/patient_profile/{pt}", {"diabetes_type": "Type 2", "city": "Algiers", "country": "Algeria"})),
+    (1, "PUT", "/doctor_profile/<user_id>", lambda p, r, pt, d: (f"/doctor_profile/{d}", {"city": "Algiers", "country": "Algeria", "clinic": "Bench clinic"})),
+    (1, "PUT", "/doctors/<doctor_id>/hours", lambda p, r, pt, d: (f"/doctors/{d}/hours", HOURS)),
+    (1, "POST", "/assign_doctor", lambda p, r, pt, d: ("/assign_doctor", {"doctor_id": d, "patient_id": pt})),
+    (2, "POST", "/challenges/join", lambda p, r, pt, d: ("/challenges/join", {"challenge_id": r.choice(p.challenges), "user_id": pt})),
+    (1, "POST", "/challenges/leave", lambda p, r, pt, d: ("/challenges/leave", {"challenge_id": r.choice(p.challenges), "user_id": pt})),
+    (1, "POST", "/challenges", lambda p, r, pt, d: ("/challenges", {"creator_id": d, "title": "Bench challenge", "description": "Bench", "start_date": "2030-01-01", "end_date": "2030-02-01"})),
+    (1, "POST", "/articles", lambda p, r, pt, d: ("/articles", {"doctor_id": d, "title": "Bench article", "content": "Bench " * 500})),
+    (2, "POST", "/faqs", lambda p, r, pt, d: ("/faqs", {"question": "Bench question?"})),
+    (1, "POST", "/faqs/answer/<faq_id>", lambda p, r, pt, d: (lambda m: m and (f"/faqs/answer/{m}", {"answer": "Bench answer", "doctor_id": d}))(p.take("faqs", r))),
+    # Auth
+    (3, "POST", "/login", lambda p, r, pt, d: ("/login", {"email": f"bench-p{r.randrange(len(p.patients))}@example.com", "password": PASSWORD})),
+    (2, "POST", "/token/refresh", lambda p, r, pt, d: p.refresh_token and ("/token/refresh", {"refresh_token": p.refresh_token})),
+    (1, "POST", "/register", lambda p, r, pt, d: ("/register", {"email": p.next_email(), "password": PASSWORD, "confirm_password": PASSWORD,
+                                                                "name": "Bench signup", "role": "patient", "diabetes_type": "Type 2"})),
+    # Ops endpoints
+    (1, "GET", "/pool/stats", lambda p, r, pt, d: ("/pool/stats", None)),
+    (1, "GET", "/outbox/stats", lambda p, r, pt, d: ("/outbox/stats", None)),
+    (1, "GET", "/cache/stats", lambda p, r, pt, d: ("/cache/stats", None)),
+    (1, "GET", "/auth/stats", lambda p, r, pt, d: ("/auth/stats", None)),
+    (1, "GET", "/notifications/stream/stats", lambda p, r, pt, d: ("/notifications/stream/stats", None)),
+    (1, "GET", "/reminders/stats", lambda p, r, pt, d: ("/reminders/stats", None)),
+    (1, "GET", "/retention/stats", lambda p, r, pt, d: ("/retention/stats", None)),
+    (1, "GET", "/compression/stats", lambda p, r, pt, d: ("/compression/stats", None)),
+    (1, "GET", "/metrics", lambda p, r, pt, d: ("/metrics", None)),
+]
+# Not replayed: /notifications/stream/<user_id> is long-lived (see stream_load.py).
+
+
+def login_once(url, pop):
+    # Refresh tokens are signed by the server's SECRET_KEY, so get one from it
+    u = urlparse(url)
+    conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=60)
+    conn.request("POST", "/login", body=json.dumps({"email": "bench-p0@example.com", "password": PASSWORD}),
+                 headers={"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    body = json.loads(resp.read() or b"{}")
+    conn.close()
+    pop.refresh_token = body.get("refresh_token")
+
+
+def worker(url, pop, seed, deadline, results, lock):
+    rng = random.Random(seed)
+    u = urlparse(url)
+    conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=60)
+    weights = [w[0] for w in WORKLOAD]
+    while time.perf_counter() < deadline:
+        weight, method, endpoint, build = rng.choices(WORKLOAD, weights)[0]
+        patient, doctor = rng.choice(pop.patients)
+        req = build(pop, rng, patient, doctor)
+        if not req:
+            continue
+        path, body = req
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            status = resp.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=60)
+            status = 0
+        elapsed = time.perf_counter() - start
+        key = f"{method} {endpoint}"
+        with lock:
+            r = results.setdefault(key, {"latencies": [], "errors": 0})
+            r["latencies"].append(elapsed)
+            if status == 0 or status >= 500:
+                r["errors"] += 1
+    conn.close()
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    db = backend.pool.acquire()
+    pop = Population(db)
+    db.close()
+    login_once(args.url, pop)
+    results = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=worker, args=(args.url, pop, args.seed + i, deadline, results, lock))
+               for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    endpoints = {}
+    for key, r in results.items():
+        lat = sorted(r["latencies"])
+        endpoints[key] = {
+            "count": len(lat),
+            "errors": r["errors"],
+            "throughput": round(len(lat) / args.duration, 2),
+            "p50_ms": round(percentile(lat, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(lat, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(lat, 0.99) * 1000, 2),
+            "mean_ms": round(statistics.fmean(lat) * 1000, 2),
+        }
+    total = sum(e["count"] for e in endpoints.values())
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "seed": args.seed,
+            "doctors": len(pop.doctors),
+            "patients": len(pop.patients),
+            "requests": total,
+            "throughput": round(total / args.duration, 2),
+        },
+        "endpoints": endpoints,
+    }
+    print_table(endpoints)
+    print(f"total {total} requests, {report['meta']['throughput']} req/s")
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"wrote {args.out}")
+
+
+def print_table(endpoints):
+    print("%-42s %7s %6s %9s %9s %9s" % ("endpoint", "count", "errors", "p50 ms", "p95 ms", "p99 ms"))
+    for key in sorted(endpoints):
+        e = endpoints[key]
+        print("%-42s %7d %6d %9.2f %9.2f %9.2f" % (key, e["count"], e["errors"], e["p50_ms"], e["p95_ms"], e["p99_ms"]))
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)["endpoints"]
+    with open(args.head) as f:
+        head = json.load(f)["endpoints"]
+    print("%-42s %9s %9s %8s %9s %9s %8s" % ("endpoint", "p50 base", "p50 head", "change", "p99 base", "p99 head", "change"))
+    regressions = 0
+    for key in sorted(set(base) | set(head)):
+        b, h = base.get(key), head.get(key)
+        if not b or not h:
+            print("%-42s %s" % (key, "only in head" if h else "only in base"))
+            continue
+        d50 = 100 * (h["p50_ms"] - b["p50_ms"]) / b["p50_ms"] if b["p50_ms"] else 0.0
+        d99 = 100 * (h["p99_ms"] - b["p99_ms"]) / b["p99_ms"] if b["p99_ms"] else 0.0
+        flag = ""
+        if d99 > args.threshold or d50 > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print("%-42s %9.2f %9.2f %+7.1f%% %9.2f %9.2f %+7.1f%%%s" % (
+            key, b["p50_ms"], h["p50_ms"], d50, b["p99_ms"], h["p99_ms"], d99, flag))
+    sys.exit(1 if regressions else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("seed", help="create the synthetic population")
+    p.add_argument("--doctors", type=int, default=20)
+    p.add_argument("--patients", type=int, default=500)
+    p.add_argument("--months", type=int, default=3)
+    p.add_argument("--readings-per-day", type=int, default=8)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--reset", action="store_true", help="drop an existing bench population first")
+    p.set_defaults(fn=seed)
+
+    p = sub.add_parser("run", help="replay the mixed workload against a server")
+    p.add_argument("--url", default="http://localhost:5000")
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--duration", type=float, default=60.0)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", help="write the report as JSON, e.g. bench/results/<rev>.json")
+    p.set_defaults(fn=run)
+
+    p = sub.add_parser("compare", help="diff two reports, exit 1 on regressions")
+    p.add_argument("base")
+    p.add_argument("head")
+    p.add_argument("--threshold", type=float, default=10.0, help="percent slowdown counted as a regression")
+    p.set_defaults(fn=compare)
+
+    args = parser.parse_args()
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import gzip
+import threading
+
+from flask import request
+
+# --- gzip for large JSON responses ---
+# Bodies of at least min_size bytes are gzipped when the client accepts it.
+# Streams (SSE, exports) and 304s pass through untouched. Strong ETags become
+# weak, since the bytes on the wire differ from the ones that were hashed;
+# If-None-Match is compared weakly, so conditional GETs keep working.
+COMPRESSIBLE = ("application/json", "text/")
+
+
+def accepts_gzip(accept_encoding):
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class Compressor:
+    def __init__(self, min_size=1024, level=6):
+        self.min_size = min_size
+        self.level = level
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def compress(self, body, accept_encoding):
+        # Returns the gzipped body, or None if it should go out as is
+        if self.min_size <= 0 or len(body) < self.min_size or not accepts_gzip(accept_encoding):
+            return None
+        out = gzip.compress(body, compresslevel=self.level)
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(out)
+        return out
+
+    def init_app(self, app):
+        app.after_request(self.after_request)
+
+    def after_request(self, response):
+        if (response.is_streamed or response.direct_passthrough or response.status_code in (204, 304)
+                or "Content-Encoding" in response.headers
+                or not (response.mimetype or "").startswith(COMPRESSIBLE)):
+            return response
+        response.vary.add("Accept-Encoding")
+        body = self.compress(response.get_data(), request.headers.get("Accept-Encoding"))
+        if body is None:
+            return response
+        response.set_data(body)
+        response.headers["Content-Encoding"] = "gzip"
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                "min_size": self.min_size,
+                "compressed": self.compressed,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+            }
@@ -0,0 +1,70 @@
+# --- Conversations ---
+# A conversation is identified by its two participants, packed into one BIGINT
+# (lower id in the high 32 bits), so it never needs a lookup. messages are
+# indexed on (conversation_id, timestamp) and each participant has one row in
+# conversation_summaries with the last message and their unread count, which
+# send_message keeps current and the inbox reads with a single index range.
+
+PREVIEW_MAX = 255  # conversation_summaries.last_message is varchar(255)
+
+# Two sends in one conversation can commit out of id order, so the last_*
+# columns only move forward. MySQL applies the assignments left to right and
+# later ones see the new values, so last_message_id has to be set last.
+NEWER = "VALUES(last_message_id) > IFNULL(last_message_id, 0)"
+SUMMARY_UPSERT = (
+    "INSERT INTO conversation_summaries"
+    " (user_id, other_id, conversation_id, last_message_id, last_message, last_sender_id, last_message_at, unread)"
+    " VALUES (%s, %s, %s, %s, %s, %s, %s, %s), (%s, %s, %s, %s, %s, %s, %s, %s)"
+    " ON DUPLICATE KEY UPDATE"
+    " last_message=IF(" + NEWER + ", VALUES(last_message), last_message),"
+    " last_sender_id=IF(" + NEWER + ", VALUES(last_sender_id), last_sender_id),"
+    " last_message_at=IF(" + NEWER + ", VALUES(last_message_at), last_message_at),"
+    " last_message_id=IF(" + NEWER + ", VALUES(last_message_id), last_message_id),"
+    " unread=unread+VALUES(unread)"
+)
+
+
+def conversation_id(user1_id, user2_id):
+    low, high = sorted((int(user1_id), int(user2_id)))
+    return (low << 32) | high
+
+
+def record_message(cursor, sender_id, receiver_id, message_id, message, timestamp):
+    # Both participants' summary rows in one statement; only the receiver's unread
+    # grows. Rows go in user_id order so two people replying at once lock them in
+    # the same order.
+    conv = conversation_id(sender_id, receiver_id)
+    preview = message[:PREVIEW_MAX]
+    rows = sorted([
+        (sender_id, receiver_id, conv, message_id, preview, sender_id, timestamp, 0),
+        (receiver_id, sender_id, conv, message_id, preview, sender_id, timestamp, 1),
+    ])
+    cursor.execute(SUMMARY_UPSERT, rows[0] + rows[1])
+
+
+def rebuild(db):
+    # Backfill conversation_id on old messages and recompute every summary
+    # from each conversation's latest message. Unread counts restart at 0.
+    cur = db.cursor()
+    cur.execute(
+        "UPDATE messages SET conversation_id = (LEAST(sender_id, receiver_id) << 32) | GREATEST(sender_id, receiver_id) "
+        "WHERE conversation_id IS NULL AND sender_id IS NOT NULL AND receiver_id IS NOT NULL"
+    )
+    backfilled = cur.rowcount
+    cur.execute("DELETE FROM conversation_summaries")
+    latest = (
+        "FROM (SELECT conversation_id, MAX(id) AS id FROM messages WHERE conversation_id IS NOT NULL GROUP BY conversation_id) last "
+        "JOIN messages m ON m.id = last.id"
+    )
+    cur.execute(
+        "INSERT IGNORE INTO conversation_summaries"
+        " (user_id, other_id, conversation_id, last_message_id, last_message, last_sender_id, last_message_at, unread) "
+        "SELECT m.sender_id, m.receiver_id, m.conversation_id, m.id, LEFT(m.message, %s), m.sender_id, m.timestamp, 0 " + latest +
+        " UNION ALL "
+        "SELECT m.receiver_id, m.sender_id, m.conversation_id, m.id, LEFT(m.message, %s), m.sender_id, m.timestamp, 0 " + latest,
+        (PREVIEW_MAX, PREVIEW_MAX)
+    )
+    summaries = cur.rowcount
+    db.commit()
+    cur.close()
+    return {"messages_backfilled": backfilled, "summaries": summaries}
@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# --- Pooled connection handle ---
+# Behaves like a mysql.connector connection. close() hands the connection back
+# to the pool instead of closing the socket, unless the handle is pinned to a
+# Flask request, in which case the request teardown releases it.
+# With the pool disabled the handle wraps a one-off connection and release()
+# really closes it.
+class PooledConnection:
+    def __init__(self, pool, conn, pinned=False):
+        self._pool = pool
+        self._conn = conn
+        self._pinned = pinned
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        cur = self._conn.cursor(*args, **kwargs)
+        instrument = self._pool.instrument
+        return instrument.wrap_cursor(cur) if instrument is not None else cur
+
+    def close(self):
+        if not self._pinned:
+            self.release()
+
+    def release(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._put(conn)
+
+
+class ConnectionPool:
+    def __init__(self, config, size=10, max_overflow=5, timeout=10.0, ping_interval=30.0, instrument=None):
+        self.config = config
+        self.instrument = instrument        # metrics.Metrics: cursor wrapping, checkout/connect counts
+        self.size = size                    # connections kept open when idle
+        self.max_overflow = max_overflow    # extra connections allowed under load
+        self.timeout = timeout              # seconds to wait for a free connection
+        self.ping_interval = ping_interval  # ping idle connections older than this on borrow
+        self._idle = deque()
+        self._cond = threading.Condition()
+        self._open = 0
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "connects": 0,
+            "health_check_failures": 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.config)
+        with self._cond:
+            self._stats["connects"] += 1
+        if self.instrument is not None:
+            self.instrument.connected()
+        return conn
+
+    def acquire(self, pinned=False):
+        # Pool disabled: plain connect-per-call, close() really closes.
+        if not self.enabled:
+            conn = self._connect()
+            if self.instrument is not None:
+                self.instrument.checked_out()
+            return PooledConnection(self, conn)
+
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout("No database connection available after %.1fs" % self.timeout)
+                waited = True
+                self._cond.wait(remaining)
+            wait = time.monotonic() - start
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+            self._stats["wait_time_total"] += wait
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait)
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif time.monotonic() - last_used >= self.ping_interval and not self._healthy(conn):
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                self._discard(conn, keep_slot=True)
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        if self.instrument is not None:
+            self.instrument.checked_out()
+        return PooledConnection(self, conn, pinned)
+
+    def _healthy(self, conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn, keep_slot=False):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        if not keep_slot:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+
+    def _put(self, conn):
+        if not self.enabled:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            return
+        # Drop whatever the borrower left uncommitted before reuse.
+        try:
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        with self._cond:
+            if len(self._idle) >= self.size:
+                overflow = True
+            else:
+                overflow = False
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+        if overflow:
+            self._discard(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            s["size"] = self.size
+            s["max_overflow"] = self.max_overflow
+            s["open"] = self._open
+            s["idle"] = len(self._idle)
+            s["in_use"] = self._open - len(self._idle)
+        s["wait_time_avg"] = s["wait_time_total"] / s["checkouts"] if s["checkouts"] else 0.0
+        return s
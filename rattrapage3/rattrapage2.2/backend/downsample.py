@@ -0,0 +1,112 @@
+# --- Shape-preserving downsampling for time series charts ---
+# Both functions consume rows in timestamp order in a single pass and only hold
+# one or two buckets at a time, so they work directly on an unbuffered cursor.
+# Up to n_out rows come back unchanged. Otherwise buckets are time slices from
+# the first row to `end`, which callers narrow to the last row's timestamp, so
+# readings covering part of the requested window still get n_out points.
+import itertools
+
+
+def _ts(row):
+    return row["timestamp"].timestamp()
+
+
+def _val(row):
+    return float(row["glucose_level"])
+
+
+def _area(a, b, c):
+    # Twice the triangle area between points a, b, c as (t, v) pairs
+    return abs((a[0] - c[0]) * (b[1] - a[1]) - (a[0] - b[0]) * (c[1] - a[1]))
+
+
+def _avg(bucket):
+    return (sum(_ts(r) for r in bucket) / len(bucket), sum(_val(r) for r in bucket) / len(bucket))
+
+
+def _pick(bucket, prev, nxt):
+    a = (_ts(prev), _val(prev))
+    return max(bucket, key=lambda r: _area(a, (_ts(r), _val(r)), nxt))
+
+
+def _span(rows, end, n_out):
+    # -> (head, rest, t0, t1); head holds every row when there are at most n_out
+    it = iter(rows)
+    head = list(itertools.islice(it, n_out + 1))
+    if len(head) <= n_out:
+        return head, None, None, None
+    return head, it, _ts(head[0]), max(end.timestamp(), _ts(head[-1]))
+
+
+def lttb(rows, start, end, n_out):
+    # Largest-Triangle-Three-Buckets: keeps first and last point, and from each
+    # bucket the point forming the largest triangle with the previously kept
+    # point and the average of the next bucket.
+    head, rest, t0, t1 = _span(rows, end, n_out)
+    if rest is None:
+        yield from head
+        return
+    it = itertools.chain(head, rest)
+    first = next(it)
+    yield first
+    width = max((t1 - t0) / max(n_out - 2, 1), 1e-9)
+    prev = first
+    pending = None  # complete bucket waiting for its right-hand neighbour
+    acc, acc_idx = [], None
+    last = first
+    for row in it:
+        last = row
+        idx = int((_ts(row) - t0) // width)
+        if acc and idx != acc_idx:
+            if pending:
+                prev = _pick(pending, prev, _avg(acc))
+                yield prev
+            pending, acc = acc, []
+        acc_idx = idx
+        acc.append(row)
+    if last is first:
+        return
+    end_point = (_ts(last), _val(last))
+    if pending:
+        prev = _pick(pending, prev, _avg(acc))
+        yield prev
+    if len(acc) > 1:
+        yield _pick(acc[:-1], prev, end_point)
+    yield last
+
+
+def minmax(rows, start, end, n_out):
+    # Per bucket the lowest and highest reading, in time order (~n_out points)
+    head, rest, t0, t1 = _span(rows, end, n_out)
+    if rest is None:
+        yield from head
+        return
+    width = max((t1 - t0) / max(n_out // 2, 1), 1e-9)
+    lo = hi = None
+    idx = None
+    for row in itertools.chain(head, rest):
+        i = int((_ts(row) - t0) // width)
+        if i != idx and lo is not None:
+            yield from _ordered(lo, hi)
+            lo = hi = None
+        idx = i
+        if lo is None or _val(row) < _val(lo):
+            lo = row
+        if hi is None or _val(row) > _val(hi):
+            hi = row
+    if lo is not None:
+        yield from _ordered(lo, hi)
+
+
+def _ordered(lo, hi):
+    if lo is hi:
+        yield lo
+    elif _ts(lo) <= _ts(hi):
+        yield lo
+        yield hi
+    else:
+        yield hi
+        yield lo
+
+
+METHODS = {"lttb": lttb, "minmax": minmax}
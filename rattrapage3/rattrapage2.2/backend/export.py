@@ -0,0 +1,144 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import retention
+
+# --- Streaming export of a patient's history ---
+# Each section is one query on its own pooled connection, read through an
+# unbuffered cursor with fetchmany() (MySQL streams the result set, nothing is
+# materialised client side) and written out as it arrives, so memory stays
+# flat however long the history is. The connection is checked out inside the
+# generator: the request (and its pinned connection) is gone by the time the
+# body is sent. If the client disconnects mid-section the pool's rollback on
+# return fails on the unread result and the connection is discarded.
+
+FETCH_SIZE = 1000
+CHUNK_ROWS = 200  # rows per yielded chunk
+
+# name -> (SELECT ... WHERE <patient>=%s, time column for ?from/?to, ordering key).
+# Sections with an archive table select FROM {table} and read both.
+SECTIONS = {
+    "glucose_logs": (
+        "SELECT id, timestamp, glucose_level, context, category FROM {table} WHERE user_id=%s",
+        "timestamp", "id",
+    ),
+    "meals": (
+        "SELECT id, timestamp, meal_type, description, calories, carbs, protein, fat FROM meals WHERE user_id=%s",
+        "timestamp", "id",
+    ),
+    "physical_activities": (
+        "SELECT id, timestamp, activity_type, duration_minutes, calories_burned, activity_date, notes "
+        "FROM physical_activities WHERE user_id=%s",
+        "timestamp", "id",
+    ),
+    "medications": (
+        "SELECT id, prescribed_at, doctor_id, added_by_patient, med_name, dosage, med_type, is_active "
+        "FROM medications WHERE patient_id=%s",
+        "prescribed_at", "id",
+    ),
+    "medication_changes": (
+        "SELECT mc.id, mc.change_timestamp, mc.medication_id, m.med_name, mc.doctor_id, mc.change_type, "
+        "mc.old_dosage, mc.new_dosage "
+        "FROM medication_changes mc JOIN medications m ON m.id = mc.medication_id WHERE m.patient_id=%s",
+        "mc.change_timestamp", "mc.id",
+    ),
+    "appointments": (
+        "SELECT id, appointment_time, doctor_id, status, notes, created_at, updated_at "
+        "FROM appointments WHERE patient_id=%s",
+        "appointment_time", "id",
+    ),
+}
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+
+def plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def query(section, patient_id, start, end, boundaries=None):
+    sql, ts_col, id_col = SECTIONS[section]
+    params = [patient_id]
+    if start is not None:
+        sql += f" AND {ts_col} >= %s"
+        params.append(start)
+    if end is not None:
+        sql += f" AND {ts_col} < %s"
+        params.append(end)
+    order = f" ORDER BY {ts_col}, {id_col}"
+    if section in retention.ARCHIVES:
+        return retention.covering(sql, params, section, start, boundaries, order)
+    return sql + order, params
+
+
+def rows(pool, section, patient_id, start, end, boundaries=None):
+    # Yields the column names first, then one tuple per row
+    db = pool.acquire()
+    cur = db.cursor()
+    try:
+        cur.execute(*query(section, patient_id, start, end, boundaries))
+        yield [d[0] for d in cur.description]
+        while True:
+            batch = cur.fetchmany(FETCH_SIZE)
+            if not batch:
+                break
+            yield from batch
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        db.close()
+
+
+def ndjson(pool, patient_id, sections, start, end, boundaries=None):
+    for section in sections:
+        it = rows(pool, section, patient_id, start, end, boundaries)
+        columns = next(it)
+        buf = []
+        for row in it:
+            record = {"section": section}
+            record.update(zip(columns, map(plain, row)))
+            buf.append(json.dumps(record, ensure_ascii=False))
+            if len(buf) >= CHUNK_ROWS:
+                yield "\n".join(buf) + "\n"
+                buf = []
+        if buf:
+            yield "\n".join(buf) + "\n"
+
+
+def csv_blocks(pool, patient_id, sections, start, end, boundaries=None):
+    # One block per section (its own header row), blocks separated by a blank line
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for i, section in enumerate(sections):
+        it = rows(pool, section, patient_id, start, end, boundaries)
+        columns = next(it)
+        if i:
+            out.write("\r\n")
+        writer.writerow(["section"] + columns)
+        n = 0
+        for row in it:
+            writer.writerow([section] + ["" if v is None else plain(v) for v in row])
+            n += 1
+            if n % CHUNK_ROWS == 0:
+                yield out.getvalue()
+                out.seek(0)
+                out.truncate()
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+
+
+WRITERS = {"ndjson": ndjson, "csv": csv_blocks}
@@ -0,0 +1,104 @@
+from flask import request
+
+# --- Sparse fieldsets for list endpoints ---
+# ?fields=summary selects the resource's summary projection, ?fields=a,b,c an
+# explicit list. Only the chosen columns are SELECTed, so the payload and the
+# rows read from MySQL shrink together. Without ?fields the endpoint returns
+# the same fields it always did.
+
+
+class BadFields(ValueError):
+    pass
+
+
+class Projection:
+    def __init__(self, columns, summary, default=None, required=()):
+        # columns: field name -> SQL expression, in output order. required fields
+        # are always read (the handler needs them, e.g. for cursors) and dropped
+        # from the rows again unless the client asked for them.
+        self.columns = columns
+        self.summary = list(summary)
+        self.default = list(default or columns)
+        self.required = list(required)
+
+    def pick(self, args=None):
+        args = request.args if args is None else args
+        value = (args.get("fields") or "").strip()
+        if not value:
+            return Fields(self, self.default, "")
+        if value == "summary":
+            return Fields(self, self.summary, "summary")
+        names = []
+        for name in value.split(","):
+            name = name.strip()
+            if name not in self.columns:
+                raise BadFields(f"Unknown field: {name}. Available: summary, {', '.join(self.columns)}")
+            if name not in names:
+                names.append(name)
+        return Fields(self, names, ",".join(names))
+
+
+class Fields:
+    def __init__(self, projection, names, key):
+        self.names = names
+        self.key = key  # "" for the default projection; used to tell cache entries apart
+        self.hidden = [n for n in projection.required if n not in names]
+        self.sql = ", ".join(
+            expr if expr == name else f"{expr} AS {name}"
+            for name, expr in projection.columns.items() if name in names or name in self.hidden
+        )
+
+    def trim(self, rows):
+        if self.hidden:
+            for r in rows:
+                for name in self.hidden:
+                    r.pop(name, None)
+        return rows
+
+
+MEDICATIONS = Projection(
+    {
+        "id": "id", "patient_id": "patient_id", "doctor_id": "doctor_id", "added_by_patient": "added_by_patient",
+        "med_name": "med_name", "dosage": "dosage", "med_type": "med_type", "prescribed_at": "prescribed_at",
+        "is_active": "is_active",
+    },
+    summary=["id", "med_name", "dosage", "med_type"],
+)
+ACTIVITIES = Projection(
+    {
+        "id": "id", "user_id": "user_id", "activity_type": "activity_type", "duration_minutes": "duration_minutes",
+        "calories_burned": "calories_burned", "activity_date": "activity_date", "notes": "notes",
+        "timestamp": "timestamp",
+    },
+    summary=["id", "activity_type", "duration_minutes", "calories_burned", "timestamp"],
+    required=["id", "timestamp"],
+)
+CHALLENGES = Projection(
+    {
+        "id": "c.id", "creator_id": "c.creator_id", "title": "c.title", "description": "c.description",
+        "start_date": "c.start_date", "end_date": "c.end_date", "creator_name": "u.name",
+    },
+    summary=["id", "title", "start_date", "end_date", "creator_name"],
+)
+EXCERPT_CHARS = 200
+ARTICLES = Projection(
+    {
+        "id": "a.id", "title": "a.title", "content": "a.content", "excerpt": f"LEFT(a.content, {EXCERPT_CHARS})",
+        "timestamp": "a.timestamp", "doctor_id": "a.doctor_id", "doctor_name": "u.name",
+    },
+    summary=["id", "title", "excerpt", "timestamp", "doctor_name"],
+    default=["id", "title", "content", "timestamp", "doctor_name"],
+)
+APPOINTMENT_COLUMNS = {
+    "id": "a.id", "doctor_id": "a.doctor_id", "patient_id": "a.patient_id", "appointment_time": "a.appointment_time",
+    "notes": "a.notes", "status": "a.status", "duration_minutes": "a.duration_minutes",
+    "created_at": "a.created_at", "updated_at": "a.updated_at",
+}
+DOCTOR_APPOINTMENTS = Projection(
+    dict(APPOINTMENT_COLUMNS, patient_name="u.name", patient_email="u.email"),
+    summary=["id", "patient_id", "appointment_time", "status", "patient_name"],
+)
+PATIENT_APPOINTMENTS = Projection(
+    dict(APPOINTMENT_COLUMNS, doctor_name="u.name", doctor_email="u.email"),
+    summary=["id", "doctor_id", "appointment_time", "status", "doctor_name"],
+)
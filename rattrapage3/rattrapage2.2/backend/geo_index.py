@@ -0,0 +1,190 @@
+import heapq
+import math
+import threading
+import time
+
+# --- Doctor geo index (in-memory lat/lng grid) ---
+# Doctors with geo_lat/geo_lng are bucketed into cell_deg x cell_deg cells.
+# A query scans the cells of the bounding box around the point for a search
+# radius and computes great-circle distances only for the doctors in them; for
+# k-nearest without a radius the box starts small and doubles until it holds
+# k doctors within the radius it was drawn for. Writes in this process update
+# the grid directly (upsert/remove); the whole index is reloaded from the
+# doctors table every reload_interval seconds for writes made elsewhere.
+
+EARTH_RADIUS_KM = 6371.0088
+START_RADIUS_KM = 2.0
+MAX_RADIUS_KM = math.pi * EARTH_RADIUS_KM  # half the circumference covers the globe
+
+
+def coordinates(lat, lng):
+    # -> (lat, lng) as floats, or None if missing / out of range
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def entry(point, specialty_id):
+    # Radians and cos(lat) kept so a query does not recompute them per candidate
+    phi, lam = math.radians(point[0]), math.radians(point[1])
+    return point + (specialty_id, phi, lam, math.cos(phi))
+
+
+class DoctorGeoIndex:
+    def __init__(self, cell_deg=0.1, reload_interval=300):
+        self.cell_deg = cell_deg
+        self.columns = int(round(360 / cell_deg))
+        self.reload_interval = reload_interval
+        self._doctors = {}  # doctor id -> (lat, lng, specialty_id, lat rad, lng rad, cos lat)
+        self._cells = {}  # (row, column) -> set of doctor ids
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._stats = {"queries": 0, "candidates": 0, "reloads": 0, "reload_time": 0.0}
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor((lng + 180) / self.cell_deg)) % self.columns
+
+    # --- Loading ---
+    def ensure(self, db):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.reload_interval:
+            return
+        with self._load_lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.reload_interval:
+                self.load(db)
+
+    def load(self, db):
+        started = time.perf_counter()
+        cur = db.cursor()
+        cur.execute("SELECT user_id, geo_lat, geo_lng, specialty_id FROM doctors WHERE geo_lat IS NOT NULL AND geo_lng IS NOT NULL")
+        rows = cur.fetchall()
+        cur.close()
+        self.build(rows)
+        with self._lock:
+            self._stats["reloads"] += 1
+            self._stats["reload_time"] = round(time.perf_counter() - started, 3)
+
+    def build(self, rows):
+        # rows: (doctor_id, lat, lng, specialty_id); built aside, then swapped in
+        doctors, cells = {}, {}
+        for doctor_id, lat, lng, specialty_id in rows:
+            point = coordinates(lat, lng)
+            if point is None:
+                continue
+            doctors[doctor_id] = entry(point, specialty_id)
+            cells.setdefault(self._cell(*point), set()).add(doctor_id)
+        with self._lock:
+            self._doctors, self._cells = doctors, cells
+            self._loaded_at = time.monotonic()
+
+    # --- Incremental updates (doctor writes in this process) ---
+    def upsert(self, doctor_id, lat, lng, specialty_id):
+        point = coordinates(lat, lng)
+        try:
+            specialty_id = int(specialty_id) if specialty_id is not None else None
+        except (TypeError, ValueError):
+            specialty_id = None
+        with self._lock:
+            self._remove(doctor_id)
+            if point is not None:
+                self._doctors[doctor_id] = entry(point, specialty_id)
+                self._cells.setdefault(self._cell(*point), set()).add(doctor_id)
+
+    def remove(self, doctor_id):
+        with self._lock:
+            self._remove(doctor_id)
+
+    def _remove(self, doctor_id):
+        old = self._doctors.pop(doctor_id, None)
+        if old is not None:
+            cell = self._cells.get(self._cell(old[0], old[1]))
+            if cell is not None:
+                cell.discard(doctor_id)
+                if not cell:
+                    del self._cells[self._cell(old[0], old[1])]
+
+    # --- Queries ---
+    def _box_cells(self, lat, lng, radius_km):
+        # Cells that can hold a point within radius_km of (lat, lng): the
+        # bounding box of the spherical cap (whole longitude range if it covers a pole)
+        r = radius_km / EARTH_RADIUS_KM
+        dlat = math.degrees(r)
+        lat_lo, lat_hi = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        x = math.sin(r) / max(math.cos(math.radians(lat)), 1e-12)
+        if lat_lo <= -90.0 or lat_hi >= 90.0 or r >= math.pi / 2 or x >= 1:
+            dlng = 180.0
+        else:
+            dlng = math.degrees(math.asin(x))
+        rows = range(int(math.floor(lat_lo / self.cell_deg)), int(math.floor(lat_hi / self.cell_deg)) + 1)
+        if dlng >= 180.0:
+            columns = range(self.columns)
+        else:
+            first = int(math.floor((lng - dlng + 180) / self.cell_deg))
+            last = int(math.floor((lng + dlng + 180) / self.cell_deg))
+            columns = sorted({c % self.columns for c in range(first, last + 1)})
+        if len(rows) * len(columns) > len(self._cells):
+            # Box bigger than the occupied grid: filter the occupied cells instead
+            row_set, column_set = set(rows), set(columns)
+            return [ids for (r, c), ids in self._cells.items() if r in row_set and c in column_set]
+        cells = []
+        for r in rows:
+            for c in columns:
+                ids = self._cells.get((r, c))
+                if ids:
+                    cells.append(ids)
+        return cells
+
+    def _within(self, lat, lng, radius_km, specialty_id):
+        # Haversine, compared on the half-chord term; distances only for the hits
+        phi, lam = math.radians(lat), math.radians(lng)
+        cos_phi = math.cos(phi)
+        limit = math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2) ** 2
+        sin, doctors = math.sin, self._doctors
+        found, scanned = [], 0
+        for ids in self._box_cells(lat, lng, radius_km):
+            scanned += len(ids)
+            for doctor_id in ids:
+                d = doctors[doctor_id]
+                if specialty_id is not None and d[2] != specialty_id:
+                    continue
+                a = sin((d[3] - phi) / 2) ** 2 + cos_phi * d[5] * sin((d[4] - lam) / 2) ** 2
+                if a <= limit:
+                    found.append((2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a))), doctor_id))
+        return found, scanned
+
+    def nearest(self, lat, lng, k=10, radius_km=None, specialty_id=None):
+        # -> [(distance_km, doctor_id)], closest first; at most k, within radius_km if given
+        with self._lock:
+            scanned = 0
+            if radius_km is not None:
+                found, scanned = self._within(lat, lng, radius_km, specialty_id)
+            else:
+                radius = START_RADIUS_KM
+                while True:
+                    found, n = self._within(lat, lng, radius, specialty_id)
+                    scanned += n
+                    if len(found) >= k or radius >= MAX_RADIUS_KM:
+                        break
+                    radius = min(radius * 2, MAX_RADIUS_KM)
+            self._stats["queries"] += 1
+            self._stats["candidates"] += scanned
+        return heapq.nsmallest(k, found)
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["doctors"] = len(self._doctors)
+            s["cells"] = len(self._cells)
+        s["candidates_per_query"] = round(s["candidates"] / s["queries"], 1) if s["queries"] else None
+        return s
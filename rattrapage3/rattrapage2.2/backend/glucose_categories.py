@@ -0,0 +1,131 @@
+import numpy as np
+
+import retention
+
+# --- Blood glucose categorization, table driven ---
+# (diabetes_type, context) -> (hypo_below, normal_max, normal_max_inclusive), mg/dL
+CATEGORIES = ("Hypoglycemia", "Normal", "Hyperglycemia")
+DIABETES_TYPES = ("Type 1", "Type 2", "Gestational", "Prediabetes", None)  # None = any other type
+CONTEXTS = ("Fasting", "Post-meal", "Other")
+
+THRESHOLDS = {
+    # ADA rules
+    ("Type 1", "Fasting"): (80, 130, True),
+    ("Type 1", "Post-meal"): (80, 180, True),
+    ("Type 1", "Other"): (80, 180, True),
+    ("Type 2", "Fasting"): (80, 130, True),
+    ("Type 2", "Post-meal"): (80, 180, True),
+    ("Type 2", "Other"): (80, 180, True),
+    ("Gestational", "Fasting"): (70, 95, False),
+    ("Gestational", "Post-meal"): (70, 140, False),
+    ("Gestational", "Other"): (70, 120, False),  # 2h post-meal
+    ("Prediabetes", "Fasting"): (100, 125, True),
+    ("Prediabetes", "Post-meal"): (100, 199, True),
+    ("Prediabetes", "Other"): (100, 199, True),
+    (None, "Fasting"): (70, 140, True),
+    (None, "Post-meal"): (70, 140, True),
+    (None, "Other"): (70, 140, True),
+}
+
+_TYPE_INDEX = {t: i for i, t in enumerate(DIABETES_TYPES)}
+_CTX_INDEX = {c: i for i, c in enumerate(CONTEXTS)}
+_DEFAULT_TYPE = _TYPE_INDEX[None]
+_DEFAULT_CTX = _CTX_INDEX["Other"]
+
+# Compiled lookup arrays indexed [type, context]
+_LOW = np.empty((len(DIABETES_TYPES), len(CONTEXTS)))
+_HIGH = np.empty((len(DIABETES_TYPES), len(CONTEXTS)))
+_INCL = np.empty((len(DIABETES_TYPES), len(CONTEXTS)), dtype=bool)
+for (t, c), (low, high, incl) in THRESHOLDS.items():
+    _LOW[_TYPE_INDEX[t], _CTX_INDEX[c]] = low
+    _HIGH[_TYPE_INDEX[t], _CTX_INDEX[c]] = high
+    _INCL[_TYPE_INDEX[t], _CTX_INDEX[c]] = incl
+
+_CATEGORY_ARRAY = np.array(CATEGORIES, dtype=object)
+
+
+def categorize_glucose(glucose, context, diabetes_type):
+    glucose = float(glucose)
+    if diabetes_type not in _TYPE_INDEX:
+        diabetes_type = None
+    if context not in _CTX_INDEX:
+        context = "Other"
+    low, high, incl = THRESHOLDS[(diabetes_type, context)]
+    if glucose < low:
+        return "Hypoglycemia"
+    if glucose < high or (incl and glucose == high):
+        return "Normal"
+    return "Hyperglycemia"
+
+
+def _index(values, index, default):
+    return np.array([index.get(x, default) for x in values], dtype=np.intp)
+
+
+def categorize_codes(levels, contexts, diabetes_types):
+    # Returns an int8 array of indexes into CATEGORIES.
+    # diabetes_types may be a single value or one value per reading.
+    levels = np.asarray(levels, dtype=float)
+    c = _index(contexts, _CTX_INDEX, _DEFAULT_CTX)
+    if isinstance(diabetes_types, (str, type(None))):
+        t = _TYPE_INDEX.get(diabetes_types, _DEFAULT_TYPE)
+    else:
+        t = _index(diabetes_types, _TYPE_INDEX, _DEFAULT_TYPE)
+    low = _LOW[t, c]
+    high = _HIGH[t, c]
+    above = np.where(_INCL[t, c], levels > high, levels >= high)
+    codes = np.ones(len(levels), dtype=np.int8)
+    codes[above] = 2
+    codes[levels < low] = 0
+    return codes
+
+
+def categorize_many(levels, contexts, diabetes_types):
+    return _CATEGORY_ARRAY[categorize_codes(levels, contexts, diabetes_types)].tolist()
+
+
+# --- Backfill: re-categorize stored glucose_logs (and their archive) in chunks ---
+def recategorize(db, user_id=None, chunk_size=5000):
+    # Archived readings too: the rollups rebuilt afterwards count hypo/hyper from both tables
+    scanned = updated = 0
+    for table in ("glucose_logs", retention.ARCHIVES["glucose_logs"]):
+        s, u = _recategorize_table(db, table, user_id, chunk_size)
+        scanned += s
+        updated += u
+    return {"scanned": scanned, "updated": updated}
+
+
+def _recategorize_table(db, table, user_id, chunk_size):
+    cur = db.cursor()
+    last_id = 0
+    scanned = updated = 0
+    where_user = " AND gl.user_id = %s" if user_id is not None else ""
+    while True:
+        params = (last_id, user_id) if user_id is not None else (last_id,)
+        cur.execute(
+            "SELECT gl.id, gl.glucose_level, gl.context, gl.category, p.diabetes_type "
+            "FROM " + table + " gl LEFT JOIN patients p ON p.user_id = gl.user_id "
+            "WHERE gl.id > %s" + where_user + " ORDER BY gl.id LIMIT " + str(int(chunk_size)),
+            params
+        )
+        rows = cur.fetchall()
+        if not rows:
+            break
+        ids = [r[0] for r in rows]
+        new = categorize_many([r[1] for r in rows], [r[2] for r in rows], [r[4] for r in rows])
+        changed = {}
+        for row_id, old, cat in zip(ids, (r[3] for r in rows), new):
+            if old != cat:
+                changed.setdefault(cat, []).append(row_id)
+        # One UPDATE per target category instead of one per row
+        for cat, cat_ids in changed.items():
+            cur.execute(
+                "UPDATE " + table + " SET category=%s WHERE id IN (" + ", ".join(["%s"] * len(cat_ids)) + ")",
+                [cat] + cat_ids
+            )
+            updated += len(cat_ids)
+        db.commit()
+        scanned += len(rows)
+        last_id = ids[-1]
+    cur.close()
+    return scanned, updated
@@ -0,0 +1,171 @@
+import math
+from datetime import datetime, timedelta
+
+# --- Per-patient glucose rollups (hourly + daily) ---
+# Every glucose insert bumps one hourly and one daily row with counts, sums and
+# min/max. Window stats are then answered from at most ~N daily rows plus the
+# hourly rows of the first (partial) day, whatever the number of readings.
+TIR_LOW, TIR_HIGH = 70, 180  # consensus time-in-range, mg/dL
+
+TABLES = {
+    "hourly": "glucose_rollup_hourly",
+    "daily": "glucose_rollup_daily",
+}
+BUCKET_SQL = {
+    "hourly": "TIMESTAMP(DATE(timestamp), MAKETIME(HOUR(timestamp), 0, 0))",
+    "daily": "DATE(timestamp)",
+}
+COLUMNS = "user_id, bucket, n, total, total_sq, min_level, max_level, below_range, in_range, above_range, hypo, hyper"
+UPSERT = (
+    " ON DUPLICATE KEY UPDATE n=n+VALUES(n), total=total+VALUES(total), total_sq=total_sq+VALUES(total_sq),"
+    " min_level=LEAST(min_level, VALUES(min_level)), max_level=GREATEST(max_level, VALUES(max_level)),"
+    " below_range=below_range+VALUES(below_range), in_range=in_range+VALUES(in_range),"
+    " above_range=above_range+VALUES(above_range), hypo=hypo+VALUES(hypo), hyper=hyper+VALUES(hyper)"
+)
+AGGREGATE = (
+    "SELECT user_id, {bucket}, COUNT(*), SUM(glucose_level), SUM(glucose_level * glucose_level),"
+    " MIN(glucose_level), MAX(glucose_level),"
+    " SUM(glucose_level < %s), SUM(glucose_level >= %s AND glucose_level <= %s), SUM(glucose_level > %s),"
+    " SUM(category = 'Hypoglycemia'), SUM(category = 'Hyperglycemia')"
+    " FROM {source} WHERE timestamp IS NOT NULL AND {where} GROUP BY user_id, 2"
+)
+# Readings moved out by retention still count in rebuilt rollups
+SOURCES = ("glucose_logs", "glucose_logs_archive")
+
+
+def _aggregate_sql(cursor, where, params, source="glucose_logs"):
+    for kind, table in TABLES.items():
+        cursor.execute(
+            "INSERT INTO " + table + " (" + COLUMNS + ") "
+            + AGGREGATE.format(bucket=BUCKET_SQL[kind], where=where, source=source) + UPSERT,
+            [TIR_LOW, TIR_LOW, TIR_HIGH, TIR_HIGH] + list(params)
+        )
+
+
+def add_logged(cursor, log_id):
+    # Single row just inserted with a DB-side default timestamp
+    _aggregate_sql(cursor, "id = %s", [log_id])
+
+
+def add_readings(cursor, user_id, readings):
+    # readings: [(timestamp, glucose_level, category)], already known in Python
+    for kind, table in TABLES.items():
+        buckets = {}
+        for ts, level, category in readings:
+            key = ts.replace(minute=0, second=0, microsecond=0) if kind == "hourly" else ts.date()
+            b = buckets.get(key)
+            if b is None:
+                b = buckets[key] = [0, 0.0, 0.0, level, level, 0, 0, 0, 0, 0]
+            b[0] += 1
+            b[1] += level
+            b[2] += level * level
+            b[3] = min(b[3], level)
+            b[4] = max(b[4], level)
+            b[5] += level < TIR_LOW
+            b[6] += TIR_LOW <= level <= TIR_HIGH
+            b[7] += level > TIR_HIGH
+            b[8] += category == "Hypoglycemia"
+            b[9] += category == "Hyperglycemia"
+        values = [v for key, b in buckets.items() for v in [user_id, key] + b]
+        cursor.execute(
+            "INSERT INTO " + table + " (" + COLUMNS + ") VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(buckets)) + UPSERT,
+            values
+        )
+
+
+def rebuild(db, user_id=None):
+    # Recompute from glucose_logs and its archive, one patient at a time so each transaction stays small
+    cur = db.cursor()
+    if user_id is None:
+        cur.execute(
+            "SELECT user_id FROM glucose_logs WHERE user_id IS NOT NULL "
+            "UNION SELECT user_id FROM glucose_logs_archive WHERE user_id IS NOT NULL"
+        )
+        user_ids = [r[0] for r in cur.fetchall()]
+    else:
+        user_ids = [user_id]
+    for uid in user_ids:
+        for table in TABLES.values():
+            cur.execute("DELETE FROM " + table + " WHERE user_id=%s", (uid,))
+        for source in SOURCES:
+            _aggregate_sql(cur, "user_id = %s", [uid], source)
+        db.commit()
+    cur.close()
+    return {"patients": len(user_ids)}
+
+
+def _combine(rows):
+    n = sum(r[0] for r in rows)
+    if not n:
+        return {"count": 0}
+    total = sum(r[1] for r in rows)
+    total_sq = sum(r[2] for r in rows)
+    mean = total / n
+    variance = (total_sq - total * total / n) / (n - 1) if n > 1 else 0.0
+    below, in_range, above = (sum(r[i] for r in rows) for i in (5, 6, 7))
+    return {
+        "count": n,
+        "average": round(mean, 1),
+        "std_dev": round(math.sqrt(max(variance, 0.0)), 1),
+        "cv_percent": round(100 * math.sqrt(max(variance, 0.0)) / mean, 1) if mean else None,
+        "min": min(r[3] for r in rows),
+        "max": max(r[4] for r in rows),
+        "time_in_range_percent": round(100 * in_range / n, 1),
+        "time_below_range_percent": round(100 * below / n, 1),
+        "time_above_range_percent": round(100 * above / n, 1),
+        "hypo_count": int(sum(r[8] for r in rows)),
+        "hyper_count": int(sum(r[9] for r in rows)),
+        # ADAG estimated HbA1c from mean glucose (mg/dL)
+        "estimated_hba1c": round((mean + 46.7) / 28.7, 1),
+    }
+
+
+def window_stats(cursor, user_id, windows, now=None):
+    return window_stats_many(cursor, [user_id], windows, now)[user_id]
+
+
+def window_stats_many(cursor, user_ids, windows, now=None):
+    # windows: list of day counts. Each window is [now - days, now] at hour resolution:
+    # hourly rows cover its first (partial) day, daily rows the rest. Same two
+    # queries whatever the number of patients.
+    now = now or datetime.now()
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    in_users = "user_id IN (" + ", ".join(["%s"] * len(user_ids)) + ")"
+    starts = {d: (now - timedelta(days=d)).replace(minute=0, second=0, microsecond=0) for d in windows}
+    first_day = min(s.date() for s in starts.values())
+    cursor.execute(
+        "SELECT user_id, bucket, n, total, total_sq, min_level, max_level, below_range, in_range, above_range, hypo, hyper "
+        "FROM glucose_rollup_daily WHERE " + in_users + " AND bucket > %s",
+        user_ids + [first_day]
+    )
+    daily = [(r[0], r[1], r[2:]) for r in cursor.fetchall()]
+    edge_days = sorted({s.date() for s in starts.values()})
+    ranges = []
+    for d in edge_days:
+        day_start = datetime.combine(d, datetime.min.time())
+        ranges += [day_start, day_start + timedelta(days=1)]
+    cursor.execute(
+        "SELECT user_id, bucket, n, total, total_sq, min_level, max_level, below_range, in_range, above_range, hypo, hyper "
+        "FROM glucose_rollup_hourly WHERE " + in_users + " AND ("
+        + " OR ".join(["(bucket >= %s AND bucket < %s)"] * len(edge_days)) + ")",
+        user_ids + ranges
+    )
+    hourly = [(r[0], r[1], r[2:]) for r in cursor.fetchall()]
+
+    by_user = {uid: ([], []) for uid in user_ids}
+    for uid, bucket, r in daily:
+        by_user[uid][0].append((bucket, r))
+    for uid, bucket, r in hourly:
+        by_user[uid][1].append((bucket, r))
+    out = {}
+    for uid, (user_daily, user_hourly) in by_user.items():
+        stats = {}
+        for days, start in starts.items():
+            rows = [r for bucket, r in user_daily if bucket > start.date()]
+            rows += [r for bucket, r in user_hourly if bucket.date() == start.date() and bucket >= start]
+            stats[f"{days}d"] = _combine(rows)
+        out[uid] = stats
+    return out
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+# --- User identity cache ---
+# id -> {name, role, email, diabetes_type, doctor_id}, bounded LRU with a TTL.
+# Write paths and the outbox worker read names/roles/assigned doctor from here
+# instead of querying users on every call; misses for many ids are resolved
+# with one query. Writes that change these fields call invalidate().
+
+IDENTITY_SQL = """
+    SELECT u.id, u.name, u.role, u.email, p.diabetes_type, dp.doctor_id
+    FROM users u
+    LEFT JOIN patients p ON p.user_id = u.id
+    LEFT JOIN doctor_patient dp ON dp.patient_id = u.id
+    WHERE u.id IN ({})
+"""
+FIELDS = ("name", "role", "email", "diabetes_type", "doctor_id")
+
+
+class IdentityCache:
+    def __init__(self, size=10000, ttl=300.0):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # id -> (expires, identity)
+        self._lock = threading.Lock()
+        self._epoch = 0  # bumped by invalidate()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, db, user_id):
+        if user_id is None:
+            return None
+        return self.get_many(db, [user_id]).get(int(user_id))
+
+    def get_many(self, db, user_ids):
+        # Returns {id: identity} for the ids that exist; entries are shared, do not mutate
+        ids = {int(u) for u in user_ids if u is not None}
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for uid in ids:
+                entry = self._entries.get(uid)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(uid)
+                    found[uid] = entry[1]
+            self.hits += len(found)
+            self.misses += len(ids) - len(found)
+            epoch = self._epoch
+        missing = [uid for uid in ids if uid not in found]
+        if missing:
+            loaded = self._load(db, missing)
+            found.update(loaded)
+            self._store(loaded, epoch)
+        return found
+
+    def _load(self, db, user_ids):
+        cur = db.cursor()
+        try:
+            cur.execute(IDENTITY_SQL.format(", ".join(["%s"] * len(user_ids))), user_ids)
+            return {row[0]: dict(zip(FIELDS, row[1:])) for row in cur.fetchall()}
+        finally:
+            cur.close()
+
+    def _store(self, identities, epoch):
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            # An invalidation ran while we were loading: the rows may predate it
+            if self._epoch != epoch:
+                return
+            for uid, identity in identities.items():
+                self._entries[uid] = (expires, identity)
+                self._entries.move_to_end(uid)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            self._epoch += 1
+            for uid in user_ids:
+                if uid is not None:
+                    self._entries.pop(int(uid), None)
+                    self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
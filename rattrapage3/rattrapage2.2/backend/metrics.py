@@ -0,0 +1,242 @@
+import re
+import threading
+import time
+
+from flask import g, request, has_request_context
+
+# --- Request / SQL instrumentation, rendered in Prometheus text format ---
+# The connection pool hands every cursor to wrap_cursor() and reports checkouts
+# and new connections here; before/after request hooks attribute all of it to
+# the matched route template. Background threads (outbox, recategorize) only
+# feed the global db_* counters.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+SLOW_SQL_MAX = 500  # characters of statement text kept in the slow-query log
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.sql = Histogram(SQL_COUNT_BUCKETS)
+        self.statuses = {}
+        self.db_seconds = 0.0
+        self.python_seconds = 0.0
+        self.connections = 0
+
+
+class RequestStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql = 0
+        self.db_seconds = 0.0
+        self.connections = 0
+
+
+class TimedCursor:
+    # Delegates to the driver cursor; execute/fetch time counts as DB time
+    def __init__(self, metrics, cursor):
+        self._metrics = metrics
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params, *args, **kwargs)
+        finally:
+            self._metrics.query(sql, params, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_params, *args, **kwargs)
+        finally:
+            self._metrics.query(sql, None, time.perf_counter() - start)
+
+    def _timed_fetch(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._metrics.db_time(time.perf_counter() - start)
+
+    def fetchone(self):
+        return self._timed_fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._timed_fetch(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._timed_fetch(self._cursor.fetchall)
+
+
+def redact(sql, params):
+    # Statement text only: placeholders stay, values are never logged
+    text = re.sub(r"\s+", " ", sql).strip()
+    text = re.sub(r"%s(, %s){3,}", "%s, ...", text)
+    if len(text) > SLOW_SQL_MAX:
+        text = text[:SLOW_SQL_MAX] + "..."
+    n = len(params) if isinstance(params, (list, tuple, dict)) else 0
+    return f"{text} -- {n} params redacted"
+
+
+class Metrics:
+    def __init__(self, slow_query_ms=200.0):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._routes = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.slow_queries = 0
+        self.connects = 0
+        self.checkouts = 0
+
+    # --- Hooks called by the connection pool ---
+    def wrap_cursor(self, cursor):
+        return TimedCursor(self, cursor)
+
+    def connected(self):
+        with self._lock:
+            self.connects += 1
+
+    def checked_out(self):
+        with self._lock:
+            self.checkouts += 1
+        stats = self._current()
+        if stats is not None:
+            stats.connections += 1
+
+    def query(self, sql, params, elapsed):
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += elapsed
+            slow = elapsed * 1000 >= self.slow_query_ms
+            if slow:
+                self.slow_queries += 1
+        stats = self._current()
+        if stats is not None:
+            stats.sql += 1
+            stats.db_seconds += elapsed
+        if slow:
+            route = request.url_rule.rule if has_request_context() and request.url_rule else "-"
+            print(f"SLOW QUERY {elapsed * 1000:.1f} ms [{route}]: {redact(sql, params)}")
+
+    def db_time(self, elapsed):
+        with self._lock:
+            self.query_seconds += elapsed
+        stats = self._current()
+        if stats is not None:
+            stats.db_seconds += elapsed
+
+    def _current(self):
+        return g.get("request_stats") if has_request_context() else None
+
+    # --- Flask hooks ---
+    def init_app(self, app):
+        app.before_request(self.start_request)
+        app.after_request(self.end_request)
+
+    def start_request(self):
+        g.request_stats = RequestStats()
+
+    def end_request(self, response):
+        stats = g.pop("request_stats", None)
+        if stats is None:
+            return response
+        # Streaming responses (SSE, exports) are timed up to the first byte
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        self.record(request.method, rule, stats, response.status_code)
+        return response
+
+    def record(self, method, rule, stats, status):
+        # Also called by asgi.py for the requests it serves without Flask
+        elapsed = time.perf_counter() - stats.start
+        with self._lock:
+            route = self._routes.get((method, rule))
+            if route is None:
+                route = self._routes[(method, rule)] = RouteStats()
+            route.latency.observe(elapsed)
+            route.sql.observe(stats.sql)
+            route.statuses[status] = route.statuses.get(status, 0) + 1
+            route.db_seconds += stats.db_seconds
+            route.python_seconds += max(elapsed - stats.db_seconds, 0.0)
+            route.connections += stats.connections
+
+    # --- Prometheus exposition ---
+    def render(self, pool_stats=None):
+        out = []
+
+        def family(name, kind, help_text):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, labels, h):
+            cumulative = 0
+            for upper, count in zip(h.buckets, h.counts):
+                cumulative += count
+                out.append(f'{name}_bucket{{{labels},le="{upper}"}} {cumulative}')
+            out.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.total}')
+            out.append(f"{name}_sum{{{labels}}} {h.sum}")
+            out.append(f"{name}_count{{{labels}}} {h.total}")
+
+        with self._lock:
+            routes = sorted(self._routes.items())
+            family("http_request_duration_seconds", "histogram", "Request latency by route (streams: time to first byte)")
+            for (method, rule), r in routes:
+                histogram("http_request_duration_seconds", f'method="{method}",route="{rule}"', r.latency)
+            family("http_requests_total", "counter", "Requests by route and status code")
+            for (method, rule), r in routes:
+                for status, count in sorted(r.statuses.items()):
+                    out.append(f'http_requests_total{{method="{method}",route="{rule}",status="{status}"}} {count}')
+            family("http_request_sql_statements", "histogram", "SQL statements executed per request")
+            for (method, rule), r in routes:
+                histogram("http_request_sql_statements", f'method="{method}",route="{rule}"', r.sql)
+            family("http_request_db_seconds_total", "counter", "Time spent in the database driver per route")
+            for (method, rule), r in routes:
+                out.append(f'http_request_db_seconds_total{{method="{method}",route="{rule}"}} {r.db_seconds}')
+            family("http_request_python_seconds_total", "counter", "Request time outside the database driver per route")
+            for (method, rule), r in routes:
+                out.append(f'http_request_python_seconds_total{{method="{method}",route="{rule}"}} {r.python_seconds}')
+            family("http_request_db_connections_total", "counter", "Pool checkouts made while serving the route")
+            for (method, rule), r in routes:
+                out.append(f'http_request_db_connections_total{{method="{method}",route="{rule}"}} {r.connections}')
+
+            family("db_queries_total", "counter", "SQL statements executed, all threads")
+            out.append(f"db_queries_total {self.queries}")
+            family("db_query_seconds_total", "counter", "Time spent in execute/fetch, all threads")
+            out.append(f"db_query_seconds_total {self.query_seconds}")
+            family("db_slow_queries_total", "counter", f"Statements slower than {self.slow_query_ms:g} ms")
+            out.append(f"db_slow_queries_total {self.slow_queries}")
+            family("db_connections_opened_total", "counter", "New physical database connections")
+            out.append(f"db_connections_opened_total {self.connects}")
+            family("db_pool_checkouts_total", "counter", "Connections handed out by the pool")
+            out.append(f"db_pool_checkouts_total {self.checkouts}")
+
+        if pool_stats:
+            for key in ("open", "idle", "in_use"):
+                family(f"db_pool_{key}", "gauge", f"Connection pool {key.replace('_', ' ')} connections")
+                out.append(f"db_pool_{key} {pool_stats[key]}")
+            family("db_pool_timeouts_total", "counter", "Checkouts that gave up waiting for a connection")
+            out.append(f"db_pool_timeouts_total {pool_stats['timeouts']}")
+        return "\n".join(out) + "\n"
@@ -0,0 +1,59 @@
+import threading
+
+# --- In-process fan-out hub for notification streams ---
+# Subscribers are keyed by user id. publish() only wakes the streams of users
+# that just received notifications; each stream then reads its own new rows
+# (id > last sent id), so a wake-up never costs more than one indexed query.
+
+
+class Subscription:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._event = threading.Event()
+
+    def wait(self, timeout):
+        woken = self._event.wait(timeout)
+        self._event.clear()
+        return woken
+
+    def notify(self):
+        self._event.set()
+
+
+class NotificationHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs = {}
+        self._published = 0
+        self._wakeups = 0
+
+    def subscribe(self, user_id):
+        sub = Subscription(user_id)
+        with self._lock:
+            self._subs.setdefault(user_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.user_id]
+
+    def publish(self, user_ids):
+        with self._lock:
+            targets = [s for uid in set(user_ids) for s in self._subs.get(uid, ())]
+            self._published += 1
+            self._wakeups += len(targets)
+        for sub in targets:
+            sub.notify()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": sum(len(s) for s in self._subs.values()),
+                "users": len(self._subs),
+                "publishes": self._published,
+                "wakeups": self._wakeups,
+            }
@@ -0,0 +1,87 @@
+from collections import Counter
+
+# --- Per-user notification read state ---
+# notification_state holds one row per user: last_read_id (every notification
+# with id <= it is read) and unread, the number of notifications above the
+# watermark still unread. notifications.read is only the per-item exception
+# for rows above the watermark. Whoever inserts notifications bumps unread in
+# the same transaction, so the unread count is a primary-key read and
+# mark-all-read rewrites one row however long the history.
+
+READ_SQL = "(n.`read` OR n.id <= COALESCE(s.last_read_id, 0))"  # effective read flag, n = notifications
+
+
+def record_written(cursor, user_ids):
+    # user_ids: recipient of each notification just inserted (repeats allowed).
+    # Rows go in user_id order so concurrent writers lock them in the same order.
+    counts = sorted(Counter(user_ids).items())
+    if not counts:
+        return
+    cursor.execute(
+        "INSERT INTO notification_state (user_id, unread) VALUES "
+        + ", ".join(["(%s, %s)"] * len(counts))
+        + " ON DUPLICATE KEY UPDATE unread=unread+VALUES(unread)",
+        [v for row in counts for v in row]
+    )
+
+
+def unread_count(cursor, user_id):
+    cursor.execute("SELECT unread, last_read_id FROM notification_state WHERE user_id=%s", (user_id,))
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def mark_all_read(cursor, user_id, up_to=None):
+    # Moves the watermark to up_to (the newest id the client has seen) or to
+    # the user's latest notification. Anything newer stays unread.
+    if up_to is None:
+        cursor.execute(
+            "INSERT INTO notification_state (user_id, last_read_id, unread) "
+            "SELECT %s, COALESCE(MAX(id), 0), 0 FROM notifications WHERE user_id=%s "
+            "ON DUPLICATE KEY UPDATE unread=IF(VALUES(last_read_id) >= last_read_id, 0, unread), "
+            "last_read_id=GREATEST(last_read_id, VALUES(last_read_id))",
+            (user_id, user_id)
+        )
+        return
+    # unread is assigned first, so it compares against the old watermark
+    cursor.execute(
+        "INSERT INTO notification_state (user_id, last_read_id, unread) "
+        "SELECT %s, %s, COUNT(*) FROM notifications WHERE user_id=%s AND id > %s AND `read`=0 "
+        "ON DUPLICATE KEY UPDATE unread=IF(VALUES(last_read_id) > last_read_id, VALUES(unread), unread), "
+        "last_read_id=GREATEST(last_read_id, VALUES(last_read_id))",
+        (user_id, up_to, user_id, up_to)
+    )
+
+
+def mark_read(cursor, user_id, ids):
+    # Per-item read for notifications above the watermark; returns how many changed
+    cursor.execute("SELECT last_read_id FROM notification_state WHERE user_id=%s FOR UPDATE", (user_id,))
+    row = cursor.fetchone()
+    cursor.execute(
+        "UPDATE notifications SET `read`=1 WHERE user_id=%s AND id > %s AND `read`=0 AND id IN ("
+        + ", ".join(["%s"] * len(ids)) + ")",
+        [user_id, row[0] if row else 0] + list(ids)
+    )
+    changed = cursor.rowcount
+    if changed and row:
+        cursor.execute(
+            "UPDATE notification_state SET unread=GREATEST(CAST(unread AS SIGNED) - %s, 0) WHERE user_id=%s",
+            (changed, user_id)
+        )
+    return changed
+
+
+def rebuild(db):
+    # Recompute every user's state from notifications.read: the watermark goes
+    # just below the oldest unread notification, unread counts what is left.
+    cur = db.cursor()
+    cur.execute("DELETE FROM notification_state")
+    cur.execute(
+        "INSERT INTO notification_state (user_id, last_read_id, unread) "
+        "SELECT user_id, COALESCE(MIN(CASE WHEN `read`=0 THEN id END) - 1, MAX(id)), SUM(`read`=0) "
+        "FROM notifications GROUP BY user_id"
+    )
+    users = cur.rowcount
+    db.commit()
+    cur.close()
+    return {"users": users}
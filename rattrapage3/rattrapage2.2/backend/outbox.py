@@ -0,0 +1,321 @@
+import json
+import threading
+import uuid
+
+import notification_state
+
+# --- Notification outbox ---
+# Request handlers only append a compact event row (in their own transaction).
+# OutboxWorker threads claim events in batches, resolve user names through the
+# identity cache, render the notification text and bulk-insert the notifications.
+# Each notification keeps the event's patient_id (the patient it is about), and
+# the recipients' unread counters go up in the same transaction. If a batch
+# fails to write, its events are retried one transaction each; an event that
+# still fails keeps its claim until claim_timeout and, after max_attempts
+# claims, is dead-lettered (failed_at + last_error) instead of being retried.
+
+USER_KEYS = ("patient_id", "doctor_id", "sender_id", "receiver_id")
+TITLE_MAX = 128  # notifications.title is varchar(128)
+
+
+def enqueue(cursor, event_type, **payload):
+    cursor.execute(
+        "INSERT INTO notification_outbox (event_type, payload) VALUES (%s, %s)",
+        (event_type, json.dumps(payload, default=str))
+    )
+
+
+def _load_payload(raw):
+    # Ids come from request JSON and may be strings; users/notifications are keyed by int
+    payload = json.loads(raw)
+    for k in USER_KEYS:
+        if payload.get(k) is not None:
+            payload[k] = int(payload[k])
+    return payload
+
+
+# --- Renderers: event payload -> [(user_id, type, title, body)] ---
+def _name(users, user_id, default="Unknown"):
+    return users.get(user_id, {}).get("name") or default
+
+
+def render_glucose(p, users):
+    name = _name(users, p["patient_id"])
+    level, context, category = p["glucose_level"], p["context"], p["category"]
+    out = [(p["doctor_id"], "glucose",
+            f"{name} has logged a new blood glucose value",
+            f"{name} has logged {level} mg/dL ({context}) for today, check it out!")]
+    # Special alert for hypo/hyperglycemia
+    if category in ("Hypoglycemia", "Hyperglycemia"):
+        out.append((p["doctor_id"], "glucose",
+                    f"ALERT: {name} has had a {category.lower()}!",
+                    f"{name} logged {category.lower()} ({level} mg/dL, {context}). Immediate attention may be needed."))
+    return out
+
+
+def render_glucose_batch(p, users):
+    name = _name(users, p["patient_id"])
+    title = f"{name} has uploaded {p['count']} blood glucose values"
+    if p["hypo"] or p["hyper"]:
+        title = f"ALERT: {title}"
+    body = (f"{name} synced {p['count']} readings ({p['min']:g}-{p['max']:g} mg/dL): "
+            f"{p['hypo']} hypo, {p['normal']} normal, {p['hyper']} hyper.")
+    return [(p["doctor_id"], "glucose", title, body)]
+
+
+def render_medication_added(p, users):
+    doctor = _name(users, p["doctor_id"], "Your doctor")
+    return [(p["patient_id"], "medication",
+             f"New prescription from {doctor}",
+             f"{doctor} prescribed {p['med_name']} ({p['med_type']}), dosage: {p['dosage']}")]
+
+
+def render_medication_updated(p, users):
+    doctor = _name(users, p["doctor_id"], "Your doctor")
+    return [(p["patient_id"], "medication",
+             f"Medication dosage updated by {doctor}",
+             f"{doctor} updated {p['med_name']} ({p['med_type']}) dosage: {p['old_dosage']} → {p['new_dosage']}")]
+
+
+def render_medication_removed(p, users):
+    doctor = _name(users, p["doctor_id"], "Your doctor")
+    return [(p["patient_id"], "medication",
+             f"Medication removed by {doctor}",
+             f"{doctor} removed {p['med_name']} ({p['med_type']}), dosage: {p['dosage']}")]
+
+
+def render_message(p, users):
+    sender = _name(users, p["sender_id"])
+    if users.get(p["receiver_id"], {}).get("role") == "doctor":
+        return [(p["receiver_id"], "message", f"New message from {sender}", f"{sender}: {p['message']}")]
+    return [(p["receiver_id"], "message", "New Message", p["message"])]
+
+
+def render_appointment_created(p, users):
+    return [(p["patient_id"], "appointment", "New Appointment", "You have a new appointment scheduled.")]
+
+
+def render_appointment_updated(p, users):
+    out = [(p["patient_id"], "appointment", "Appointment Updated", "Your appointment was updated.")]
+    # If patient rescheduled, notify doctor as well
+    if p.get("status") and p["status"].lower() == "rescheduled":
+        name = _name(users, p["patient_id"])
+        out.append((p["doctor_id"], "appointment",
+                    f"{name} rescheduled an appointment",
+                    f"{name} has rescheduled their appointment. Please review."))
+    return out
+
+
+def render_appointment_cancelled(p, users):
+    name = _name(users, p["patient_id"])
+    return [
+        (p["patient_id"], "appointment", "Appointment Cancelled", "Your appointment was cancelled."),
+        (p["doctor_id"], "appointment", f"{name} cancelled an appointment", f"{name} has cancelled their appointment."),
+    ]
+
+
+RENDERERS = {
+    "glucose": render_glucose,
+    "glucose_batch": render_glucose_batch,
+    "medication_added": render_medication_added,
+    "medication_updated": render_medication_updated,
+    "medication_removed": render_medication_removed,
+    "message": render_message,
+    "appointment_created": render_appointment_created,
+    "appointment_updated": render_appointment_updated,
+    "appointment_cancelled": render_appointment_cancelled,
+}
+
+
+class OutboxWorker:
+    def __init__(self, pool, identities, workers=2, batch_size=200, poll_interval=1.0, claim_timeout=60,
+                 max_attempts=5, on_written=None):
+        self.pool = pool
+        self.identities = identities  # IdentityCache used to resolve names and roles
+        self.on_written = on_written  # called with the user ids that got notifications
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout  # seconds before a crashed worker's claim is retried
+        self.max_attempts = max_attempts  # claims before a failing event is dead-lettered
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {
+            "events_processed": 0,
+            "notifications_written": 0,
+            "batches": 0,
+            "failures": 0,
+            "render_errors": 0,
+            "event_failures": 0,
+            "lag_total": 0.0,
+            "lag_max": 0.0,
+        }
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"outbox-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                n = self.process_batch()
+            except Exception as e:
+                print(f"ERROR: outbox batch failed: {e}")
+                with self._lock:
+                    self._stats["failures"] += 1
+                n = 0
+            if n < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def process_batch(self):
+        token = uuid.uuid4().hex
+        db = self.pool.acquire()
+        cur = db.cursor()
+        try:
+            cur.execute(
+                "UPDATE notification_outbox SET claimed_by=%s, claimed_at=NOW(), attempts=attempts+1 "
+                "WHERE failed_at IS NULL AND (claimed_by IS NULL OR claimed_at < NOW() - INTERVAL %s SECOND) "
+                "ORDER BY id LIMIT %s",
+                (token, self.claim_timeout, self.batch_size)
+            )
+            db.commit()
+            if cur.rowcount == 0:
+                return 0
+            cur.execute(
+                "SELECT id, event_type, payload, TIMESTAMPDIFF(MICROSECOND, created_at, NOW(3)) "
+                "FROM notification_outbox WHERE claimed_by=%s ORDER BY id",
+                (token,)
+            )
+            events = [(row[0], row[1], row[2], (row[3] or 0) / 1e6) for row in cur.fetchall()]
+
+            # Resolve every user the batch mentions, at most one query for the misses
+            payloads = {}
+            for event_id, _, raw, _ in events:
+                try:
+                    payloads[event_id] = _load_payload(raw)
+                except Exception:
+                    pass  # dropped by _render
+            user_ids = {p[k] for p in payloads.values() for k in USER_KEYS if p.get(k)}
+            users = self.identities.get_many(db, user_ids)
+
+            try:
+                rows, render_errors = self._write(cur, events, payloads, users)
+                cur.execute("DELETE FROM notification_outbox WHERE claimed_by=%s", (token,))
+                db.commit()
+                failed = 0
+            except Exception as e:
+                db.rollback()
+                print(f"ERROR: outbox batch failed, retrying its {len(events)} events one by one: {e}")
+                rows, render_errors, failed = self._write_each(db, cur, events, payloads, users)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            cur.close()
+            db.close()
+
+        if rows and self.on_written is not None:
+            self.on_written([row[0] for row in rows])
+
+        lags = [lag for _, _, _, lag in events]
+        with self._lock:
+            s = self._stats
+            s["batches"] += 1
+            s["events_processed"] += len(events) - failed
+            s["notifications_written"] += len(rows)
+            s["render_errors"] += render_errors
+            s["event_failures"] += failed
+            s["lag_total"] += sum(lags)
+            s["lag_max"] = max(s["lag_max"], max(lags))
+        return len(events)
+
+    def _render(self, events, payloads, users):
+        # -> notification rows; events that cannot be rendered are dropped
+        rows = []
+        render_errors = 0
+        for event_id, event_type, _, _ in events:
+            try:
+                payload = payloads.get(event_id)
+                if payload is None:
+                    raise ValueError("unreadable payload")
+                for user_id, type_, title, body in RENDERERS[event_type](payload, users):
+                    if user_id:
+                        rows.append((user_id, payload.get("patient_id"), type_, title[:TITLE_MAX], body))
+            except Exception as e:
+                render_errors += 1
+                print(f"ERROR: dropping outbox event {event_id} ({event_type}): {e}")
+        return rows, render_errors
+
+    def _write(self, cur, events, payloads, users):
+        # Inserts the notifications in the caller's transaction
+        rows, render_errors = self._render(events, payloads, users)
+        if rows:
+            values = [v for row in rows for v in row]
+            cur.execute(
+                "INSERT INTO notifications (user_id, patient_id, type, title, body) VALUES "
+                + ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows)),
+                values
+            )
+            notification_state.record_written(cur, [row[0] for row in rows])
+        return rows, render_errors
+
+    def _write_each(self, db, cur, events, payloads, users):
+        # One transaction per event so a poison event cannot hold back the rest
+        rows, render_errors, failed = [], 0, 0
+        for event in events:
+            event_id = event[0]
+            try:
+                written, errors = self._write(cur, [event], payloads, users)
+                cur.execute("DELETE FROM notification_outbox WHERE id=%s", (event_id,))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                failed += 1
+                print(f"ERROR: outbox event {event_id} ({event[1]}) failed: {e}")
+                # Keeps its claim (retried after claim_timeout) until max_attempts, then dead-lettered
+                cur.execute(
+                    "UPDATE notification_outbox SET last_error=%s, "
+                    "failed_at=IF(attempts >= %s, NOW(), NULL) WHERE id=%s",
+                    (str(e)[:255], self.max_attempts, event_id)
+                )
+                db.commit()
+                continue
+            rows += written
+            render_errors += errors
+        return rows, render_errors, failed
+
+    def stats(self):
+        db = self.pool.acquire()
+        cur = db.cursor()
+        try:
+            cur.execute(
+                "SELECT COUNT(*), TIMESTAMPDIFF(MICROSECOND, MIN(created_at), NOW(3)) "
+                "FROM notification_outbox WHERE failed_at IS NULL"
+            )
+            depth, oldest = cur.fetchone()
+            cur.execute("SELECT COUNT(*) FROM notification_outbox WHERE failed_at IS NOT NULL")
+            dead = cur.fetchone()[0]
+        finally:
+            cur.close()
+            db.close()
+        with self._lock:
+            s = dict(self._stats)
+        s["lag_avg"] = s["lag_total"] / s["events_processed"] if s["events_processed"] else 0.0
+        del s["lag_total"]
+        s["depth"] = depth
+        s["oldest_event_age"] = (oldest or 0) / 1e6
+        s["dead_letters"] = dead
+        s["workers"] = len([t for t in self._threads if t.is_alive()])
+        return s
@@ -0,0 +1,88 @@
+from datetime import datetime
+
+from flask import request, jsonify
+
+# --- Keyset (cursor) pagination ---
+# Cursor = "<ISO timestamp>_<id>" of a row. ?before=<cursor> pages to older rows,
+# ?after=<cursor> to newer ones, ?limit=N sets the page size. Every page is one
+# index range scan on (owner, timestamp, id), whatever the history length.
+MAX_PAGE_SIZE = 500
+CURSOR_HEADERS = ["X-Before-Cursor", "X-After-Cursor", "X-Has-More"]
+
+
+class BadCursor(ValueError):
+    pass
+
+
+def make_cursor(ts, row_id):
+    if ts is None:
+        return None
+    return f"{ts.isoformat()}_{row_id}"
+
+
+def parse_cursor(value):
+    if not value:
+        return None
+    ts, sep, row_id = value.rpartition("_")
+    try:
+        if not sep:
+            raise ValueError(value)
+        return datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        raise BadCursor(f"Invalid cursor: {value}")
+
+
+class Page:
+    def __init__(self, default_limit, args=None):
+        # args: query parameters, the current Flask request's by default
+        args = request.args if args is None else args
+        try:
+            limit = int(args.get("limit", default_limit))
+        except ValueError:
+            raise BadCursor("limit must be an integer")
+        self.limit = max(1, min(limit, MAX_PAGE_SIZE))
+        self.before = parse_cursor(args.get("before"))
+        self.after = parse_cursor(args.get("after"))
+        # Only an ?after cursor walks forward (oldest first), everything else newest first
+        self.forward = self.after is not None and self.before is None
+        self.order = "ASC" if self.forward else "DESC"
+
+    def where(self, ts_col, id_col):
+        # "ts <= x AND (ts < x OR id < y)" keeps the leading range usable by the index
+        sql, params = "", []
+        if self.before:
+            ts, row_id = self.before
+            sql += f" AND {ts_col} <= %s AND ({ts_col} < %s OR {id_col} < %s)"
+            params += [ts, ts, row_id]
+        if self.after:
+            ts, row_id = self.after
+            sql += f" AND {ts_col} >= %s AND ({ts_col} > %s OR {id_col} > %s)"
+            params += [ts, ts, row_id]
+        return sql, params
+
+    def order_by(self, ts_col, id_col):
+        return f" ORDER BY {ts_col} {self.order}, {id_col} {self.order} LIMIT {self.limit + 1}"
+
+    def finish(self, rows, ts_key="timestamp", id_key="id"):
+        # rows were fetched with order_by(); returns them newest first with cursors
+        self.has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        if self.forward:
+            rows.reverse()
+        for r in rows:
+            r["cursor"] = make_cursor(r[ts_key], r[id_key])
+        self.rows = rows
+        return rows
+
+    def headers(self):
+        headers = {}
+        if self.rows:
+            headers["X-Before-Cursor"] = self.rows[-1]["cursor"] or ""
+            headers["X-After-Cursor"] = self.rows[0]["cursor"] or ""
+        headers["X-Has-More"] = "1" if self.has_more else "0"
+        return headers
+
+    def response(self, rows):
+        resp = jsonify(rows)
+        resp.headers.update(self.headers())
+        return resp
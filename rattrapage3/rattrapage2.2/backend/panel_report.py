@@ -0,0 +1,273 @@
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import mysql.connector
+import numpy as np
+
+import retention
+
+# --- Panel report: every patient of a doctor ranked by glycemic risk ---
+# The panel's readings for the period are read (in user_id, timestamp index
+# order) into flat numpy arrays and metrics computed per patient with
+# reduceat/bincount over contiguous slices. Decoding rows in the MySQL driver
+# is the expensive part and holds the GIL, so large panels (sized from the
+# daily rollups) are split into patient groups of similar reading counts and
+# each group is fetched and computed by a process-pool worker on its own
+# connection; only the small per-patient results come back. Reports are
+# cached per (doctor, period, target); the current period expires after `ttl`,
+# closed periods after CLOSED_PERIOD_TTL (late batch uploads can still land).
+#
+# Risk is the Glycemia Risk Index (Klonoff et al. 2022):
+#   GRI = 3.0 x %<54 + 2.4 x %54-69 + 1.6 x %>250 + 0.8 x %181-250, capped at 100
+
+VERY_LOW, LOW, HIGH, VERY_HIGH = 54, 70, 180, 250
+CLOSED_PERIOD_TTL = 86400
+FETCH_SIZE = 50000
+
+ASSIGNED = "SELECT patient_id FROM doctor_patient WHERE doctor_id=%s"
+
+
+def panel_metrics(uids, offsets, levels, days, target):
+    # uids/offsets/levels: one entry per reading, sorted by uid. offsets are
+    # seconds since the period start. Returns {uid: metrics}.
+    if not len(uids):
+        return {}
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(uids)) + 1))
+    n = np.diff(np.append(starts, len(uids)))
+
+    def share(mask):
+        return 100.0 * np.add.reduceat(mask.astype(np.int64), starts) / n
+
+    total = np.add.reduceat(levels, starts)
+    total_sq = np.add.reduceat(levels * levels, starts)
+    mean = total / n
+    variance = np.where(n > 1, (total_sq - total * total / n) / np.maximum(n - 1, 1), 0.0)
+    sd = np.sqrt(np.maximum(variance, 0.0))
+    cv = np.where(mean > 0, 100.0 * sd / np.where(mean > 0, mean, 1), 0.0)
+
+    very_low = share(levels < VERY_LOW)
+    low = share((levels >= VERY_LOW) & (levels < LOW))
+    in_range = share((levels >= LOW) & (levels <= HIGH))
+    high = share((levels > HIGH) & (levels <= VERY_HIGH))
+    very_high = share(levels > VERY_HIGH)
+    gri = np.minimum(3.0 * very_low + 2.4 * low + 1.6 * very_high + 0.8 * high, 100.0)
+
+    # A hypo event starts at a reading below LOW whose predecessor (same patient) was not
+    hypo = levels < LOW
+    prev = np.roll(hypo, 1)
+    prev[starts] = False
+    hypo_readings = np.add.reduceat(hypo.astype(np.int64), starts)
+    hypo_events = np.add.reduceat((hypo & ~prev).astype(np.int64), starts)
+
+    # Logging adherence: days with at least `target` readings
+    group = np.repeat(np.arange(len(starts)), n)
+    day = np.clip((offsets // 86400).astype(np.int64), 0, days - 1)
+    per_day = np.bincount(group * days + day, minlength=len(starts) * days).reshape(len(starts), days)
+    days_met = (per_day >= target).sum(axis=1)
+    days_logged = (per_day > 0).sum(axis=1)
+
+    out = {}
+    for i, uid in enumerate(uids[starts].tolist()):
+        out[uid] = {
+            "readings": int(n[i]),
+            "average": round(float(mean[i]), 1),
+            "cv_percent": round(float(cv[i]), 1),
+            "time_in_range_percent": round(float(in_range[i]), 1),
+            "time_below_range_percent": round(float(very_low[i] + low[i]), 1),
+            "time_very_low_percent": round(float(very_low[i]), 1),
+            "time_above_range_percent": round(float(high[i] + very_high[i]), 1),
+            "hypo_readings": int(hypo_readings[i]),
+            "hypo_events": int(hypo_events[i]),
+            "hypo_events_per_week": round(float(hypo_events[i]) * 7 / days, 1),
+            "days_logged": int(days_logged[i]),
+            "days_met_target": int(days_met[i]),
+            "adherence_percent": round(100.0 * float(days_met[i]) / days, 1),
+            "gri": round(float(gri[i]), 1),
+        }
+    return out
+
+
+def load_readings(cursor, patient_ids, start, end, boundaries=None):
+    # -> (uids, seconds since start, levels), sorted by uid; unbuffered, read in blocks
+    cursor.execute(*retention.covering(
+        "SELECT user_id, TIMESTAMPDIFF(SECOND, %s, timestamp) AS t, glucose_level FROM {table} "
+        "WHERE user_id IN (" + ", ".join(["%s"] * len(patient_ids)) + ") AND timestamp >= %s AND timestamp < %s",
+        [start] + list(patient_ids) + [start, end], "glucose_logs", start, boundaries,
+        " ORDER BY user_id, t"
+    ))
+    blocks = []
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        blocks.append(np.array(rows, dtype=np.float64))
+    data = np.concatenate(blocks) if blocks else np.empty((0, 3))
+    return data[:, 0].astype(np.int64), data[:, 1], data[:, 2]
+
+
+def fetch_metrics(db_config, patient_ids, start, end, days, target, boundaries=None):
+    # Process-pool entry point: own connection, returns {uid: metrics}
+    conn = mysql.connector.connect(**db_config)
+    try:
+        cur = conn.cursor()
+        uids, offsets, levels = load_readings(cur, patient_ids, start, end, boundaries)
+        cur.close()
+    finally:
+        conn.close()
+    return panel_metrics(uids, offsets, levels, days, target)
+
+
+def balance(counts, parts):
+    # counts: {patient_id: readings}. Greedy largest-first into the lightest group.
+    groups = [[0, []] for _ in range(parts)]
+    for pid, n in sorted(counts.items(), key=lambda kv: -kv[1]):
+        lightest = min(groups, key=lambda g: g[0])
+        lightest[0] += n
+        lightest[1].append(pid)
+    return [sorted(ids) for _, ids in groups if ids]
+
+
+class PanelReports:
+    def __init__(self, pool, workers=2, parallel_min_rows=200000, ttl=900, size=256, boundaries=None):
+        self.pool = pool
+        self.boundaries = boundaries  # -> retention boundaries, for periods reaching into the archive
+        self.workers = workers  # 0: always compute in the request thread
+        self.parallel_min_rows = parallel_min_rows
+        self.ttl = ttl
+        self.size = size
+        self._executor = None
+        self._cache = OrderedDict()  # key -> (expires, report)
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "parallel": 0, "compute_time_total": 0.0, "compute_time_max": 0.0}
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a process that runs DB and worker threads
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def get(self, doctor_id, days, end, target):
+        # Returns (report, cached). Concurrent misses for one key compute once.
+        key = (doctor_id, days, end, target)
+        report = self._cached(key)
+        if report is not None:
+            return report, True
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            report = self._cached(key, count=False)
+            if report is not None:
+                return report, True
+            start_time = time.perf_counter()
+            try:
+                report = self.build(doctor_id, days, end, target)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+            elapsed = time.perf_counter() - start_time
+            period_end = datetime.combine(end, datetime.min.time())
+            ttl = self.ttl if period_end > datetime.now() else CLOSED_PERIOD_TTL
+            with self._lock:
+                self._cache[key] = (time.monotonic() + ttl, report)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.size:
+                    self._cache.popitem(last=False)
+                self._stats["compute_time_total"] += elapsed
+                self._stats["compute_time_max"] = max(self._stats["compute_time_max"], elapsed)
+        return report, False
+
+    def _cached(self, key, count=True):
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None and hit[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                if count:
+                    self._stats["hits"] += 1
+                return hit[1]
+            if count:
+                self._stats["misses"] += 1
+            return None
+
+    def build(self, doctor_id, days, end, target):
+        period_end = datetime.combine(end, datetime.min.time())
+        period_start = period_end - timedelta(days=days)
+        boundaries = self.boundaries() if self.boundaries else None
+        db = self.pool.acquire()
+        cur = db.cursor()
+        try:
+            cur.execute(
+                "SELECT u.id, u.name, u.email, p.diabetes_type FROM doctor_patient dp "
+                "JOIN users u ON dp.patient_id = u.id LEFT JOIN patients p ON p.user_id = u.id "
+                "WHERE dp.doctor_id = %s",
+                (doctor_id,)
+            )
+            patients = [
+                {"id": r[0], "name": r[1], "email": r[2], "diabetes_type": r[3]}
+                for r in cur.fetchall()
+            ]
+            cur.execute(
+                "SELECT m.patient_id, COUNT(*), SUM(mc.change_type = 'add'), SUM(mc.change_type = 'update'), "
+                "SUM(mc.change_type = 'delete') FROM medication_changes mc "
+                "JOIN medications m ON m.id = mc.medication_id "
+                "WHERE m.patient_id IN (" + ASSIGNED + ") AND mc.change_timestamp >= %s AND mc.change_timestamp < %s "
+                "GROUP BY m.patient_id",
+                (doctor_id, period_start, period_end)
+            )
+            changes = {
+                r[0]: {"total": int(r[1]), "added": int(r[2] or 0), "updated": int(r[3] or 0), "removed": int(r[4] or 0)}
+                for r in cur.fetchall()
+            }
+            # Period bounds are midnights, so the daily rollups count its readings exactly
+            cur.execute(
+                "SELECT user_id, SUM(n) FROM glucose_rollup_daily "
+                "WHERE user_id IN (" + ASSIGNED + ") AND bucket >= %s AND bucket < %s GROUP BY user_id",
+                (doctor_id, period_start.date(), period_end.date())
+            )
+            counts = {r[0]: int(r[1]) for r in cur.fetchall() if r[1]}
+            parallel = self.workers > 0 and sum(counts.values()) >= self.parallel_min_rows
+            metrics = {}
+            if counts and not parallel:
+                readings = load_readings(cur, sorted(counts), period_start, period_end, boundaries)
+                metrics = panel_metrics(*readings, days, target)
+        finally:
+            cur.close()
+            db.close()
+
+        if parallel:
+            futures = [
+                self._pool().submit(fetch_metrics, self.pool.config, ids, period_start, period_end, days, target, boundaries)
+                for ids in balance(counts, self.workers)
+            ]
+            for f in futures:
+                metrics.update(f.result())
+            with self._lock:
+                self._stats["parallel"] += 1
+
+        for p in patients:
+            m = metrics.get(p["id"])
+            p.update(m or {"readings": 0, "gri": None, "days_logged": 0, "days_met_target": 0, "adherence_percent": 0.0})
+            p["medication_changes"] = changes.get(p["id"], {"total": 0, "added": 0, "updated": 0, "removed": 0})
+        # Highest risk first, then most medication changes; patients without readings last
+        patients.sort(key=lambda p: (p["gri"] is None, -(p["gri"] or 0), -p["medication_changes"]["total"], p["name"] or ""))
+        for rank, p in enumerate(patients, 1):
+            p["rank"] = rank
+        return {
+            "doctor_id": doctor_id,
+            "period": {"start": period_start.date().isoformat(), "end": period_end.date().isoformat(), "days": days},
+            "logging_target_per_day": target,
+            "generated_at": datetime.now().replace(microsecond=0).isoformat(),
+            "patients": patients,
+        }
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["entries"] = len(self._cache)
+        s["workers"] = self.workers
+        return s
@@ -0,0 +1,316 @@
+import calendar
+import heapq
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+import notification_state
+
+# --- Reminder scheduler ---
+# reminders.next_fire_at holds each reminder's next due time (NULL once a
+# one-off reminder has fired). The scheduler loads (next_fire_at, id) for every
+# reminder once into a heap, sleeps until the earliest one and turns everything
+# due into notifications in batches. Reminder writes call schedule()/cancel();
+# stale heap entries are skipped lazily. Firing re-reads the rows FOR UPDATE
+# and only fires those whose next_fire_at is still due, so several processes
+# running the scheduler never fire the same occurrence twice. A periodic sweep
+# of the next_fire_at index picks up reminders written by other processes.
+# After a restart each reminder that fell due while down fires once, for its
+# latest occurrence, if that is at most catch_up seconds late; the older
+# occurrences it missed are skipped. Monthly reminders keep the day of month
+# they started on in anchor_day (Jan 31 -> Feb 28 -> Mar 31).
+
+FREQUENCIES = ("once", "hourly", "every 6 hours", "every 8 hours", "daily", "weekly", "monthly")
+STEPS = {
+    "hourly": timedelta(hours=1),
+    "every 6 hours": timedelta(hours=6),
+    "every 8 hours": timedelta(hours=8),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+}
+TYPE_LABELS = {"medication": "Medication", "meal": "Meal", "exercise": "Exercise", "glucose": "Glucose check"}
+RETRY_DELAY = timedelta(seconds=30)
+TITLE_MAX = 128  # notifications.title is varchar(128)
+
+
+def parse_time(value):
+    # "HH:MM[:SS]" from the client or a TIME column (timedelta) -> (hour, minute)
+    if isinstance(value, timedelta):
+        minutes = int(value.total_seconds()) // 60
+        return (minutes // 60) % 24, minutes % 60
+    m = re.fullmatch(r"(\d{1,2}):(\d{2})(?::\d{2})?", str(value or "").strip())
+    if not m or int(m.group(1)) > 23 or int(m.group(2)) > 59:
+        raise ValueError("time must be HH:MM")
+    return int(m.group(1)), int(m.group(2))
+
+
+def add_month(dt, day):
+    # Next month on `day`, or its last day if the month is shorter
+    year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+    return dt.replace(year=year, month=month, day=min(day, calendar.monthrange(year, month)[1]))
+
+
+def step(dt, frequency, anchor_day=None):
+    if frequency == "monthly":
+        return add_month(dt, anchor_day or dt.day)
+    return dt + STEPS[frequency]
+
+
+def anchor_day(frequency, first):
+    # reminders.anchor_day for a schedule starting at `first`
+    return first.day if frequency == "monthly" and first is not None else None
+
+
+def first_fire(time_of_day, frequency, now):
+    # Next occurrence of the reminder's time of day, stepping by its frequency
+    hour, minute = parse_time(time_of_day)
+    at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if frequency in STEPS and STEPS[frequency] < timedelta(days=1):
+        # Sub-daily: anchored on the time of day, may fall later today
+        while at <= now:
+            at += STEPS[frequency]
+        return at
+    return at if at > now else at + timedelta(days=1)
+
+
+def latest_due(due, frequency, now, anchor_day=None):
+    # -> (last occurrence at or before now, number of earlier ones missed)
+    if frequency in STEPS:
+        missed = int((now - due) / STEPS[frequency])
+        return due + missed * STEPS[frequency], missed
+    missed = 0
+    if frequency == "monthly":
+        nxt = step(due, frequency, anchor_day)
+        while nxt <= now:
+            due, nxt = nxt, step(nxt, frequency, anchor_day)
+            missed += 1
+    return due, missed
+
+
+def advance(due, frequency, anchor_day=None):
+    # Occurrence after `due`; None for one-offs
+    if frequency not in STEPS and frequency != "monthly":
+        return None
+    return step(due, frequency, anchor_day)
+
+
+class ReminderScheduler:
+    def __init__(self, pool, batch_size=500, sweep_interval=300, catch_up=6 * 3600, on_written=None):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.sweep_interval = sweep_interval  # seconds between next_fire_at index sweeps
+        self.catch_up = catch_up  # occurrences later than this are skipped, not notified
+        self.on_written = on_written  # called with the user ids that got notifications
+        self._heap = []
+        self._due = {}  # reminder id -> next_fire_at currently scheduled
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {"fired": 0, "skipped_late": 0, "batches": 0, "failures": 0, "lag_max": 0.0, "loaded": 0}
+
+    # --- Index maintenance (called by reminder writes) ---
+    def schedule(self, reminder_id, fire_at):
+        if fire_at is None:
+            return self.cancel(reminder_id)
+        with self._lock:
+            if self._due.get(reminder_id) == fire_at:
+                return
+            self._due[reminder_id] = fire_at
+            heapq.heappush(self._heap, (fire_at, reminder_id))
+            if len(self._heap) > 2 * len(self._due) + 1024:
+                # Mostly superseded entries: rebuild from the live schedule
+                self._heap = [(t, i) for i, t in self._due.items()]
+                heapq.heapify(self._heap)
+            earliest = self._heap[0][1] == reminder_id
+        if earliest:
+            self._wake.set()
+
+    def cancel(self, reminder_id):
+        with self._lock:
+            self._due.pop(reminder_id, None)
+
+    # --- Thread ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        next_sweep = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() >= next_sweep:
+                    # The first sweep is the full load
+                    self.sweep(full=next_sweep == 0.0)
+                    next_sweep = time.monotonic() + self.sweep_interval
+                while self.fire_due() >= self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"ERROR: reminder scheduler failed: {e}")
+                with self._lock:
+                    self._stats["failures"] += 1
+                next_sweep = min(next_sweep, time.monotonic() + 30)
+            self._wake.wait(max(min(self._seconds_to_next(), next_sweep - time.monotonic()), 0.05))
+            self._wake.clear()
+
+    def _seconds_to_next(self):
+        with self._lock:
+            self._drop_stale()
+            if not self._heap:
+                return float("inf")
+            fire_at = self._heap[0][0]
+        return (fire_at - datetime.now()).total_seconds()
+
+    def _drop_stale(self):
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    # --- Loading ---
+    def sweep(self, full=False):
+        # full: every scheduled reminder (startup). Otherwise only those due
+        # before the next sweep, one range of the next_fire_at index.
+        now = datetime.now()
+        db = self.pool.acquire()
+        cur = db.cursor()
+        try:
+            if full:
+                self._backfill(db, cur, now)
+                cur.execute("SELECT id, next_fire_at FROM reminders WHERE next_fire_at IS NOT NULL")
+            else:
+                cur.execute(
+                    "SELECT id, next_fire_at FROM reminders WHERE next_fire_at <= %s",
+                    (now + timedelta(seconds=self.sweep_interval),)
+                )
+            rows = cur.fetchall()
+            # One heapify for the whole load instead of a push per row
+            with self._lock:
+                for reminder_id, fire_at in rows:
+                    if self._due.get(reminder_id) != fire_at:
+                        self._due[reminder_id] = fire_at
+                        self._heap.append((fire_at, reminder_id))
+                heapq.heapify(self._heap)
+                if full:
+                    self._stats["loaded"] = len(rows)
+        finally:
+            cur.close()
+            db.close()
+
+    def _backfill(self, db, cur, now):
+        # Recurring reminders created before next_fire_at existed. One-off ones
+        # are left alone: there is no telling whether they already went off.
+        cur.execute(
+            "SELECT id, time, frequency FROM reminders "
+            "WHERE next_fire_at IS NULL AND last_fired_at IS NULL AND time IS NOT NULL AND frequency <> 'once'"
+        )
+        updates = []
+        for reminder_id, time_of_day, frequency in cur.fetchall():
+            if frequency in FREQUENCIES:
+                first = first_fire(time_of_day, frequency, now)
+                updates.append((first, anchor_day(frequency, first), reminder_id))
+        if updates:
+            cur.executemany(
+                "UPDATE reminders SET next_fire_at=%s, anchor_day=%s WHERE id=%s AND next_fire_at IS NULL", updates
+            )
+            db.commit()
+
+    # --- Firing ---
+    def fire_due(self):
+        now = datetime.now()
+        with self._lock:
+            batch = []
+            while self._heap and len(batch) < self.batch_size:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                fire_at, reminder_id = heapq.heappop(self._heap)
+                del self._due[reminder_id]
+                batch.append(reminder_id)
+        if not batch:
+            return 0
+
+        db = self.pool.acquire()
+        cur = db.cursor(dictionary=True)
+        notifications, updates, reschedule, lags = [], [], [], []
+        skipped = 0
+        try:
+            cur.execute(
+                "SELECT id, user_id, title, type, time, frequency, anchor_day, next_fire_at FROM reminders "
+                "WHERE id IN (" + ", ".join(["%s"] * len(batch)) + ") FOR UPDATE",
+                batch
+            )
+            for r in cur.fetchall():
+                due = r["next_fire_at"]
+                if due is None:
+                    continue  # fired by another process, or a one-off that is done
+                if due > now:
+                    reschedule.append((r["id"], due))  # moved by a write we did not see
+                    continue
+                # Only the latest missed occurrence is notified
+                due, missed = latest_due(due, r["frequency"], now, r["anchor_day"])
+                skipped += missed
+                nxt = advance(due, r["frequency"], r["anchor_day"])
+                updates.append((nxt, now, r["id"]))
+                reschedule.append((r["id"], nxt))
+                lag = (now - due).total_seconds()
+                if lag > self.catch_up:
+                    skipped += 1
+                    continue
+                lags.append(lag)
+                label = TYPE_LABELS.get(r["type"], "Reminder")
+                hour, minute = parse_time(r["time"]) if r["time"] is not None else (due.hour, due.minute)
+                notifications.append((
+                    r["user_id"], r["user_id"], "reminder",
+                    f"Reminder: {r['title'] or label}"[:TITLE_MAX],
+                    f"{label} reminder for {hour:02d}:{minute:02d}" + (" (delivered late)." if lag > 60 else "."),
+                ))
+            if updates:
+                cur.executemany("UPDATE reminders SET next_fire_at=%s, last_fired_at=%s WHERE id=%s", updates)
+            if notifications:
+                cur.execute(
+                    "INSERT INTO notifications (user_id, patient_id, type, title, body) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s, %s)"] * len(notifications)),
+                    [v for row in notifications for v in row]
+                )
+                notification_state.record_written(cur, [row[0] for row in notifications])
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the batch back; it is retried in RETRY_DELAY
+            retry_at = now + RETRY_DELAY
+            with self._lock:
+                for reminder_id in batch:
+                    if reminder_id not in self._due:
+                        self._due[reminder_id] = retry_at
+                        heapq.heappush(self._heap, (retry_at, reminder_id))
+            raise
+        finally:
+            cur.close()
+            db.close()
+
+        for reminder_id, fire_at in reschedule:
+            self.schedule(reminder_id, fire_at)
+        if notifications and self.on_written is not None:
+            self.on_written([row[0] for row in notifications])
+        with self._lock:
+            s = self._stats
+            s["batches"] += 1
+            s["fired"] += len(notifications)
+            s["skipped_late"] += skipped
+            if lags:
+                s["lag_max"] = max(s["lag_max"], max(lags))
+        return len(batch)
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["scheduled"] = len(self._due)
+            s["heap_size"] = len(self._heap)
+            self._drop_stale()
+            s["next_fire_at"] = self._heap[0][0] if self._heap else None
+        s["running"] = bool(self._thread and self._thread.is_alive())
+        return s
@@ -0,0 +1,100 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import Response, request
+
+# --- In-process cache for shared, rarely-changing JSON responses ---
+# Entries hold the serialized body plus an ETag (hash of the body) and the time
+# that body was first seen, so conditional GETs are answered with 304 without
+# touching the database. Writes call invalidate(); the TTL bounds staleness for
+# writes made by other processes. A key may carry a variant ("articles?summary");
+# invalidating the base key drops every variant of it.
+
+
+class Entry:
+    def __init__(self, body, etag, last_modified, expires):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+
+def base_key(key):
+    return key.partition("?")[0]
+
+
+class ResponseCache:
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self._entries = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > time.monotonic():
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def generation(self, key):
+        with self._lock:
+            return self._generations.get(base_key(key), 0)
+
+    def put(self, key, generation, body):
+        # generation comes from before the load; if a write invalidated the key
+        # in the meantime the (possibly stale) body is served but not stored
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None and old.etag == etag:
+                last_modified = old.last_modified
+            else:
+                last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+            entry = Entry(body, etag, last_modified, time.monotonic() + self.ttl)
+            if self._generations.get(base_key(key), 0) == generation and self.ttl > 0:
+                self._entries[key] = entry
+            return entry
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+                for cached in [k for k in self._entries if base_key(k) == key]:
+                    del self._entries[cached]
+                self.invalidations += 1
+
+    def respond(self, key, load, dumps):
+        # load() runs the query, dumps() serializes it; both skipped on a hit
+        entry = self.get(key)
+        if entry is None:
+            generation = self.generation(key)
+            entry = self.put(key, generation, dumps(load()).encode())
+        resp = Response(entry.body, mimetype="application/json")
+        resp.set_etag(entry.etag)
+        resp.last_modified = entry.last_modified
+        resp.headers["Cache-Control"] = "no-cache"
+        resp.make_conditional(request)
+        if resp.status_code == 304:
+            with self._lock:
+                self.not_modified += 1
+        return resp
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ttl": self.ttl,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "invalidations": self.invalidations,
+            }
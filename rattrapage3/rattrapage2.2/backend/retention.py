@@ -0,0 +1,302 @@
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+import notification_state
+
+# --- Retention: hot tables + monthly-partitioned compressed archives ---
+# glucose_logs and notifications stay plain InnoDB tables with their foreign
+# keys (MariaDB cannot partition a table that has them) and only hold recent
+# rows. Older rows are moved in id-ordered batches into glucose_logs_archive /
+# notifications_archive: ROW_FORMAT=COMPRESSED and RANGE-partitioned by month
+# on the time column, so a ranged read only opens the months it covers and
+# expiring a month of archived notifications is a DROP PARTITION.
+#
+# archive_state holds each table's boundary: rows older than archived_before
+# may be in the archive, nothing newer is. Readers cache the boundaries for
+# BOUNDARY_TTL seconds and only add the archive to a query whose range starts
+# before it. A new boundary is published first and rows below it are moved on
+# a later run, once every reader has picked it up. Only notifications that are
+# read (per-item flag or the read watermark) are archived, so unread counters
+# never change. Old glucose rows stay readable everywhere; the daily rollups
+# keep stats and reports over archived months cheap.
+
+ARCHIVES = {
+    "glucose_logs": "glucose_logs_archive",
+    "notifications": "notifications_archive",
+}
+TIME_COLUMNS = {"glucose_logs": "timestamp", "notifications": "created_at"}
+# Partition bound expression for each archive's time column type
+BOUND_SQL = {"glucose_logs": "TO_DAYS('{}')", "notifications": "UNIX_TIMESTAMP('{}')"}
+# (archive columns, SELECT list, FROM, extra condition); the SELECT list fills the archive columns
+MOVES = {
+    "glucose_logs": (
+        "id, user_id, timestamp, glucose_level, category, context",
+        "t.id, t.user_id, t.timestamp, t.glucose_level, t.category, t.context",
+        "glucose_logs t",
+        "",
+    ),
+    "notifications": (
+        "id, user_id, patient_id, type, title, body, created_at, `read`",
+        "t.id, t.user_id, t.patient_id, t.type, t.title, t.body, t.created_at, 1",
+        "notifications t LEFT JOIN notification_state s ON s.user_id = t.user_id",
+        " AND " + notification_state.READ_SQL.replace("n.", "t."),
+    ),
+}
+BOUNDARY_SQL = "SELECT table_name, archived_before FROM archive_state"
+BOUNDARY_TTL = 60
+PARTITION_NAME = re.compile(r"p(\d{4})(\d{2})")
+
+
+def month_start(dt):
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(dt, months):
+    index = dt.year * 12 + dt.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def covering(sql, params, table, start, boundaries, order=""):
+    # sql: one SELECT over {table}. Reads the archive too (UNION ALL, same
+    # filters) when the range starts before the table's boundary. order then
+    # sorts the union, so it may only name columns of the SELECT list.
+    boundary = (boundaries or {}).get(table)
+    if boundary is None or (start is not None and start >= boundary):
+        return sql.format(table=table) + order, list(params)
+    return (
+        "(" + sql.format(table=table) + ") UNION ALL (" + sql.format(table=ARCHIVES[table]) + ")" + order,
+        list(params) * 2
+    )
+
+
+def archive_needed(page, rows, ts_key, boundary):
+    # rows: one page (limit + 1) from the hot table. Archived rows are all older
+    # than the boundary, so a full page that ends at or after it is final.
+    if boundary is None:
+        return False
+    if page.forward:
+        return page.after[0] < boundary
+    return len(rows) <= page.limit or rows[-1][ts_key] < boundary
+
+
+def merge(page, hot, archived, ts_key):
+    rows = sorted(hot + archived, key=lambda r: (r[ts_key], r["id"]), reverse=not page.forward)
+    return rows[:page.limit + 1]
+
+
+class Retention:
+    def __init__(self, pool, glucose_hot_months=12, glucose_archive_months=0,
+                 notification_hot_days=90, notification_archive_days=365,
+                 batch_size=5000, interval=3600):
+        self.pool = pool
+        self.glucose_hot_months = glucose_hot_months  # 0: never archive
+        self.glucose_archive_months = glucose_archive_months  # 0: keep archived readings forever
+        self.notification_hot_days = notification_hot_days
+        self.notification_archive_days = notification_archive_days  # 0: keep forever
+        self.batch_size = batch_size
+        self.interval = interval
+        self.publish_delay = 2 * BOUNDARY_TTL  # a boundary this old is seen by every reader
+        self._boundaries = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {"runs": 0, "failures": 0, "moved": {}, "dropped_partitions": 0,
+                       "last_run": None, "last_duration": None}
+
+    # --- Boundaries (read side) ---
+    def boundaries(self):
+        cached = self.cached_boundaries()
+        if cached is not None:
+            return cached
+        db = self.pool.acquire()
+        cur = db.cursor()
+        try:
+            cur.execute(BOUNDARY_SQL)
+            return self.set_boundaries(cur.fetchall())
+        finally:
+            cur.close()
+            db.close()
+
+    def cached_boundaries(self):
+        # None once stale; asgi.py refreshes it with its own async query
+        with self._lock:
+            if self._boundaries is not None and time.monotonic() - self._loaded_at < BOUNDARY_TTL:
+                return self._boundaries
+        return None
+
+    def set_boundaries(self, rows):
+        boundaries = {name: before for name, before in rows if name in ARCHIVES}
+        with self._lock:
+            self._boundaries = boundaries
+            self._loaded_at = time.monotonic()
+        return boundaries
+
+    # --- Thread ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run()
+            except Exception as e:
+                print(f"ERROR: retention run failed: {e}")
+                with self._lock:
+                    self._stats["failures"] += 1
+
+    # --- Policy ---
+    def targets(self, now):
+        # table -> (boundary to publish, archive cutoff for dropping partitions)
+        out = {}
+        if self.glucose_hot_months:
+            drop = add_months(month_start(now), -self.glucose_archive_months) if self.glucose_archive_months else None
+            out["glucose_logs"] = (add_months(month_start(now), -self.glucose_hot_months), drop)
+        if self.notification_hot_days:
+            hot = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=self.notification_hot_days)
+            drop = now - timedelta(days=self.notification_archive_days) if self.notification_archive_days else None
+            out["notifications"] = (hot, drop)
+        return out
+
+    def run(self, now=None):
+        # One pass over every table; several processes may run it, one works at a time
+        now = now or datetime.now()
+        started = time.perf_counter()
+        summary = {}
+        db = self.pool.acquire()
+        cur = db.cursor()
+        try:
+            cur.execute("SELECT GET_LOCK('retention', 0)")
+            if not cur.fetchone()[0]:
+                return {"skipped": "another retention run holds the lock"}
+            try:
+                cur.execute("SELECT table_name, archived_before, published_at FROM archive_state")
+                state = {r[0]: (r[1], r[2]) for r in cur.fetchall()}
+                for table, (target, drop_before) in self.targets(now).items():
+                    summary[table] = self._run_table(db, cur, table, target, drop_before, state.get(table), now)
+            finally:
+                cur.execute("SELECT RELEASE_LOCK('retention')")
+                cur.fetchall()
+        finally:
+            cur.close()
+            db.close()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            s = self._stats
+            s["runs"] += 1
+            s["last_run"] = now.replace(microsecond=0).isoformat()
+            s["last_duration"] = round(elapsed, 3)
+            for table, result in summary.items():
+                s["moved"][table] = s["moved"].get(table, 0) + result["moved"]
+                s["dropped_partitions"] += len(result["dropped"])
+            self._boundaries = None  # reload on next read
+        return summary
+
+    def _run_table(self, db, cur, table, target, drop_before, state, now):
+        archive = ARCHIVES[table]
+        self.add_partitions(cur, archive, BOUND_SQL[table], add_months(month_start(now), 1))
+        before, published_at = state or (None, None)
+        if before is None or target > before:
+            cur.execute(
+                "INSERT INTO archive_state (table_name, archived_before, published_at) VALUES (%s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE archived_before=VALUES(archived_before), published_at=VALUES(published_at)",
+                (table, target, now)
+            )
+            db.commit()
+        moved = 0
+        if before is not None and published_at <= now - timedelta(seconds=self.publish_delay):
+            moved = self.move(db, cur, table, before)
+        dropped = self.drop_partitions(cur, archive, drop_before) if drop_before else []
+        boundary = target if before is None else max(target, before)
+        return {"archived_before": boundary.isoformat(), "moved": moved, "dropped": dropped}
+
+    # --- Moving rows ---
+    def move(self, db, cur, table, before):
+        # Walks the primary key from the oldest row in batch_size windows, moving
+        # rows older than `before`; stops at the first window with none (the
+        # rest of the table is newer, except late batch uploads, which stay hot).
+        columns, select, source, extra = MOVES[table]
+        ts = TIME_COLUMNS[table]
+        lo, moved = 0, 0
+        while not self._stop.is_set():
+            cur.execute(
+                f"SELECT MAX(id), SUM({ts} < %s) FROM "
+                f"(SELECT id, {ts} FROM {table} WHERE id > %s ORDER BY id LIMIT %s) w",
+                (before, lo, self.batch_size)
+            )
+            hi, cold = cur.fetchone()
+            if hi is None or not cold:
+                break
+            where = f" WHERE t.id > %s AND t.id <= %s AND t.{ts} < %s" + extra
+            try:
+                cur.execute(
+                    f"INSERT INTO {ARCHIVES[table]} ({columns}) SELECT {select} FROM {source}" + where,
+                    (lo, hi, before)
+                )
+                cur.execute(f"DELETE t FROM {source}" + where, (lo, hi, before))
+                moved += cur.rowcount
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            lo = hi
+        return moved
+
+    # --- Partition maintenance ---
+    def partitions(self, cur, table):
+        # [(name, month start or None for pmax)] in order; [] if not partitioned
+        cur.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            (table,)
+        )
+        out = []
+        for (name,) in cur.fetchall():
+            m = PARTITION_NAME.fullmatch(name)
+            out.append((name, datetime(int(m.group(1)), int(m.group(2)), 1) if m else None))
+        return out
+
+    def add_partitions(self, cur, table, bound_sql, through):
+        # Splits empty months off pmax up to `through`, so archived rows never land in pmax
+        parts = self.partitions(cur, table)
+        if not parts or parts[-1][0] != "pmax":
+            return []
+        months = [m for _, m in parts if m is not None]
+        month = add_months(months[-1], 1) if months else add_months(through, -1)
+        new = []
+        while month <= through:
+            new.append((month, add_months(month, 1)))
+            month = add_months(month, 1)
+        if not new:
+            return []
+        cur.execute(
+            f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ("
+            + ", ".join(
+                f"PARTITION p{m:%Y%m} VALUES LESS THAN ({bound_sql.format(f'{end:%Y-%m-%d}')})"
+                for m, end in new
+            )
+            + ", PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        )
+        return [f"p{m:%Y%m}" for m, _ in new]
+
+    def drop_partitions(self, cur, table, before):
+        # Whole months that ended before `before`
+        names = [name for name, m in self.partitions(cur, table) if m is not None and add_months(m, 1) <= before]
+        if names:
+            cur.execute(f"ALTER TABLE {table} DROP PARTITION " + ", ".join(names))
+        return names
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["moved"] = dict(s["moved"])
+            s["boundaries"] = {k: v.isoformat() for k, v in (self._boundaries or {}).items()}
+        s["running"] = bool(self._thread and self._thread.is_alive())
+        return s
@@ -0,0 +1,84 @@
+import re
+
+# --- Article / FAQ search ---
+# Backed by the FULLTEXT keys on articles(title, content) and faqs(question,
+# answer), which InnoDB keeps current on every insert/update. Ranking runs on
+# ids and scores only; full bodies are read for the returned page alone and
+# cut down to a snippet around the first matching term.
+SOURCES = {
+    "articles": (
+        "SELECT 'article' AS type, id, MATCH(title, content) AGAINST (%s) AS score "
+        "FROM articles WHERE MATCH(title, content) AGAINST (%s)"
+    ),
+    "faqs": (
+        "SELECT 'faq' AS type, id, MATCH(question, answer) AGAINST (%s) AS score "
+        "FROM faqs WHERE MATCH(question, answer) AGAINST (%s)"
+    ),
+}
+DETAILS = {
+    "article": (
+        "SELECT a.id, a.title, a.content AS body, a.timestamp, u.name AS doctor_name "
+        "FROM articles a LEFT JOIN users u ON u.id = a.doctor_id WHERE a.id IN ({})"
+    ),
+    "faq": (
+        "SELECT f.id, f.question AS title, f.answer AS body, f.timestamp, u.name AS doctor_name "
+        "FROM faqs f LEFT JOIN users u ON u.id = f.doctor_id WHERE f.id IN ({})"
+    ),
+}
+SNIPPET_CHARS = 200
+
+
+def terms(query):
+    return [t for t in re.findall(r"\w+", query.lower()) if len(t) >= 3]
+
+
+def snippet(text, words, width=SNIPPET_CHARS):
+    if not text:
+        return ""
+    text = re.sub(r"\s+", " ", text).strip()
+    lower = text.lower()
+    hits = [i for i in (lower.find(w) for w in words) if i >= 0]
+    start = max(min(hits) - width // 4, 0) if hits else 0
+    if start:
+        # Start on a word boundary
+        space = text.find(" ", start)
+        start = space + 1 if 0 <= space < start + 20 else start
+    end = start + width
+    out = text[start:end]
+    return ("..." if start else "") + out + ("..." if end < len(text) else "")
+
+
+def search(db, query, kinds, limit, offset):
+    # Returns (hits, has_more); hits in rank order
+    ranked_sql = " UNION ALL ".join("(" + SOURCES[k] + ")" for k in kinds)
+    params = [query, query] * len(kinds)
+    cur = db.cursor(dictionary=True)
+    cur.execute(ranked_sql + " ORDER BY score DESC, id DESC LIMIT %s OFFSET %s", params + [limit + 1, offset])
+    ranked = cur.fetchall()
+    has_more = len(ranked) > limit
+    ranked = ranked[:limit]
+
+    details = {}
+    for kind, sql in DETAILS.items():
+        ids = [r["id"] for r in ranked if r["type"] == kind]
+        if ids:
+            cur.execute(sql.format(", ".join(["%s"] * len(ids))), ids)
+            details.update({(kind, row["id"]): row for row in cur.fetchall()})
+    cur.close()
+
+    words = terms(query)
+    hits = []
+    for r in ranked:
+        row = details.get((r["type"], r["id"]))
+        if row is None:
+            continue  # deleted between the two queries
+        hits.append({
+            "type": r["type"],
+            "id": r["id"],
+            "title": row["title"],
+            "snippet": snippet(row["body"], words),
+            "score": round(float(r["score"]), 4),
+            "timestamp": row["timestamp"],
+            "doctor_name": row["doctor_name"],
+        })
+    return hits, has_more
@@ -0,0 +1,39 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import reminder_scheduler
+
+
+def monthly(first, count):
+    anchor = reminder_scheduler.anchor_day("monthly", first)
+    out, at = [], first
+    for _ in range(count):
+        at = reminder_scheduler.step(at, "monthly", anchor)
+        out.append(at.date().isoformat())
+    return out
+
+
+def test_monthly_mid_month_anchor():
+    assert monthly(datetime(2026, 1, 15, 8), 3) == ["2026-02-15", "2026-03-15", "2026-04-15"]
+
+
+def test_monthly_day_29_clamps_in_february_only():
+    assert monthly(datetime(2026, 1, 29, 8), 3) == ["2026-02-28", "2026-03-29", "2026-04-29"]
+    assert monthly(datetime(2028, 1, 29, 8), 1) == ["2028-02-29"]
+
+
+def test_monthly_day_30_returns_after_february():
+    assert monthly(datetime(2026, 1, 30, 8), 3) == ["2026-02-28", "2026-03-30", "2026-04-30"]
+
+
+def test_monthly_day_31_follows_month_ends():
+    assert monthly(datetime(2026, 1, 31, 8), 4) == ["2026-02-28", "2026-03-31", "2026-04-30", "2026-05-31"]
+    assert monthly(datetime(2026, 12, 31, 8), 1) == ["2027-01-31"]
+
+
+def test_latest_due_monthly_after_downtime():
+    due, missed = reminder_scheduler.latest_due(datetime(2026, 1, 15, 8), "monthly", datetime(2026, 4, 20), 15)
+    assert (due, missed) == (datetime(2026, 4, 15, 8), 3)
+    assert reminder_scheduler.advance(due, "monthly", 15) == datetime(2026, 5, 15, 8)
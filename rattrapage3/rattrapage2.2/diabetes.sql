@@ -34,12 +34,25 @@ CREATE TABLE `appointments` (
   `appointment_time` datetime NOT NULL,
   `notes` text DEFAULT NULL,
   `status` enum('scheduled','cancelled','completed','rescheduled') DEFAULT 'scheduled',
+  `duration_minutes` int(11) NOT NULL DEFAULT 30,
   `created_at` timestamp NOT NULL DEFAULT current_timestamp(),
   `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp()
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 -- --------------------------------------------------------
 
+--
+-- Structure de la table `archive_state`
+--
+
+CREATE TABLE `archive_state` (
+  `table_name` varchar(64) NOT NULL,
+  `archived_before` datetime NOT NULL,
+  `published_at` datetime NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Structure de la table `articles`
 --
@@ -80,6 +93,36 @@ CREATE TABLE `challenge_participants` (
 
 -- --------------------------------------------------------
 
+--
+-- Structure de la table `conversation_summaries`
+--
+
+CREATE TABLE `conversation_summaries` (
+  `user_id` int(11) NOT NULL,
+  `other_id` int(11) NOT NULL,
+  `conversation_id` bigint(20) NOT NULL,
+  `last_message_id` int(11) DEFAULT NULL,
+  `last_message` varchar(255) DEFAULT NULL,
+  `last_sender_id` int(11) DEFAULT NULL,
+  `last_message_at` datetime DEFAULT NULL,
+  `unread` int(11) NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Structure de la table `doctor_hours`
+--
+
+CREATE TABLE `doctor_hours` (
+  `doctor_id` int(11) NOT NULL,
+  `weekday` tinyint(4) NOT NULL,
+  `start_time` time NOT NULL,
+  `end_time` time NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Structure de la table `doctors`
 --
@@ -93,7 +136,8 @@ CREATE TABLE `doctors` (
   `city` varchar(100) DEFAULT NULL,
   `country` varchar(100) DEFAULT NULL,
   `license_number` varchar(100) DEFAULT NULL,
-  `specialty_id` int(11) DEFAULT NULL
+  `specialty_id` int(11) DEFAULT NULL,
+  `slot_minutes` int(11) NOT NULL DEFAULT 30
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 -- --------------------------------------------------------
@@ -138,6 +182,73 @@ CREATE TABLE `glucose_logs` (
 
 -- --------------------------------------------------------
 
+--
+-- Structure de la table `glucose_logs_archive`
+--
+
+CREATE TABLE `glucose_logs_archive` (
+  `id` int(11) NOT NULL,
+  `user_id` int(11) DEFAULT NULL,
+  `timestamp` datetime NOT NULL,
+  `glucose_level` float NOT NULL,
+  `category` enum('Hypoglycemia','Normal','Hyperglycemia') DEFAULT NULL,
+  `context` enum('Fasting','Post-meal','Other') DEFAULT 'Other'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8
+PARTITION BY RANGE (TO_DAYS(`timestamp`))
+(
+PARTITION p202501 VALUES LESS THAN (TO_DAYS('2025-02-01')),
+PARTITION p202502 VALUES LESS THAN (TO_DAYS('2025-03-01')),
+PARTITION p202503 VALUES LESS THAN (TO_DAYS('2025-04-01')),
+PARTITION p202504 VALUES LESS THAN (TO_DAYS('2025-05-01')),
+PARTITION p202505 VALUES LESS THAN (TO_DAYS('2025-06-01')),
+PARTITION p202506 VALUES LESS THAN (TO_DAYS('2025-07-01')),
+PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- --------------------------------------------------------
+
+--
+-- Structure de la table `glucose_rollup_daily`
+--
+
+CREATE TABLE `glucose_rollup_daily` (
+  `user_id` int(11) NOT NULL,
+  `bucket` date NOT NULL,
+  `n` int(11) NOT NULL DEFAULT 0,
+  `total` double NOT NULL DEFAULT 0,
+  `total_sq` double NOT NULL DEFAULT 0,
+  `min_level` float DEFAULT NULL,
+  `max_level` float DEFAULT NULL,
+  `below_range` int(11) NOT NULL DEFAULT 0,
+  `in_range` int(11) NOT NULL DEFAULT 0,
+  `above_range` int(11) NOT NULL DEFAULT 0,
+  `hypo` int(11) NOT NULL DEFAULT 0,
+  `hyper` int(11) NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Structure de la table `glucose_rollup_hourly`
+--
+
+CREATE TABLE `glucose_rollup_hourly` (
+  `user_id` int(11) NOT NULL,
+  `bucket` datetime NOT NULL,
+  `n` int(11) NOT NULL DEFAULT 0,
+  `total` double NOT NULL DEFAULT 0,
+  `total_sq` double NOT NULL DEFAULT 0,
+  `min_level` float DEFAULT NULL,
+  `max_level` float DEFAULT NULL,
+  `below_range` int(11) NOT NULL DEFAULT 0,
+  `in_range` int(11) NOT NULL DEFAULT 0,
+  `above_range` int(11) NOT NULL DEFAULT 0,
+  `hypo` int(11) NOT NULL DEFAULT 0,
+  `hyper` int(11) NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Structure de la table `meals`
 --
@@ -196,6 +307,7 @@ CREATE TABLE `medication_changes` (
 
 CREATE TABLE `messages` (
   `id` int(11) NOT NULL,
+  `conversation_id` bigint(20) DEFAULT NULL,
   `sender_id` int(11) DEFAULT NULL,
   `receiver_id` int(11) DEFAULT NULL,
   `message` text DEFAULT NULL,
@@ -204,6 +316,37 @@ CREATE TABLE `messages` (
 
 -- --------------------------------------------------------
 
+--
+-- Structure de la table `notification_outbox`
+--
+
+CREATE TABLE `notification_outbox` (
+  `id` bigint(20) NOT NULL,
+  `event_type` varchar(32) NOT NULL,
+  `payload` text NOT NULL,
+  `created_at` timestamp(3) NOT NULL DEFAULT current_timestamp(3),
+  `claimed_by` char(32) DEFAULT NULL,
+  `claimed_at` timestamp NULL DEFAULT NULL,
+  `attempts` int(11) NOT NULL DEFAULT 0,
+  `last_error` varchar(255) DEFAULT NULL,
+  `failed_at` timestamp NULL DEFAULT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Structure de la table `notification_state`
+--
+
+CREATE TABLE `notification_state` (
+  `user_id` int(11) NOT NULL,
+  `last_read_id` int(11) NOT NULL DEFAULT 0,
+  `unread` int(11) NOT NULL DEFAULT 0,
+  `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp()
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Structure de la table `notifications`
 --
@@ -211,6 +354,7 @@ CREATE TABLE `messages` (
 CREATE TABLE `notifications` (
   `id` int(11) NOT NULL,
   `user_id` int(11) NOT NULL,
+  `patient_id` int(11) DEFAULT NULL,
   `type` varchar(32) NOT NULL,
   `title` varchar(128) NOT NULL,
   `body` text DEFAULT NULL,
@@ -220,6 +364,33 @@ CREATE TABLE `notifications` (
 
 -- --------------------------------------------------------
 
+--
+-- Structure de la table `notifications_archive`
+--
+
+CREATE TABLE `notifications_archive` (
+  `id` int(11) NOT NULL,
+  `user_id` int(11) NOT NULL,
+  `patient_id` int(11) DEFAULT NULL,
+  `type` varchar(32) NOT NULL,
+  `title` varchar(128) NOT NULL,
+  `body` text DEFAULT NULL,
+  `created_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  `read` tinyint(1) NOT NULL DEFAULT 1
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8
+PARTITION BY RANGE (UNIX_TIMESTAMP(`created_at`))
+(
+PARTITION p202501 VALUES LESS THAN (UNIX_TIMESTAMP('2025-02-01')),
+PARTITION p202502 VALUES LESS THAN (UNIX_TIMESTAMP('2025-03-01')),
+PARTITION p202503 VALUES LESS THAN (UNIX_TIMESTAMP('2025-04-01')),
+PARTITION p202504 VALUES LESS THAN (UNIX_TIMESTAMP('2025-05-01')),
+PARTITION p202505 VALUES LESS THAN (UNIX_TIMESTAMP('2025-06-01')),
+PARTITION p202506 VALUES LESS THAN (UNIX_TIMESTAMP('2025-07-01')),
+PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- --------------------------------------------------------
+
 --
 -- Structure de la table `patients`
 --
@@ -283,7 +454,10 @@ CREATE TABLE `reminders` (
   `title` varchar(255) DEFAULT NULL,
   `type` enum('medication','meal','exercise','glucose') NOT NULL,
   `time` time DEFAULT NULL,
-  `frequency` varchar(50) DEFAULT NULL
+  `frequency` varchar(50) DEFAULT NULL,
+  `anchor_day` tinyint(4) DEFAULT NULL,
+  `next_fire_at` datetime DEFAULT NULL,
+  `last_fired_at` datetime DEFAULT NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 -- --------------------------------------------------------
@@ -332,15 +506,22 @@ CREATE TABLE `users` (
 --
 ALTER TABLE `appointments`
   ADD PRIMARY KEY (`id`),
-  ADD KEY `doctor_id` (`doctor_id`),
+  ADD KEY `doctor_id_appointment_time` (`doctor_id`,`appointment_time`),
   ADD KEY `patient_id` (`patient_id`);
 
+--
+-- Index pour la table `archive_state`
+--
+ALTER TABLE `archive_state`
+  ADD PRIMARY KEY (`table_name`);
+
 --
 -- Index pour la table `articles`
 --
 ALTER TABLE `articles`
   ADD PRIMARY KEY (`id`),
-  ADD KEY `doctor_id` (`doctor_id`);
+  ADD KEY `doctor_id` (`doctor_id`),
+  ADD FULLTEXT KEY `title_content` (`title`,`content`);
 
 --
 -- Index pour la table `challenges`
@@ -356,6 +537,20 @@ ALTER TABLE `challenge_participants`
   ADD PRIMARY KEY (`challenge_id`,`user_id`),
   ADD KEY `user_id` (`user_id`);
 
+--
+-- Index pour la table `conversation_summaries`
+--
+ALTER TABLE `conversation_summaries`
+  ADD PRIMARY KEY (`user_id`,`other_id`),
+  ADD KEY `user_id_last_message_at` (`user_id`,`last_message_at`),
+  ADD KEY `other_id` (`other_id`);
+
+--
+-- Index pour la table `doctor_hours`
+--
+ALTER TABLE `doctor_hours`
+  ADD PRIMARY KEY (`doctor_id`,`weekday`,`start_time`);
+
 --
 -- Index pour la table `doctors`
 --
@@ -375,21 +570,41 @@ ALTER TABLE `doctor_patient`
 --
 ALTER TABLE `faqs`
   ADD PRIMARY KEY (`id`),
-  ADD KEY `doctor_id` (`doctor_id`);
+  ADD KEY `doctor_id` (`doctor_id`),
+  ADD FULLTEXT KEY `question_answer` (`question`,`answer`);
 
 --
 -- Index pour la table `glucose_logs`
 --
 ALTER TABLE `glucose_logs`
   ADD PRIMARY KEY (`id`),
-  ADD KEY `user_id` (`user_id`);
+  ADD KEY `user_id_timestamp` (`user_id`,`timestamp`);
+
+--
+-- Index pour la table `glucose_logs_archive`
+--
+ALTER TABLE `glucose_logs_archive`
+  ADD PRIMARY KEY (`id`,`timestamp`),
+  ADD KEY `user_id_timestamp` (`user_id`,`timestamp`);
+
+--
+-- Index pour la table `glucose_rollup_daily`
+--
+ALTER TABLE `glucose_rollup_daily`
+  ADD PRIMARY KEY (`user_id`,`bucket`);
+
+--
+-- Index pour la table `glucose_rollup_hourly`
+--
+ALTER TABLE `glucose_rollup_hourly`
+  ADD PRIMARY KEY (`user_id`,`bucket`);
 
 --
 -- Index pour la table `meals`
 --
 ALTER TABLE `meals`
   ADD PRIMARY KEY (`id`),
-  ADD KEY `user_id` (`user_id`);
+  ADD KEY `user_id_timestamp` (`user_id`,`timestamp`);
 
 --
 -- Index pour la table `medications`
@@ -412,15 +627,39 @@ ALTER TABLE `medication_changes`
 --
 ALTER TABLE `messages`
   ADD PRIMARY KEY (`id`),
+  ADD KEY `conversation_id_timestamp` (`conversation_id`,`timestamp`),
   ADD KEY `sender_id` (`sender_id`),
   ADD KEY `receiver_id` (`receiver_id`);
 
+--
+-- Index pour la table `notification_outbox`
+--
+ALTER TABLE `notification_outbox`
+  ADD PRIMARY KEY (`id`),
+  ADD KEY `claimed_by` (`claimed_by`),
+  ADD KEY `failed_at` (`failed_at`);
+
+--
+-- Index pour la table `notification_state`
+--
+ALTER TABLE `notification_state`
+  ADD PRIMARY KEY (`user_id`);
+
 --
 -- Index pour la table `notifications`
 --
 ALTER TABLE `notifications`
   ADD PRIMARY KEY (`id`),
-  ADD KEY `user_id` (`user_id`);
+  ADD KEY `user_id` (`user_id`),
+  ADD KEY `user_id_created_at` (`user_id`,`created_at`),
+  ADD KEY `user_id_read_patient_id` (`user_id`,`read`,`patient_id`);
+
+--
+-- Index pour la table `notifications_archive`
+--
+ALTER TABLE `notifications_archive`
+  ADD PRIMARY KEY (`id`,`created_at`),
+  ADD KEY `user_id_created_at` (`user_id`,`created_at`);
 
 --
 -- Index pour la table `patients`
@@ -433,7 +672,7 @@ ALTER TABLE `patients`
 --
 ALTER TABLE `physical_activities`
   ADD PRIMARY KEY (`id`),
-  ADD KEY `user_id` (`user_id`);
+  ADD KEY `user_id_timestamp` (`user_id`,`timestamp`);
 
 --
 -- Index pour la table `preset_meals`
@@ -446,7 +685,8 @@ ALTER TABLE `preset_meals`
 --
 ALTER TABLE `reminders`
   ADD PRIMARY KEY (`id`),
-  ADD KEY `user_id` (`user_id`);
+  ADD KEY `user_id` (`user_id`),
+  ADD KEY `next_fire_at` (`next_fire_at`);
 
 --
 -- Index pour la table `specialties`
@@ -520,6 +760,12 @@ ALTER TABLE `medication_changes`
 ALTER TABLE `messages`
   MODIFY `id` int(11) NOT NULL AUTO_INCREMENT;
 
+--
+-- AUTO_INCREMENT pour la table `notification_outbox`
+--
+ALTER TABLE `notification_outbox`
+  MODIFY `id` bigint(20) NOT NULL AUTO_INCREMENT;
+
 --
 -- AUTO_INCREMENT pour la table `notifications`
 --
@@ -586,6 +832,19 @@ ALTER TABLE `challenge_participants`
   ADD CONSTRAINT `challenge_participants_ibfk_1` FOREIGN KEY (`challenge_id`) REFERENCES `challenges` (`id`) ON DELETE CASCADE,
   ADD CONSTRAINT `challenge_participants_ibfk_2` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE;
 
+--
+-- Contraintes pour la table `conversation_summaries`
+--
+ALTER TABLE `conversation_summaries`
+  ADD CONSTRAINT `conversation_summaries_user_fk` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE,
+  ADD CONSTRAINT `conversation_summaries_other_fk` FOREIGN KEY (`other_id`) REFERENCES `users` (`id`) ON DELETE CASCADE;
+
+--
+-- Contraintes pour la table `doctor_hours`
+--
+ALTER TABLE `doctor_hours`
+  ADD CONSTRAINT `doctor_hours_doctor_fk` FOREIGN KEY (`doctor_id`) REFERENCES `doctors` (`user_id`) ON DELETE CASCADE;
+
 --
 -- Contraintes pour la table `doctors`
 --
@@ -612,6 +871,18 @@ ALTER TABLE `faqs`
 ALTER TABLE `glucose_logs`
   ADD CONSTRAINT `glucose_logs_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE;
 
+--
+-- Contraintes pour la table `glucose_rollup_daily`
+--
+ALTER TABLE `glucose_rollup_daily`
+  ADD CONSTRAINT `glucose_rollup_daily_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE;
+
+--
+-- Contraintes pour la table `glucose_rollup_hourly`
+--
+ALTER TABLE `glucose_rollup_hourly`
+  ADD CONSTRAINT `glucose_rollup_hourly_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE;
+
 --
 -- Contraintes pour la table `meals`
 --
@@ -639,6 +910,12 @@ ALTER TABLE `messages`
   ADD CONSTRAINT `messages_ibfk_1` FOREIGN KEY (`sender_id`) REFERENCES `users` (`id`) ON DELETE CASCADE,
   ADD CONSTRAINT `messages_ibfk_2` FOREIGN KEY (`receiver_id`) REFERENCES `users` (`id`) ON DELETE CASCADE;
 
+--
+-- Contraintes pour la table `notification_state`
+--
+ALTER TABLE `notification_state`
+  ADD CONSTRAINT `notification_state_user_fk` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE;
+
 --
 -- Contraintes pour la table `notifications`
 --